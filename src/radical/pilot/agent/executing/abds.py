@@ -50,7 +50,7 @@ class ABDS(AgentExecutingComponent):
         self.register_output(rps.AGENT_STAGING_OUTPUT_PENDING, 
                              rpc.AGENT_STAGING_OUTPUT_QUEUE)
 
-        self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
+        self.register_unschedule()
         self.register_subscriber(rpc.CONTROL_PUBSUB, self.command_cb)
 
         self._cancel_lock    = threading.RLock()
@@ -106,6 +106,8 @@ class ABDS(AgentExecutingComponent):
         if self._watcher:
             self._watcher.join()
 
+        AgentExecutingComponent.finalize_child(self)
+
 
     # --------------------------------------------------------------------------
     #
@@ -212,7 +214,7 @@ class ABDS(AgentExecutingComponent):
 
             # Free the Slots, Flee the Flots, Ree the Frots!
             if cu['slots']:
-                self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                self.unschedule(cu)
 
             self.advance(cu, rps.FAILED, publish=True, push=False)
 
@@ -498,7 +500,7 @@ prof(){
                         self._cus_to_watch.remove(cu)
 
                         del(cu['proc'])  # proc is not json serializable
-                        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                        self.unschedule(cu)
                         self.advance(cu, rps.CANCELED, publish=True, push=False)
 
                 else:
@@ -517,7 +519,7 @@ prof(){
                     # Free the Slots, Flee the Flots, Ree the Frots!
                     self._cus_to_watch.remove(cu)
                     del(cu['proc'])  # proc is not json serializable
-                    self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                    self.unschedule(cu)
 
                     if exit_code != 0:
                         # The unit failed - fail after staging output
@@ -3,10 +3,14 @@ __copyright__ = "Copyright 2013-2016, http://radical.rutgers.edu"
 __license__   = "MIT"
 
 import os
+import threading
 
 import radical.utils as ru
 
 from ... import utils     as rpu
+from ... import constants as rpc
+
+from ..scheduler.shard import shard_topic
 
 
 # ------------------------------------------------------------------------------
@@ -40,6 +44,12 @@ class AgentExecutingComponent(rpu.Component):
         # if so configured, let the CU know what to use as tmp dir
         self._cu_tmp = cfg.get('cu_tmp', os.environ.get('TMP', '/tmp'))
 
+        # units whose slots can be released are collected for this time period,
+        # and are then sent to the scheduler in a single unschedule message
+        self._unschedule_window = cfg.get('unschedule_window', 0.0)
+        self._unschedule_units  = list()
+        self._unschedule_lock   = threading.RLock()
+
 
     # --------------------------------------------------------------------------
     #
@@ -74,5 +84,91 @@ class AgentExecutingComponent(rpu.Component):
         return impl
 
 
+    # --------------------------------------------------------------------------
+    #
+    def register_unschedule(self):
+        """
+        Register the publisher for unit unscheduling, and, if configured, the
+        timed callback which flushes collected units (see `unschedule()`).
+        """
+
+        self.register_publisher(rpc.AGENT_UNSCHEDULE_PUBSUB)
+
+        if self._unschedule_window:
+            self.register_timed_cb(self._unschedule_flush_cb,
+                                   timer=self._unschedule_window)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unschedule(self, cu):
+        """
+        Pass a unit whose slots can be released on to the scheduler.  Units are
+        collected for `unschedule_window` seconds, and are then sent in a single
+        unschedule message.  A window of `0` sends each unit immediately.
+        """
+
+        # the scheduler only needs to know what slots to release - we don't
+        # send the whole unit, which also continues to change after this point
+        unit = {'uid'         : cu['uid'],
+                'slots'       : cu['slots'],
+                'description' : cu['description']}
+
+        if not self._unschedule_window:
+            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, unit,
+                         topic=self._unschedule_topic(unit))
+            return
+
+        with self._unschedule_lock:
+            self._unschedule_units.append(unit)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _unschedule_topic(self, unit):
+        '''
+        Slots placed by a sharded scheduler are marked with the owning shard,
+        and are released on that shard's topic.
+        '''
+
+        slots = unit['slots']
+        if isinstance(slots, dict) and slots.get('shard') is not None:
+            return shard_topic(rpc.AGENT_UNSCHEDULE_PUBSUB, slots['shard'])
+
+        return rpc.AGENT_UNSCHEDULE_PUBSUB
+
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize_child(self):
+
+        # units collected since the last flush would never get their slots
+        # released otherwise
+        self._unschedule_flush_cb()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _unschedule_flush_cb(self):
+
+        with self._unschedule_lock:
+            units = self._unschedule_units
+            self._unschedule_units = list()
+
+        # with a sharded scheduler, each shard only receives the units whose
+        # slots it owns
+        bulks = dict()
+        for unit in units:
+            bulks.setdefault(self._unschedule_topic(unit), list()).append(unit)
+
+        for topic, bulk in bulks.iteritems():
+            # subscribers get lists delivered element by element, so we wrap the
+            # list of units into another list to have it delivered as a whole.
+            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, [bulk], topic=topic)
+
+        # return True to keep the cb registered
+        return True
+
+
 # ------------------------------------------------------------------------------
 
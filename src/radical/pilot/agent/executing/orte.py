@@ -76,7 +76,7 @@ class ORTE(AgentExecutingComponent):
         self.register_output(rps.AGENT_STAGING_OUTPUT_PENDING,
                              rpc.AGENT_STAGING_OUTPUT_QUEUE)
 
-        self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
+        self.register_unschedule()
         self.register_subscriber(rpc.CONTROL_PUBSUB, self.command_cb)
 
         self._cancel_lock    = threading.RLock()
@@ -217,7 +217,7 @@ class ORTE(AgentExecutingComponent):
 
             # Free the Slots, Flee the Flots, Ree the Frots!
             if cu['slots']:
-                self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                self.unschedule(cu)
 
             self.advance(cu, rps.FAILED, publish=True, push=False)
 
@@ -237,7 +237,7 @@ class ORTE(AgentExecutingComponent):
             # unit launch failed
             self._prof.prof('exec_fail', uid=uid)
             self._log.error("unit %s startup failed: %s", uid, status)
-            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+            self.unschedule(cu)
 
             cu['target_state'] = rps.FAILED
             self.advance(cu, rps.AGENT_STAGING_OUTPUT_PENDING, 
@@ -265,7 +265,7 @@ class ORTE(AgentExecutingComponent):
         cu['exit_code'] = exit_code
         cu['finished']  = timestamp
 
-        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+        self.unschedule(cu)
 
         if exit_code != 0:
             # unit failed - fail after staging output
@@ -287,7 +287,7 @@ class ORTE(AgentExecutingComponent):
 
         # FIXME: it feels as a hack to get the DVM URI from the CU
 
-        slots = cu['slots']
+        slots = self._task_launcher.decode_slots(cu['slots'])
 
         if 'lm_info' not in slots:
             raise RuntimeError('No lm_info to init via %s: %s' \
@@ -50,7 +50,7 @@ class Popen(AgentExecutingComponent) :
         self.register_output(rps.AGENT_STAGING_OUTPUT_PENDING,
                              rpc.AGENT_STAGING_OUTPUT_QUEUE)
 
-        self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
+        self.register_unschedule()
         self.register_subscriber(rpc.CONTROL_PUBSUB, self.command_cb)
 
         self._cancel_lock    = threading.RLock()
@@ -214,7 +214,7 @@ class Popen(AgentExecutingComponent) :
 
             # Free the Slots, Flee the Flots, Ree the Frots!
             if cu.get('slots'):
-                self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                self.unschedule(cu)
 
             self.advance(cu, rps.FAILED, publish=True, push=False)
 
@@ -449,7 +449,7 @@ prof(){
                     self._prof.prof('exec_cancel_stop', uid=uid)
 
                     del(cu['proc'])  # proc is not json serializable
-                    self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                    self.unschedule(cu)
                     self.advance(cu, rps.CANCELED, publish=True, push=False)
 
                     # we don't need to watch canceled CUs
@@ -471,7 +471,7 @@ prof(){
                 # Free the Slots, Flee the Flots, Ree the Frots!
                 self._cus_to_watch.remove(cu)
                 del(cu['proc'])  # proc is not json serializable
-                self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                self.unschedule(cu)
 
                 if exit_code != 0:
                     # The unit failed - fail after staging output
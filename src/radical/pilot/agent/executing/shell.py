@@ -45,7 +45,7 @@ class Shell(AgentExecutingComponent):
         self.register_output(rps.AGENT_STAGING_OUTPUT_PENDING,
                              rpc.AGENT_STAGING_OUTPUT_QUEUE)
 
-        self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
+        self.register_unschedule()
         self.register_subscriber(rpc.CONTROL_PUBSUB, self.command_cb)
 
         # Mimic what virtualenv's "deactivate" would do
@@ -197,7 +197,7 @@ class Shell(AgentExecutingComponent):
             with self._cancel_lock:
                 self._cus_to_cancel.remove(cu['uid'])
 
-            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+            self.unschedule(cu)
             self.advance(cu, rps.CANCELED, publish=True, push=False)
             return True
 
@@ -259,7 +259,7 @@ class Shell(AgentExecutingComponent):
 
             # Free the Slots, Flee the Flots, Ree the Frots!
             if cu.get('slots'):
-                self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                self.unschedule(cu)
 
             self.advance(cu, rps.FAILED, publish=True, push=False)
 
@@ -596,7 +596,7 @@ prof(){
         self._prof.prof('exec_stop', uid=cu['uid'])
 
         # for final states, we can free the slots.
-        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+        self.unschedule(cu)
 
         if data : cu['exit_code'] = int(data)
         else    : cu['exit_code'] = None
@@ -42,7 +42,7 @@ class ShellFS(AgentExecutingComponent):
         self.register_output(rps.AGENT_STAGING_OUTPUT_PENDING,
                              rpc.AGENT_STAGING_OUTPUT_QUEUE)
 
-        self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
+        self.register_unschedule()
         self.register_subscriber(rpc.CONTROL_PUBSUB, self.command_cb)
 
         # Mimic what virtualenv's "deactivate" would do
@@ -169,6 +169,8 @@ class ShellFS(AgentExecutingComponent):
         except:
             pass
 
+        AgentExecutingComponent.finalize_child(self)
+
 
     # --------------------------------------------------------------------------
     #
@@ -227,7 +229,7 @@ class ShellFS(AgentExecutingComponent):
             with self._cancel_lock:
                 self._to_cancel.remove(cu['uid'])
 
-            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+            self.unschedule(cu)
             self.advance(cu, rps.CANCELED, publish=True, push=False)
             return True
 
@@ -257,7 +259,7 @@ class ShellFS(AgentExecutingComponent):
 
             # Free the Slots, Flee the Flots, Ree the Frots!
             if cu.get('slots'):
-                self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                self.unschedule(cu)
 
             self.advance(cu, rps.FAILED, publish=True, push=False)
 
@@ -501,7 +503,7 @@ prof(){
             del(self._registry[uid])
 
         # free unit slots.
-        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+        self.unschedule(cu)
 
         if ret is None:
             cu['exit_code'] = None
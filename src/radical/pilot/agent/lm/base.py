@@ -10,6 +10,8 @@ import collections
 
 import radical.utils as ru
 
+from ... import utils as rpu
+
 
 # 'enum' for launch method types
 LM_NAME_APRUN         = 'APRUN'
@@ -75,6 +77,25 @@ class LaunchMethod(object):
 
         self._log.debug('launch_command: %s', self.launch_command)
 
+        # The agent scheduler passes units on with their slots in compact
+        # encoding, which we need to decode before constructing the unit's
+        # command.  We wrap the bound method, so that the launch methods always
+        # see the full slot structure, while the unit itself keeps the compact
+        # slots for all further hops.
+        self._slot_codec = None
+        if cfg.get('lrms_info'):
+            self._slot_codec = rpu.SlotCodec(cfg['lrms_info'])
+
+        construct = self.construct_command
+
+        def decoding_construct_command(cu, launch_script_hop):
+            if rpu.is_compact(cu.get('slots')):
+                cu = dict(cu)
+                cu['slots'] = self.decode_slots(cu['slots'])
+            return construct(cu, launch_script_hop)
+
+        self.construct_command = decoding_construct_command
+
 
     # --------------------------------------------------------------------------
     #
@@ -220,6 +241,25 @@ class LaunchMethod(object):
         raise NotImplementedError("construct_command() not implemented for LaunchMethod: %s." % self.name)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def decode_slots(self, slots):
+        '''
+        Return the full slot structure (see top of `agent/scheduler/base.py`)
+        for the given slots, which may be in compact encoding (see
+        `rpu.SlotCodec`).
+        '''
+
+        if not rpu.is_compact(slots):
+            return slots
+
+        if not self._slot_codec:
+            raise RuntimeError('cannot decode slots without lrms_info for %s'
+                              % self.name)
+
+        return self._slot_codec.decode(slots)
+
+
     # --------------------------------------------------------------------------
     #
     @classmethod
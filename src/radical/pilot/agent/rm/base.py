@@ -4,6 +4,7 @@ __license__   = "MIT"
 
 
 import os
+import glob
 
 import radical.utils as ru
 
@@ -36,6 +37,10 @@ class LRMS(object):
       LRMS.cores_per_node : the number of cores each node has available
       LRMS.gpus_per_node  : the number of gpus  each node has available
 
+    Optionally, the LRMS also describes the NUMA topology of the nodes:
+
+      LRMS.node_topology  : a list of NUMA domains (see `_get_node_topology()`)
+
     Schedulers can rely on these information to be available.  Specific LRMS
     incarnation may have additional information available -- but schedulers
     relying on those are invariably bound to the specific LRMS.  An example is
@@ -82,6 +87,7 @@ class LRMS(object):
         self.cores_per_node  = None
         self.gpus_per_node   = None
         self.lfs_per_node    = None
+        self.node_topology   = None
 
         # The LRMS will possibly need to reserve nodes for the agent, according
         # to the agent layout.  We dig out the respective requirements from the
@@ -159,6 +165,9 @@ class LRMS(object):
 
                 self._log.info("lrms config hook succeeded (%s)" % lm)
 
+        # optional NUMA topology of the nodes
+        self.node_topology = self._get_node_topology()
+
         # For now assume that all nodes have equal amount of cores and gpus
         cores_avail = (len(self.node_list) + len(self.agent_nodes)) * self.cores_per_node
         gpus_avail  = (len(self.node_list) + len(self.agent_nodes)) * self.gpus_per_node
@@ -178,6 +187,9 @@ class LRMS(object):
         #   gpus_per_node:  as the name says
         #   agent_nodes:    list of node names reserved for agent execution
         #
+        # `node_topology` is set if the NUMA topology of the nodes is known
+        # (`None` otherwise).
+        #
         # That list may turn out to be insufficient for some schedulers.  Yarn
         # for example may need to communicate YARN service endpoints etc.  an
         # LRMS can thus expand this dict, but is then likely bound to a specific
@@ -189,6 +201,7 @@ class LRMS(object):
         self.lrms_info['gpus_per_node']  = self.gpus_per_node
         self.lrms_info['agent_nodes']    = self.agent_nodes
         self.lrms_info['lfs_per_node']   = self.lfs_per_node
+        self.lrms_info['node_topology']  = self.node_topology
 
 
     # --------------------------------------------------------------------------
@@ -266,5 +279,109 @@ class LRMS(object):
         raise NotImplementedError("_Configure missing for %s" % self.name)
 
 
+    # --------------------------------------------------------------------------
+    #
+    # The node topology is a list of NUMA domains, each listing the socket it
+    # belongs to, and the cores and gpus attached to it:
+    #
+    #   [{'socket': 0, 'cores': [0, 1, 2, 3], 'gpus': [0]},
+    #    {'socket': 1, 'cores': [4, 5, 6, 7], 'gpus': [1]}]
+    #
+    # All nodes are assumed to have the same topology.  It is taken from the
+    # resource config (`node_topology`), which either lists the domains as
+    # above, or is set to 'sysfs' to have the topology of the agent node read
+    # from `/sys/devices/system/node`.  By default, no topology is used.
+    #
+    def _get_node_topology(self):
+
+        topology = self._cfg.get('node_topology')
+
+        if not topology:
+            return None
+
+        if topology == 'sysfs':
+            topology = self._read_sysfs_topology()
+            self._log.info('node topology from sysfs: %s', topology)
+            return topology
+
+        if not isinstance(topology, list):
+            raise ValueError('invalid node topology %s' % topology)
+
+        return topology
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _read_sysfs_topology(self, root='/sys'):
+
+        domains = dict()   # numa node id -> domain
+        for path in glob.glob('%s/devices/system/node/node[0-9]*' % root):
+
+            numa  = int(os.path.basename(path)[4:])
+            cores = _parse_cpulist(_read(path + '/cpulist'))
+
+            if not cores:
+                continue
+
+            # the socket of a domain is the physical package of its cores
+            socket = _read('%s/devices/system/cpu/cpu%d/topology/'
+                           'physical_package_id' % (root, cores[0]))
+            domains[numa] = {'socket': int(socket) if socket else numa,
+                             'cores' : cores,
+                             'gpus'  : list()}
+
+        if not domains:
+            return None
+
+        # GPUs are numbered in PCI bus order (as CUDA does for
+        # `CUDA_DEVICE_ORDER=PCI_BUS_ID`).  We only consider NVIDIA devices.
+        gpu = 0
+        for path in sorted(glob.glob('%s/bus/pci/devices/*' % root)):
+
+            if _read(path + '/vendor') != '0x10de' or \
+               _read(path + '/class')[:6] not in ['0x0300', '0x0302']:
+                continue
+
+            numa = int(_read(path + '/numa_node') or -1)
+            if numa not in domains:
+                numa = min(domains)
+
+            domains[numa]['gpus'].append(gpu)
+            gpu += 1
+
+        return [domains[numa] for numa in sorted(domains)]
+
+
+# ------------------------------------------------------------------------------
+#
+def _read(path):
+
+    try:
+        with open(path) as fin:
+            return fin.read().strip()
+    except IOError:
+        return ''
+
+
+# ------------------------------------------------------------------------------
+#
+def _parse_cpulist(cpulist):
+    '''
+    parse a sysfs cpu list like `0-3,8-11,16` into a list of ints
+    '''
+
+    ret = list()
+    for elem in cpulist.split(','):
+        if not elem:
+            continue
+        if '-' in elem:
+            start, end = elem.split('-')
+            ret += range(int(start), int(end) + 1)
+        else:
+            ret.append(int(elem))
+
+    return ret
+
+
 # ------------------------------------------------------------------------------
 
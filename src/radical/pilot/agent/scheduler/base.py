@@ -3,6 +3,7 @@ __copyright__ = "Copyright 2013-2016, http://radical.rutgers.edu"
 __license__ = "MIT"
 
 
+import time
 import logging
 import pprint
 import threading
@@ -13,6 +14,14 @@ from ... import utils as rpu
 from ... import states as rps
 from ... import constants as rpc
 
+from .node_store import NodeStore
+from .wait_pool  import WaitPool, unit_shape
+from .stats      import SchedulerStats, stats2str
+from .shard      import ShardRouter, partition, shard_topic, COORDINATOR
+from .shard      import ROUTE_HASH, ROUTE_CAPACITY
+from .policy     import OrderedPool, POLICIES, POLICY_DEFAULT, POLICY_FIFO
+from .policy     import reserve, slot_usage, unit_end
+
 
 # ------------------------------------------------------------------------------
 #
@@ -42,12 +51,10 @@ SCHEDULER_NAME_YARN = "YARN"
 #   - general control and data flow:
 #
 #       # main loop
-#       self._handle_unit(unit):  # unit arrives
-#         try_allocation(unit)   # placement is attempted
-#         if success:
-#            advance(unit)       # pass unit to executor
-#         else:
-#            wait.append(unit)   # place unit in a wait list
+#       self._schedule_units(units):  # bulk of units arrives
+#         try_allocations(units)      # placement is attempted for the bulk
+#         advance(placed)             # pass placed units to executor
+#         wait.add(failed)            # place other units in a wait pool
 #
 #   - notification management:
 #     - the scheduler receives notifications about units which completed
@@ -69,6 +76,17 @@ SCHEDULER_NAME_YARN = "YARN"
 #   _release_slot(slots):
 #     - release the given allocation
 #
+# Implementations can also overload
+#
+#   _allocate_slots(cuds):
+#     - given a bulk of unit descriptions, find and return suitable allocations
+#       (the default calls `_allocate()` for each description)
+#
+# The base class never calls `_allocate_slot()` and `_release_slot()` directly,
+# but via `_allocate()` and `_release()`, which apply the stats, shard and
+# backfill hooks to every allocation.  Implementations which overload
+# `_allocate_slots()` should do the same.
+#
 #
 # The scheduler needs (in the general case) three pieces of information:
 #
@@ -100,6 +118,12 @@ SCHEDULER_NAME_YARN = "YARN"
 #                ...
 #               ]
 #
+# NOTE:  The base class keeps the above in two parts: `self.nodes` holds name
+#        and uid for each node, while the resource states are kept in
+#        `self._store`, a `NodeStore` which uses one byte array per resource
+#        type and per-node free counters (see `node_store.py`).  Both are
+#        indexed by the node's position in the LRMS node list.
+#
 # This solves the second part from our list above.  The third part, unit
 # requirements, are obtained from the unit dict passed for scheduling: the unit
 # description contains requests for `cores` and `gpus`.
@@ -151,14 +175,17 @@ SCHEDULER_NAME_YARN = "YARN"
 # `lm_info` is an opaque field which allows to communicate specific settings
 # from the lrms to the launch method.
 #
-# FIXME: `lm_info` should be communicated to the LM instances in creation, not
-#        as part of the slots.  Its constant anyway, as lm_info is set only
-#        once during lrms startup.
+# NOTE:  `lm_info` and the per-node sizes are constant, as they are set only
+#        once during lrms startup.  Placed units are thus passed on with their
+#        slots in a compact encoding, which references `lm_info` by id, and
+#        lists core and gpu ids as ranges (see `rpu.SlotCodec`).  The launch
+#        methods decode the slots again.
 #
 # NOTE:  While the nodelist resources are listed as strings above, we in fact
-#        use a list of integers, to simplify some operations, and to
-#        specifically avoid string copies on manipulations.  We only convert
-#        to a stringlist for visual representation (`self.slot_status()`).
+#        use byte arrays of `rpc.FREE` / `rpc.BUSY` integers, to simplify some
+#        operations, and to specifically avoid string copies on manipulations.
+#        We only convert to a string for visual representation
+#        (`self.slot_status()`).
 #
 # NOTE:  The scheduler will allocate one core per node and GPU, as some startup
 #        methods only allow process placements to *cores*, even if GPUs are
@@ -195,23 +222,60 @@ class AgentSchedulingComponent(rpu.Component):
     #   self.nodes = [
     #     { 'name'  : 'name-of-node',
     #       'uid'   : 'uid-of-node',
-    #       'cores' : '###---##-##-----',  # 16 cores, free/busy markers
-    #       'gpus'  : '--',                #  2 GPUs,  free/busy markers
     #     }, ...
     #   ]
     #
+    # and keep the state of the node resources in `self._store`:
+    #
+    #   self._store.cores      : '###---##-##-----'  # 16 cores per node
+    #   self._store.gpus       : '--'                #  2 GPUs  per node
+    #   self._store.free_cores : [9, ...]            # free cores per node
+    #   ...
+    #
     # The free/busy markers are defined in rp.constants.py, and are `-` and `#`,
     # respectively.  Some schedulers may need a more elaborate structures - but
     # where the above is suitable, it should be used for code consistency.
     #
 
+    # node store (see `_init_nodes()`): it is created for all schedulers, but
+    # only those which place units through `_change_slot_states()` keep it up
+    # to date, and set this.  Metrics derived from it are not reported for the
+    # others.
+    _uses_store    = False
+
+    # scheduler stats (see `_init_stats()`).  Scheduler implementations count
+    # the nodes they inspect for an allocation attempt in `_nodes_scanned` - it
+    # is reset for each attempt.
+    _stats         = None
+    _nodes_scanned = 0
+
+    # sharding (see `_init_shard()`): by default, a scheduler owns all nodes
+    _n_shards      = 1
+    _shard         = 0
+    _router        = None
+
+    # scheduling policy (see `_init_policy()`)
+    _policy        = POLICY_DEFAULT
+    _running       = None
+    _reservation   = None
+
+    # compact slot encoding (see `_init_codec()`)
+    _codec         = None
+
     def __init__(self, cfg, session):
 
-        self.nodes = None
-        self._lrms = None
+        self.nodes  = None
+        self._store = None
+        self._lrms  = None
+
+        self._node_index = dict()  # node uid -> index into self.nodes
         self._uid = ru.generate_id(cfg['owner'] + '.scheduling.%(counter)s',
                                    ru.ID_CUSTOM)
 
+        # If the wait pool is uniform, units of the same request shape are
+        # interchangeable: once one fails to be placed, all others of that
+        # shape will fail, too.  Schedulers which place units on other grounds
+        # (like unit order) need to disable this.
         self._uniform_waitpool = True   # TODO: move to cfg
 
         rpu.Component.__init__(self, cfg, session)
@@ -231,22 +295,6 @@ class AgentSchedulingComponent(rpu.Component):
         self.register_output(rps.AGENT_EXECUTING_PENDING,
                              rpc.AGENT_EXECUTING_QUEUE)
 
-        # we need unschedule updates to learn about units for which to free the
-        # allocated cores.  Those updates MUST be issued after execution, ie.
-        # by the AgentExecutionComponent.
-        self.register_subscriber(rpc.AGENT_UNSCHEDULE_PUBSUB, self.unschedule_cb)
-
-        # we don't want the unschedule above to compete with actual
-        # scheduling attempts, so we move the re-scheduling of units from the
-        # wait pool into a separate thread (ie. register a separate callback).
-        # This is triggered by the unscheduled_cb.
-        #
-        # NOTE: we could use a local queue here.  Using a zmq bridge goes toward
-        #       an distributed scheduler, and is also easier to implement right
-        #       now, since `Component` provides the right mechanisms...
-        self.register_publisher(rpc.AGENT_SCHEDULE_PUBSUB)
-        self.register_subscriber(rpc.AGENT_SCHEDULE_PUBSUB, self.schedule_cb)
-
         # The scheduler needs the LRMS information which have been collected
         # during agent startup.  We dig them out of the config at this point.
         #
@@ -264,6 +312,36 @@ class AgentSchedulingComponent(rpu.Component):
             raise RuntimeError("LRMS %s didn't _configure node_list."
                               % self._lrms_info['name'])
 
+        # if multiple scheduler instances are configured, each one only owns
+        # a partition of the nodes
+        self._init_shard()
+
+        # we need unschedule updates to learn about units for which to free the
+        # allocated cores.  Those updates MUST be issued after execution, ie.
+        # by the AgentExecutionComponent.
+        unschedule_topic = self._topic(rpc.AGENT_UNSCHEDULE_PUBSUB, self._shard)
+        self.register_subscriber(rpc.AGENT_UNSCHEDULE_PUBSUB, self.unschedule_cb,
+                                 topics=[unschedule_topic])
+
+        # the re-scheduling of units from the wait pool is triggered by the
+        # unschedule_cb via a separate notification, so that a bulk of
+        # unschedules results in a single pass over the wait pool.  Both
+        # subscribers run on the component's reactor thread, so unschedule_cb
+        # and schedule_cb never run concurrently with each other, and all
+        # callbacks (including the input workers on the component thread) are
+        # serialized by the component's callback lock.
+        #
+        # NOTE: we could use a local queue here.  Using a zmq bridge goes toward
+        #       an distributed scheduler, and is also easier to implement right
+        #       now, since `Component` provides the right mechanisms...
+        schedule_topics = [self._topic(rpc.AGENT_SCHEDULE_PUBSUB, self._shard)]
+        if self._router and self._router.policy == ROUTE_CAPACITY:
+            schedule_topics.append(shard_topic(rpc.AGENT_SCHEDULE_PUBSUB))
+
+        self.register_publisher(rpc.AGENT_SCHEDULE_PUBSUB)
+        self.register_subscriber(rpc.AGENT_SCHEDULE_PUBSUB, self.schedule_cb,
+                                 topics=schedule_topics)
+
         if self._lrms_cores_per_node is None:
             raise RuntimeError("LRMS %s didn't _configure cores_per_node."
                               % self._lrms_info['name'])
@@ -273,28 +351,558 @@ class AgentSchedulingComponent(rpu.Component):
                               % self._lrms_info['name'])
 
         # create and initialize the wait pool
-        self._wait_pool = list()             # pool of waiting units
+        self._wait_pool = WaitPool()         # pool of waiting units
+        # The component's callback lock already serializes all callbacks of
+        # this component.  We still guard the wait pool and the slots with our
+        # own locks, so that they remain consistent for code which does not
+        # run as a component callback -- those locks are uncontended otherwise,
+        # and thus cheap.
         self._wait_lock = threading.RLock()  # look on the above pool
         self._slot_lock = threading.RLock()  # lock slot allocation/deallocation
 
-        # initialize the node list to be used by the scheduler.  A scheduler
-        # instance may decide to overwrite or extend this structure.
-
-        self.nodes = []
-        for node, node_uid in self._lrms_node_list:
-            self.nodes.append({
-                'name': node,
-                'uid': node_uid,
-                'cores': [rpc.FREE] * self._lrms_cores_per_node,
-                'gpus': [rpc.FREE] * self._lrms_gpus_per_node,
-                'lfs': self._lrms_lfs_per_node
-            })
+        # initialize the node list and node state store to be used by the
+        # scheduler.  A scheduler instance may decide to overwrite or extend
+        # those structures.
+        self._init_nodes()
 
         # configure the scheduler instance
         self._configure()
         self._log.debug("slot status after  init      : %s",
                         self.slot_status())
 
+        # set up the scheduling policy
+        self._init_policy()
+
+        # set up the slot encoding for placed units
+        self._init_codec()
+
+        # set up the scheduler instrumentation
+        self._init_stats()
+
+    # --------------------------------------------------------------------------
+    #
+    def finalize_child(self):
+
+        # report the final scheduler stats
+        if self._stats:
+            self._stats_cb()
+
+    # --------------------------------------------------------------------------
+    #
+    # Record the scheduler metrics listed in `stats.METRICS`, and periodically
+    # emit them as `sched_stats` profile events (one per metric).  The last of
+    # those events in a session profile thus describe the complete run of the
+    # scheduler (see `rp.utils.get_scheduler_stats()`).
+    #
+    def _init_stats(self):
+
+        # * scheduler_stats_interval:
+        #   Time period between the emission of scheduler stats (seconds).
+        #   If set to 0 (or not set at all), no stats are recorded.  Note that
+        #   the default agent config enables them with a 60 second period.
+        interval = self._cfg.get('scheduler_stats_interval', 0.0)
+
+        if not interval:
+            return
+
+        # `_allocate()` and `_release()` time all allocations and releases when
+        # this is set
+        self._stats = SchedulerStats()
+
+        self.register_timed_cb(self._stats_cb, timer=interval)
+
+    # --------------------------------------------------------------------------
+    #
+    def _stats_cb(self):
+
+        # free cores on partially used nodes
+        if self._uses_store:
+            with self._slot_lock:
+                cpn  = self._store.cores_per_node
+                frag = sum([free for free in self._store.free_cores
+                                 if  0 < free < cpn])
+            self._stats.record('fragmentation', frag)
+
+        for name, summary in self._stats.summary().iteritems():
+            if name == 'fragmentation' and not self._uses_store:
+                continue
+            self._prof.prof('sched_stats', uid=self._uid,
+                            msg=stats2str(name, summary))
+
+        # return True to keep the cb registered
+        return True
+
+    # --------------------------------------------------------------------------
+    #
+    # Sharded scheduling: if the component config asks for more than one
+    # scheduler instance (`count`), each instance (shard) owns a consecutive
+    # partition of the LRMS node list, and keeps the state of those nodes only.
+    # Units arrive at whatever shard pulls them from the scheduling queue, and
+    # are then routed to a shard by the configured policy (see `shard.py`).
+    # Units which are too large for a shard are escalated to the coordinator
+    # shard (shard 0), which can be configured to own a larger partition.
+    #
+    # The shards communicate over the schedule pubsub: next to the lists of
+    # units which freed resources, it carries routing and capacity messages of
+    # the form `{'cmd': 'route' | 'capacity', 'shard': <target>, 'arg': ...}`.
+    # Each shard publishes and subscribes to its own topic on the schedule and
+    # unschedule pubsubs (see `shard.shard_topic()`), so that it only receives
+    # the units routed to it and the releases of its own slots -- only the
+    # capacity hints go to all shards.  All slots are marked with the shard
+    # which owns them, and the executors publish releases on that shard's
+    # topic.
+    #
+    # Routing and capacity hints depend on the node store, so only schedulers
+    # which maintain it (`_uses_store`) can be sharded.
+    #
+    # NOTE: tag affinity is only honored within a shard.
+    #
+    def _init_shard(self):
+
+        self._n_shards = self._cfg.get('count',  1)
+        self._shard    = self._cfg.get('number', 0)
+
+        if self._n_shards < 2:
+            return
+
+        # capacity hints and shard sizes are taken from the node store
+        if not self._uses_store:
+            raise ValueError('scheduler %s cannot be sharded'
+                             % type(self).__name__)
+
+        # * scheduler_shard_routing:
+        #   How units are routed to shards: 'hash' (default) or 'capacity'.
+        # * scheduler_shard_coordinator:
+        #   The share of nodes owned by the coordinator shard (a fraction of
+        #   the nodes, 0 for an equal share, which is the default).
+        # * scheduler_shard_hint_interval:
+        #   Time period between capacity hints sent to the other shards, for
+        #   capacity routing (seconds, default 1.0).
+        policy   = self._cfg.get('scheduler_shard_routing',       ROUTE_HASH)
+        share    = self._cfg.get('scheduler_shard_coordinator',   0.0)
+        interval = self._cfg.get('scheduler_shard_hint_interval', 1.0)
+
+        self._router         = ShardRouter(self._n_shards, self._shard, policy)
+        self._lrms_node_list = partition(self._lrms_node_list, self._n_shards,
+                                         self._shard, share)
+
+        self._log.info('shard %d/%d owns %d nodes', self._shard,
+                       self._n_shards, len(self._lrms_node_list))
+
+        # `_allocate()` marks all slots with the owning shard
+
+        if policy == ROUTE_CAPACITY:
+            self.register_timed_cb(self._shard_hint_cb, timer=interval)
+
+    # --------------------------------------------------------------------------
+    #
+    def _topic(self, pubsub, shard):
+        '''
+        Return the topic for messages to the given shard on the given pubsub
+        channel.  Without sharding, that is the channel name.
+        '''
+
+        if not self._router:
+            return pubsub
+
+        return shard_topic(pubsub, shard)
+
+    # --------------------------------------------------------------------------
+    #
+    def _owns(self, unit):
+
+        if not self._router:
+            return True
+
+        return unit['slots'].get('shard') == self._shard
+
+    # --------------------------------------------------------------------------
+    #
+    def _fits_shard(self, cud):
+        '''
+        Check if a unit can possibly be placed on the nodes of this shard (all
+        nodes are of the same size, so that is only a question for multi-node
+        units).
+        '''
+
+        cores, gpus, _, mpi, _ = unit_shape(cud)
+
+        if not mpi:
+            return True
+
+        store = self._store
+        return cores <= store.n_nodes * store.cores_per_node and \
+               gpus  <= store.n_nodes * store.gpus_per_node
+
+    # --------------------------------------------------------------------------
+    #
+    def _route_units(self, units):
+        '''
+        Forward the units which should be placed by other shards, and return the
+        units to be placed locally.
+        '''
+
+        local  = list()
+        remote = dict()   # shard -> list of units
+        for unit in units:
+
+            if not self._fits_shard(unit['description']):
+                target = COORDINATOR
+            else:
+                target = self._router.route(unit)
+
+            if target == self._shard:
+                local.append(unit)
+            else:
+                remote.setdefault(target, list()).append(unit)
+
+        for target, tunits in remote.iteritems():
+            self._forward(target, tunits)
+
+        return local
+
+    # --------------------------------------------------------------------------
+    #
+    def _forward(self, target, units):
+
+        for unit in units:
+            self._prof.prof('schedule_forward', uid=unit['uid'],
+                            msg=str(target))
+
+        # the target shard stores the units again when advancing them
+        self._store_forget(units)
+
+        self.publish(rpc.AGENT_SCHEDULE_PUBSUB, {'cmd'  : 'route',
+                                                 'shard': target,
+                                                 'arg'  : units},
+                     topic=self._topic(rpc.AGENT_SCHEDULE_PUBSUB, target))
+
+    # --------------------------------------------------------------------------
+    #
+    def _offload(self, units):
+        '''
+        For capacity routing: forward units which could not be placed locally to
+        other shards with sufficient capacity, and return the units which remain
+        with this shard.
+        '''
+
+        if not self._router or self._router.policy != ROUTE_CAPACITY:
+            return units
+
+        keep   = list()
+        remote = dict()   # shard -> list of units
+        for unit in units:
+
+            target = self._router.pick(unit_shape(unit['description']))
+
+            if target is None:
+                keep.append(unit)
+            else:
+                remote.setdefault(target, list()).append(unit)
+
+        for target, tunits in remote.iteritems():
+            self._withdraw(tunits)
+            self._forward(target, tunits)
+
+        return keep
+
+    # --------------------------------------------------------------------------
+    #
+    def _withdraw(self, units):
+        '''
+        Called for units which were passed to `_place_units()`, but are handed
+        over to another shard without being placed.  Schedulers which keep
+        per-unit state for pending units should overload this method to clean
+        up that state.
+        '''
+
+        pass
+
+    # --------------------------------------------------------------------------
+    #
+    def _shard_hint_cb(self):
+
+        # tell the other shards about our free capacity
+        with self._slot_lock:
+            store = self._store
+            hint  = {'cores'     : sum(store.free_cores),
+                     'gpus'      : sum(store.free_gpus),
+                     'node_cores': max(store.free_cores),
+                     'node_gpus' : max(store.free_gpus)}
+
+        self.publish(rpc.AGENT_SCHEDULE_PUBSUB, {'cmd'  : 'capacity',
+                                                 'shard': self._shard,
+                                                 'arg'  : hint},
+                     topic=shard_topic(rpc.AGENT_SCHEDULE_PUBSUB))
+
+        # return True to keep the cb registered
+        return True
+
+    # --------------------------------------------------------------------------
+    #
+    def _take_waiting(self, shard):
+        '''
+        Remove and return the waiting units which fit into the capacity hint of
+        the given shard.  In the default wait pool, the units of each shape are
+        counted: we take the oldest ones of a shape until the hint has no more
+        room for it, without looking at the other units of that shape.  This is
+        called with `self._wait_lock` held.
+        '''
+
+        moved = list()
+
+        if self._policy != POLICY_DEFAULT:
+            for unit in self._wait_pool.units():
+                shape = unit_shape(unit['description'])
+                if self._router.pick(shape, [shard]) is not None:
+                    moved.append(unit)
+            self._wait_pool.remove(moved)
+            return moved
+
+        for shape in list(self._wait_pool.shapes()):
+            n = self._wait_pool.count(shape)
+            while n and self._router.pick(shape, [shard]) is not None:
+                moved.append(self._wait_pool.pop(shape))
+                n -= 1
+
+        return moved
+
+    # --------------------------------------------------------------------------
+    #
+    def _shard_cb(self, msg):
+        '''
+        handle routing and capacity messages from other shards
+        '''
+
+        cmd = msg['cmd']
+
+        if cmd == 'route':
+
+            if msg['shard'] == self._shard:
+
+                # units routed to us are not forwarded again - unless they are
+                # too large for this shard after all
+                units = list()
+                large = list()
+                for unit in msg['arg']:
+                    if self._shard == COORDINATOR or \
+                       self._fits_shard(unit['description']):
+                        units.append(unit)
+                    else:
+                        large.append(unit)
+
+                if large:
+                    self._forward(COORDINATOR, large)
+
+                self._place_units(units, offload=False)
+
+        elif cmd == 'capacity':
+
+            if msg['shard'] != self._shard:
+                self._router.update(msg['shard'], msg['arg'])
+
+                # units waiting here may fit over there now.  The wait pool
+                # counts its units, so hints are cheap while nothing waits.
+                moved = list()
+                with self._wait_lock:
+                    if len(self._wait_pool):
+                        moved = self._take_waiting(msg['shard'])
+                        self._record_waited(moved)
+
+                if moved:
+                    self._withdraw(moved)
+                    self._forward(msg['shard'], moved)
+
+        else:
+            self._log.error('unknown shard command %s', cmd)
+
+        # return True to keep the cb registered
+        return True
+
+    # --------------------------------------------------------------------------
+    #
+    # Scheduling policies other than the default one (see `policy.py`) keep the
+    # waiting units in an `OrderedPool`, and place units in a single ordered
+    # pass over that pool whenever units arrive or resources are freed (see
+    # `_schedule_ordered()`).
+    #
+    # For backfilling, we keep track of the estimated end time and resource
+    # usage of all running units.  When the first unit in order can't be
+    # placed, we reserve resources for it at the earliest time they are
+    # estimated to become available.  While the reservation is active, all
+    # allocations are checked against it, and are undone if they would delay
+    # the reserved unit.
+    #
+    # NOTE: schedulers which don't use the slot structure described at the top
+    #       of this file only get the priority order, but no reservations.
+    #
+    # For FIFO, only the oldest waiting unit is ever attempted, so that the
+    # ordering work per scheduling event is `O(log n)`.
+    #
+    # Scheduler implementations can enforce a policy by passing it explicitly.
+    #
+    def _init_policy(self, policy=None):
+
+        # * scheduler_policy:
+        #   The agent scheduling policy: 'default', 'backfill' or 'fifo'.
+        # * scheduler_backfill_depth:
+        #   The max number of waiting units considered on each scheduling pass
+        #   (default 100).
+        if not policy:
+            policy = self._cfg.get('scheduler_policy', POLICY_DEFAULT)
+
+        self._policy = policy
+        self._depth  = self._cfg.get('scheduler_backfill_depth', 100)
+
+        if self._policy not in POLICIES:
+            raise ValueError('unknown scheduling policy %s' % self._policy)
+
+        if self._policy == POLICY_DEFAULT:
+            return
+
+        if self._policy == POLICY_FIFO:
+            self._wait_pool = OrderedPool(prioritized=False)
+            return
+
+        self._wait_pool   = OrderedPool()
+        self._running     = dict()   # uid -> (estimated end, usage)
+        self._reservation = None
+
+        # `_allocate()` checks allocations against the active reservation
+
+    # --------------------------------------------------------------------------
+    #
+    def _schedule_ordered(self):
+        '''
+        Attempt to place the first units of the ordered wait pool, and return
+        the units which got placed.  For FIFO, we stop at the first unit which
+        cannot be placed.  Otherwise, that unit gets a reservation, and later
+        units are only placed if they don't delay it.  This is called with
+        `self._wait_lock` held.
+        '''
+
+        placed = list()
+        now    = time.time()
+
+        if self._policy == POLICY_FIFO:
+
+            while True:
+
+                unit = self._wait_pool.head()
+                if not unit or not self._try_allocation(unit):
+                    break
+
+                placed.append(self._wait_pool.pop())
+
+            if placed:
+                self._record_waited(placed)
+                self._push_placed(placed)
+
+            return placed
+
+        try:
+            for unit in self._wait_pool.units(self._depth):
+
+                if self._try_allocation(unit):
+                    placed.append(unit)
+                    self._running[unit['uid']] = \
+                            (unit_end(unit['description'], now),
+                             slot_usage(unit['slots'], self._node_index))
+
+                elif not self._reservation:
+                    with self._slot_lock:
+                        free_cores = list(self._store.free_cores)
+                        free_gpus  = list(self._store.free_gpus)
+
+                    self._reservation = reserve(
+                            unit_shape(unit['description']),
+                            free_cores, free_gpus, self._running.values())
+
+                    if self._reservation:
+                        self._log.debug('reserve for %s at %s', unit['uid'],
+                                        self._reservation.shadow)
+        finally:
+            self._reservation = None
+
+        if placed:
+            self._wait_pool.remove(placed)
+            self._record_waited(placed)
+            self._push_placed(placed)
+
+        return placed
+
+    # --------------------------------------------------------------------------
+    #
+    def _place_ordered(self, units, offload):
+        '''
+        `_place_units()` for the ordered policies: new units are added to the
+        wait pool, which is then scheduled in order.
+        '''
+
+        with self._wait_lock:
+
+            for unit in units:
+                self._wait_pool.add(unit)
+
+            placed  = set([unit['uid'] for unit in self._schedule_ordered()])
+            waiting = [unit for unit in units if unit['uid'] not in placed]
+
+            if waiting and offload:
+                kept    = set([unit['uid'] for unit in self._offload(waiting)])
+                moved   = [unit for unit in waiting if unit['uid'] not in kept]
+                waiting = [unit for unit in waiting if unit['uid'] in kept]
+                self._wait_pool.remove(moved)
+
+            if self._stats:
+                now = time.time()
+                for unit in waiting:
+                    self._stats.wait_start(unit['uid'], now)
+                self._stats.record('wait_pool', len(self._wait_pool))
+
+    # --------------------------------------------------------------------------
+    #
+    # Placed units are pushed to the executor with their slots in compact
+    # encoding (see `rpu.SlotCodec`), and come back that way for unscheduling.
+    # The scheduler itself always works on the full slot structure: units are
+    # encoded when they leave (`_push_placed()`), and their slots are decoded
+    # when they are released (`_full_slots()`).
+    #
+    def _init_codec(self):
+
+        # * compact_slots:
+        #   Pass placed units on with compact slots (default True).  Slots
+        #   which don't follow the default slot structure are never encoded.
+        if self._cfg.get('compact_slots', True):
+            self._codec = rpu.SlotCodec(self._lrms_info)
+
+    # --------------------------------------------------------------------------
+    #
+    def _push_placed(self, units):
+        '''
+        advance the given placed units toward the executor
+        '''
+
+        if not isinstance(units, list):
+            units = [units]
+
+        if self._codec:
+            for unit in units:
+                unit['slots'] = self._codec.encode(unit['slots'])
+
+        self.advance(units, rps.AGENT_EXECUTING_PENDING, publish=True, push=True)
+
+    # --------------------------------------------------------------------------
+    #
+    def _full_slots(self, slots):
+        '''
+        return the full slot structure for slots which may be compact
+        '''
+
+        if self._codec:
+            return self._codec.decode(slots)
+
+        return slots
+
     # --------------------------------------------------------------------------
     #
     # This class-method creates the appropriate instance for the scheduler.
@@ -333,6 +941,39 @@ class AgentSchedulingComponent(rpu.Component):
         except KeyError:
             raise ValueError("Scheduler '%s' unknown or defunct" % name)
 
+    # --------------------------------------------------------------------------
+    #
+    # Create the node list and the node state store from the LRMS information.
+    #
+    # NOTE: schedulers which change the LRMS settings (like `cores_per_node`)
+    #       during `_configure()` need to call this method again.
+    #
+    def _init_nodes(self):
+
+        self.nodes = list()
+        for node, node_uid in self._lrms_node_list:
+            self.nodes.append({'name': node,
+                               'uid' : node_uid})
+
+        self._store = NodeStore(len(self.nodes),
+                                self._lrms_cores_per_node,
+                                self._lrms_gpus_per_node,
+                                self._lrms_lfs_per_node)
+
+    # --------------------------------------------------------------------------
+    #
+    # Map node uids to their index in `self.nodes` (and thus in `self._store`),
+    # so that the nodes listed in a slot can be found without searching.
+    #
+    # NOTE: all scheduler implementations MUST call this method at the end of
+    #       `_configure()`, once their node list is final.
+    #
+    def _build_node_index(self):
+
+        self._node_index = dict()
+        for idx, node in enumerate(self.nodes):
+            self._node_index[node['uid']] = idx
+
     # --------------------------------------------------------------------------
     #
     # Change the reserved state of slots (rpc.FREE or rpc.BUSY)
@@ -351,34 +992,16 @@ class AgentSchedulingComponent(rpu.Component):
         # for node_name, node_uid, cores, gpus in slots['nodes']:
         for nodes in slots['nodes']:
 
-            # Find the entry in the the slots list
-
-            # TODO: [Optimization] Assuming 'uid' is the ID of the node, it
-            #       seems a bit wasteful to have to look at all of the nodes
-            #       available for use if at most one node can have that uid.
-            #       Maybe it would be worthwhile to simply keep a list of nodes
-            #       that we would read, and keep a dictionary that maps the uid
-            #       of the node to the location on the list?
-
-            node = (n for n in self.nodes if n['uid'] == nodes['uid']).next()
-            assert(node)
-
-            # iterate over cores/gpus in the slot, and update state
-            cores = nodes['core_map']
-            for cslot in cores:
-                for core in cslot:
-                    node['cores'][core] = new_state
+            # Find the entry in the the node store
+            idx = self._node_index[nodes['uid']]
 
-            gpus = nodes['gpu_map']
-            for gslot in gpus:
-                for gpu in gslot:
-                    node['gpus'][gpu] = new_state
-
-            if node['lfs']['path'] is not None:
-                if new_state == rpc.BUSY:
-                    node['lfs']['size'] -= nodes['lfs']['size']
-                else:
-                    node['lfs']['size'] += nodes['lfs']['size']
+            # update state of cores/gpus in the slot
+            self._store.set_slots(idx, [core for cslot in nodes['core_map']
+                                             for core  in cslot],
+                                       [gpu  for gslot in nodes['gpu_map']
+                                             for gpu   in gslot],
+                                       new_state)
+            self._store.set_lfs  (idx, nodes['lfs']['size'], new_state)
 
     # --------------------------------------------------------------------------
     #
@@ -389,22 +1012,7 @@ class AgentSchedulingComponent(rpu.Component):
         Returns a multi-line string corresponding to the status of the node list
         '''
 
-        ret = "|"
-        for node in self.nodes:
-            for core in node['cores']:
-                if core == rpc.FREE:
-                    ret += '-'
-                else:
-                    ret += '#'
-            ret += ':'
-            for gpu in node['gpus']:
-                if gpu == rpc.FREE:
-                    ret += '-'
-                else:
-                    ret += '#'
-            ret += '|'
-
-        return ret
+        return self._store.status()
 
     # --------------------------------------------------------------------------
     #
@@ -416,11 +1024,74 @@ class AgentSchedulingComponent(rpu.Component):
     def _allocate_slot(self, cud):
         raise NotImplementedError("_allocate_slot() missing for '%s'" % self.uid)
 
+    # --------------------------------------------------------------------------
+    #
+    def _allocate_slots(self, cuds):
+        '''
+        Bulk version of `_allocate_slot()`: attempt to allocate slots for all
+        given unit descriptions, in order, and return the list of resulting
+        slots (`None` for descriptions which could not be placed).  This method
+        is called with `self._slot_lock` held, so that implementations can
+        place a whole bulk in a single pass over the node state.  This default
+        implementation simply calls `_allocate()` for each description.
+        '''
+
+        return [self._allocate(cud) for cud in cuds]
+
     # --------------------------------------------------------------------------
     #
     def _release_slot(self, slots):
         raise NotImplementedError("_release_slot() missing for '%s'" % self.uid)
 
+    # --------------------------------------------------------------------------
+    #
+    def _allocate(self, cud):
+        '''
+        Call `_allocate_slot()` for the given unit description, and apply the
+        hooks of the optional scheduler features to the result:
+
+          - stats   : time the allocation, count the scanned nodes
+          - shards  : mark the slots with the owning shard
+          - backfill: undo allocations which would delay the reserved unit
+        '''
+
+        if self._stats:
+            self._nodes_scanned = 0
+            start = time.time()
+
+        slots = self._allocate_slot(cud)
+
+        if slots and self._router:
+            slots['shard'] = self._shard
+
+        if slots and self._reservation:
+            usage = slot_usage(slots, self._node_index)
+            if not self._reservation.admit(unit_end(cud, time.time()), usage):
+                self._release(slots)
+                slots = None
+
+        if self._stats:
+            self._stats.record('allocate', time.time() - start)
+            self._stats.record('scanned',  self._nodes_scanned)
+
+        return slots
+
+    # --------------------------------------------------------------------------
+    #
+    def _release(self, slots):
+        '''
+        Call `_release_slot()` for the given slots, and time it if stats are
+        recorded.
+        '''
+
+        if self._stats:
+            start = time.time()
+
+        self._release_slot(slots)
+
+        if self._stats:
+            self._stats.record('release', time.time() - start)
+
     # --------------------------------------------------------------------------
     #
     def _schedule_units(self, units):
@@ -440,21 +1111,51 @@ class AgentSchedulingComponent(rpu.Component):
         # advance state, publish state change, do not push unit out.
         self.advance(units, rps.AGENT_SCHEDULING, publish=True, push=False)
 
-        for unit in units:
+        # units which should be placed by other shards are forwarded
+        if self._router:
+            units = self._route_units(units)
 
-            # we got a new unit to schedule.  Either we can place it
-            # straight away and move it to execution, or we have to
-            # put it in the wait pool.
-            if self._try_allocation(unit):
-                # we could schedule the unit - advance its state, notify worls
-                # about the state change, and push the unit out toward the next
-                # component.
-                self.advance(unit, rps.AGENT_EXECUTING_PENDING,
-                             publish=True, push=True)
-            else:
-                # no resources available, put in wait queue
-                with self._wait_lock:
-                    self._wait_pool.append(unit)
+        self._place_units(units)
+
+    # --------------------------------------------------------------------------
+    #
+    def _place_units(self, units, offload=True):
+        '''
+        Place the given units (in `AGENT_SCHEDULING` state) and push them out to
+        the executor, or add them to the wait pool.  If `offload` is set,
+        units which cannot be placed locally may be forwarded to other shards.
+        '''
+
+        if not units:
+            return
+
+        if self._policy != POLICY_DEFAULT:
+            return self._place_ordered(units, offload)
+
+        # we got new units to schedule.  Either we can place them straight
+        # away and move them to execution, or we have to put them in the wait
+        # pool.  We attempt to place the whole bulk at once.
+        placed, failed = self._try_allocations(units)
+
+        if failed and offload:
+            failed = self._offload(failed)
+
+        # for the units we could schedule, advance state, notify world about
+        # the state change, and push the units out toward the next component.
+        if placed:
+            self._push_placed(placed)
+
+        # no resources available for the others, put in wait queue
+        if failed:
+            with self._wait_lock:
+                for unit in failed:
+                    self._wait_pool.add(unit)
+
+                if self._stats:
+                    now = time.time()
+                    for unit in failed:
+                        self._stats.wait_start(unit['uid'], now)
+                    self._stats.record('wait_pool', len(self._wait_pool))
 
     # --------------------------------------------------------------------------
     #
@@ -463,12 +1164,13 @@ class AgentSchedulingComponent(rpu.Component):
         attempt to allocate cores/gpus for a specific unit.
         """
 
-        # needs to be locked as we try to acquire slots here, but slots are
-        # freed in a different thread.  But we keep the lock duration short...
+        # slots are freed by unschedule_cb on the reactor thread (see
+        # `initialize_child()` for the locking).  We keep the lock duration
+        # short...
         with self._slot_lock:
 
             self._prof.prof('schedule_try', uid=unit['uid'])
-            unit['slots'] = self._allocate_slot(unit['description'])
+            unit['slots'] = self._allocate(unit['description'])
 
         # the lock is freed here
         if not unit['slots']:
@@ -491,6 +1193,47 @@ class AgentSchedulingComponent(rpu.Component):
         # True signals success
         return True
 
+    # --------------------------------------------------------------------------
+    #
+    def _try_allocations(self, units):
+        """
+        attempt to allocate cores/gpus for a bulk of units.  Returns two lists:
+        the units which got placed, and the units which did not.
+        """
+
+        for unit in units:
+            self._prof.prof('schedule_try', uid=unit['uid'])
+
+        # we lock once for the whole bulk, and leave it to `_allocate_slots()`
+        # to place the units efficiently.
+        with self._slot_lock:
+            slots = self._allocate_slots([unit['description'] for unit in units])
+
+        # the lock is freed here
+        placed = list()
+        failed = list()
+        for unit, unit_slots in zip(units, slots):
+
+            unit['slots'] = unit_slots
+
+            if unit_slots:
+                self._prof.prof('schedule_ok', uid=unit['uid'])
+                placed.append(unit)
+            else:
+                self._prof.prof('schedule_fail', uid=unit['uid'])
+                failed.append(unit)
+
+        if self._log.isEnabledFor(logging.DEBUG):
+            self._log.debug("after  allocate   %s/%s: %s", len(placed),
+                            len(units), self.slot_status())
+            for unit in placed:
+                self._log.debug("%s [%s/%s] : %s", unit['uid'],
+                                unit['description']['cpu_processes'],
+                                unit['description']['gpu_processes'],
+                                pprint.pformat(unit['slots']))
+
+        return placed, failed
+
     # --------------------------------------------------------------------------
     #
     def _get_node_maps(self, cores, gpus, threads_per_proc):
@@ -540,38 +1283,127 @@ class AgentSchedulingComponent(rpu.Component):
     #
     def unschedule_cb(self, topic, msg):
         """
-        release (for whatever reason) all slots allocated to this unit
+        release (for whatever reason) all slots allocated to this unit, or to
+        this list of units.  Executors collect finished units, and send them in
+        bulks: we release all slots in one locked pass, and trigger a single
+        scheduling attempt for the wait pool.
         """
 
-        unit = msg
+        # unify handling of bulks / non-bulks
+        if not isinstance(msg, list):
+            msg = [msg]
+
+        units = list()
+        for unit in msg:
 
-        if not unit['slots']:
-            # Nothing to do -- how come?
-            self._log.error("cannot unschedule: %s (no slots)" % unit)
+            if not unit['slots']:
+                # Nothing to do -- how come?
+                self._log.error("cannot unschedule: %s (no slots)" % unit)
+                continue
+
+            # slots owned by other shards are released by those
+            if not self._owns(unit):
+                continue
+
+            units.append(unit)
+
+        if not units:
             return True
 
         if self._log.isEnabledFor(logging.DEBUG):
-            self._log.debug("before unschedule %s: %s", unit['uid'],
+            self._log.debug("before unschedule %s units: %s", len(units),
                             self.slot_status())
 
-        # needs to be locked as we try to release slots, but slots are acquired
-        # in a different thread....
+        # slots are acquired by the input workers on the component thread (see
+        # `initialize_child()` for the locking)
         with self._slot_lock:
-            self._prof.prof('unschedule_start', uid=unit['uid'])
-            self._release_slot(unit['slots'])
-            self._prof.prof('unschedule_stop',  uid=unit['uid'])
+            for unit in units:
+                self._prof.prof('unschedule_start', uid=unit['uid'])
+                self._release(self._full_slots(unit['slots']))
+                self._prof.prof('unschedule_stop',  uid=unit['uid'])
+
+        if self._running is not None:
+            with self._wait_lock:
+                for unit in units:
+                    self._running.pop(unit['uid'], None)
 
         # notify the scheduling thread, ie. trigger an attempt to use the freed
-        # slots for units waiting in the wait pool.
-        self.publish(rpc.AGENT_SCHEDULE_PUBSUB, unit)
+        # slots for units waiting in the wait pool.  Subscribers get lists
+        # delivered element by element, so we wrap the list of units into
+        # another list to have it delivered as a whole.
+        self.publish(rpc.AGENT_SCHEDULE_PUBSUB, [units],
+                     topic=self._topic(rpc.AGENT_SCHEDULE_PUBSUB, self._shard))
 
         if self._log.isEnabledFor(logging.DEBUG):
-            self._log.debug("after  unschedule %s: %s", unit['uid'],
+            self._log.debug("after  unschedule %s units: %s", len(units),
                             self.slot_status())
 
         # return True to keep the cb registered
         return True
 
+    # --------------------------------------------------------------------------
+    #
+    def _freed_capacity(self, units):
+        '''
+        After the slots of the given units have been released, derive an upper
+        bound for the resources a waiting unit can now obtain: the largest
+        number of free cores, gpus and lfs on any of the nodes in the slots
+        (that is where resources became available), and the overall number of
+        free cores and gpus (for multi-node units).
+
+        Returns `None` if that capacity cannot be derived (for example for
+        schedulers which don't use the node store), which implies that all
+        waiting units should be considered.
+        '''
+
+        if not self._store or not units:
+            return None
+
+        cores = gpus = lfs = 0
+        for unit in units:
+
+            slots = self._full_slots(unit.get('slots'))
+            if not slots or 'nodes' not in slots:
+                return None
+
+            for node in slots['nodes']:
+
+                if not isinstance(node, dict):
+                    return None
+
+                idx = self._node_index.get(node['uid'])
+                if idx is None:
+                    return None
+
+                cores = max(cores, self._store.free_cores[idx])
+                gpus  = max(gpus,  self._store.free_gpus [idx])
+                lfs   = max(lfs,   self._store.free_lfs  [idx])
+
+        return {'cores'      : cores,
+                'gpus'       : gpus,
+                'lfs'        : lfs,
+                'total_cores': sum(self._store.free_cores),
+                'total_gpus' : sum(self._store.free_gpus)}
+
+    # --------------------------------------------------------------------------
+    #
+    def _shape_fits(self, shape, freed):
+        '''
+        Check if units of the given request shape (see `wait_pool.unit_shape()`)
+        can possibly be placed given the capacity derived by
+        `_freed_capacity()`.
+        '''
+
+        cores, gpus, lfs, mpi, _ = shape
+
+        if mpi:
+            return cores <= freed['total_cores'] and \
+                   gpus  <= freed['total_gpus']
+
+        return cores <= freed['cores'] and \
+               gpus  <= freed['gpus']  and \
+               lfs   <= freed['lfs']
+
     # --------------------------------------------------------------------------
     #
     def schedule_cb(self, topic, msg):
@@ -580,43 +1412,108 @@ class AgentSchedulingComponent(rpu.Component):
         we can attempt to schedule units from the wait pool.
         '''
 
-        # we ignore any passed unit.  In principle the unit info could be used to
-        # determine which slots have been freed.  No need for that optimization
-        # right now.  This will become interesting once schedule becomes too
-        # expensive.
-        # FIXME: optimization
+        # routing and capacity messages from other shards
+        if isinstance(msg, dict) and 'cmd' in msg:
+            return self._shard_cb(msg)
+
+        # unify handling of bulks / non-bulks
+        if not isinstance(msg, list):
+            msg = [msg]
 
-        unit = msg
+        # other shards' resources are of no use to us
+        msg = [unit for unit in msg if self._owns(unit)]
+        if not msg:
+            return True
 
         if self._log.isEnabledFor(logging.DEBUG):
-            self._log.debug("before schedule   %s: %s", unit['uid'],
+            self._log.debug("before schedule   %s units: %s", len(msg),
                             self.slot_status())
 
-        # cycle through wait queue, and see if we get anything placed now.  We
-        # cycle over a copy of the list, so that we can modify the list on the
-        # fly,without locking the whole loop.  However, this is costly, too.
-        for unit in self._wait_pool[:]:
+        if self._policy != POLICY_DEFAULT:
+            with self._wait_lock:
+                self._schedule_ordered()
+            return True
+
+        if not self._uniform_waitpool:
 
-            if self._try_allocation(unit):
+            # we can't make any assumptions about what units could be placed
+            # now, so we cycle through the complete wait pool in order of unit
+            # arrival, and see if we get anything placed.  We cycle over
+            # a copy of the pool, so that we can modify the pool on the fly,
+            # without locking the whole loop.  However, this is costly, too.
+            with self._wait_lock:
+                units = self._wait_pool.units()
 
-                # allocated unit -- advance it
-                self.advance(unit, rps.AGENT_EXECUTING_PENDING, publish=True, push=True)
+            placed = list()
+            for unit in units:
+
+                if self._try_allocation(unit):
+
+                    # allocated unit -- advance it
+                    self._push_placed(unit)
+                    placed.append(unit)
+
+            # remove placed units from the wait queue
+            with self._wait_lock:
+                self._wait_pool.remove(placed)
+                self._record_waited(placed)
+
+            return True
+
+        # the passed units' slots tell us where resources have been freed, and
+        # we only try units which could possibly fit into what is now free.
+        freed = self._freed_capacity(msg)
+
+        with self._wait_lock:
+            shapes = self._wait_pool.shapes()
+
+        placed = list()
+        for shape in shapes:
+
+            if freed and not self._shape_fits(shape, freed):
+                continue
+
+            # place units of this shape in order of arrival, until one fails:
+            # all other units of the same shape would fail as well.
+            while True:
 
-                # remove it from the wait queue
                 with self._wait_lock:
-                    self._wait_pool.remove(unit)
+                    unit = self._wait_pool.head(shape)
 
-            else:
-                # Break out of this loop if we didn't manage to schedule a task
-                # FIXME: this assumes that no smaller or otherwise more suitable
-                #        CUs come after this one - which is naive, ie. wrong.
-                # NOTE:  This assumption does indeed break for the fifo
-                #        scheduler, so we disable this now for non-uniform cases
-                if self._uniform_waitpool:
+                if not unit or not self._try_allocation(unit):
                     break
 
+                # remove it from the wait queue
+                with self._wait_lock:
+                    self._wait_pool.pop(shape)
+
+                # allocated unit -- advance it
+                self._push_placed(unit)
+                placed.append(unit)
+
+        if placed:
+            with self._wait_lock:
+                self._record_waited(placed)
+
         # return True to keep the cb registered
         return True
 
+    # --------------------------------------------------------------------------
+    #
+    def _record_waited(self, units):
+        '''
+        record the wait times of the given units, which just left the wait pool,
+        and the new wait pool size.  This is called with `self._wait_lock` held.
+        '''
+
+        if not self._stats or not units:
+            return
+
+        now = time.time()
+        for unit in units:
+            self._stats.wait_stop(unit['uid'], now)
+
+        self._stats.record('wait_pool', len(self._wait_pool))
+
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,176 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import heapq
+
+
+# ==============================================================================
+#
+class BuddyAllocator(object):
+    '''
+    A buddy allocator over a linear list of `n_nodes` nodes, which hands out
+    aligned blocks of the given `sizes` (powers of two, usually the sizes of
+    the sub-block shape table of the LRMS).  A block of size `n` always starts
+    at an offset which is a multiple of `n`, and its *buddy* is the block of
+    the same size at offset `offset ^ n`.
+
+    Free blocks are kept in one free list per size.  An allocation takes the
+    lowest free block of the smallest sufficient size, and splits it down to
+    the requested size; a release merges the block with its buddy for as long
+    as that buddy is free, too.  Both operations cost `O(log n_nodes)`.
+
+    The allocator only does the bookkeeping of offsets - it is up to the caller
+    to map those to nodes, and to lock.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, n_nodes, sizes):
+
+        self._sizes = sorted(sizes)
+
+        if not self._sizes:
+            raise ValueError('no block sizes given')
+
+        for size in self._sizes:
+            if size < 1 or size & (size - 1):
+                raise ValueError('block sizes must be powers of two: %s' % size)
+
+        # we can only merge blocks of sizes which are present in the table
+        for small, large in zip(self._sizes[:-1], self._sizes[1:]):
+            if large != 2 * small:
+                raise ValueError('block sizes must be contiguous: %s' % sizes)
+
+        # free blocks per size: a heap of offsets for the lowest free block, and
+        # a set to check for free buddies.  Offsets which are merged with their
+        # buddy are only removed from the set - the heap entries become stale and
+        # are skipped on pop.
+        self._heap = dict([(size, list())  for size in self._sizes])
+        self._free = dict([(size, set())   for size in self._sizes])
+
+        # the nodes are initially covered by blocks of the largest size - nodes
+        # which don't fill such a block are covered by smaller blocks (if
+        # possible).
+        offset = 0
+        for size in reversed(self._sizes):
+            while offset + size <= n_nodes:
+                self._push(size, offset)
+                offset += size
+
+        self.n_free = offset
+
+
+    # --------------------------------------------------------------------------
+    #
+    def fit(self, n_nodes):
+        '''
+        return the smallest block size which holds `n_nodes` nodes, or `None`
+        if no such block size exists.
+        '''
+
+        for size in self._sizes:
+            if size >= n_nodes:
+                return size
+
+        return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def alloc(self, size):
+        '''
+        allocate a block of the given size (which must be a valid block size),
+        and return its offset, or `None` if no such block is available.
+        '''
+
+        if size not in self._free:
+            raise ValueError('invalid block size %s' % size)
+
+        # find the smallest size with a free block
+        idx = self._sizes.index(size)
+        for have in self._sizes[idx:]:
+            if self._free[have]:
+                break
+        else:
+            return None
+
+        offset = self._pop(have)
+
+        # split the block down to the requested size, and keep the upper halves
+        while have > size:
+            have /= 2
+            self._push(have, offset + have)
+
+        self.n_free -= size
+
+        return offset
+
+
+    # --------------------------------------------------------------------------
+    #
+    def free(self, offset, size):
+        '''
+        release the block of the given size at the given offset
+        '''
+
+        if size not in self._free:
+            raise ValueError('invalid block size %s' % size)
+
+        if offset % size:
+            raise ValueError('misaligned block %s at %s' % (size, offset))
+
+        self.n_free += size
+
+        # merge with the buddy for as long as the buddy is free
+        while size != self._sizes[-1]:
+
+            buddy = offset ^ size
+            if buddy not in self._free[size]:
+                break
+
+            self._free[size].remove(buddy)
+            self._compact(size)
+
+            offset = min(offset, buddy)
+            size  *= 2
+
+        self._push(size, offset)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _push(self, size, offset):
+
+        self._free[size].add(offset)
+        heapq.heappush(self._heap[size], offset)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _compact(self, size):
+
+        # drop stale heap entries once they dominate the heap
+        heap = self._heap[size]
+        free = self._free[size]
+        if len(heap) > 2 * len(free) + 16:
+            heap[:] = list(free)
+            heapq.heapify(heap)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _pop(self, size):
+
+        heap = self._heap[size]
+        free = self._free[size]
+        while True:
+            offset = heapq.heappop(heap)
+            if offset in free:
+                free.remove(offset)
+                return offset
+
+
+# ------------------------------------------------------------------------------
+
@@ -3,15 +3,13 @@ __copyright__ = "Copyright 2013-2016, http://radical.rutgers.edu"
 __license__ = "MIT"
 
 
-import os
-
-import radical.utils as ru
-
 from ... import constants as rpc
 from .base import AgentSchedulingComponent
+from .node_store import FIT_FIRST, FIT_NEXT, FIT_POLICIES
+from .wait_pool  import unit_shape
+from .tag_store  import TagStore
+from .topology   import Topology
 
-import inspect
-import threading as mt
 from math import ceil
 import logging
 import pprint
@@ -48,61 +46,26 @@ import pprint
 # Q: How should the nodes be selected for MPI based units?
 # lfs : in mb
 
-import cProfile
-cprof = cProfile.Profile()
-
-
-def cprof_it(func):
-    def wrapper(*args, **kwargs):
-        retval = cprof.runcall(func, *args, **kwargs)
-        return retval
-    return wrapper
-
-
-def dec_all_methods(dec):
-    def dectheclass(cls):
-        if ru.is_main_thread():
-            cprof_env = os.getenv("RADICAL_PILOT_CPROFILE_COMPONENTS", "")
-            cprof_elems = cprof_env.split()
-            if "CONTINUOUS" in cprof_elems:
-                for name, m in inspect.getmembers(cls, inspect.ismethod):
-                    setattr(cls, name, dec(m))
-        return cls
-    return dectheclass
-
-
 # ------------------------------------------------------------------------------
 #
-@dec_all_methods(cprof_it)
 class Continuous(AgentSchedulingComponent):
     '''
     The Continuous scheduler attempts to place threads and processes of
     a compute units onto consecutive cores, gpus and nodes in the cluster.
     '''
 
+    _uses_store = True
+
     # --------------------------------------------------------------------------
     #
     def __init__(self, cfg, session):
 
         self.nodes = None
-        self._tag_history = dict()
+        self._tag_history = None
+        self._topology = None
 
         AgentSchedulingComponent.__init__(self, cfg, session)
 
-    # --------------------------------------------------------------------------
-    #
-    # FIXME: this should not be overloaded here, but in the base class
-    #
-    def finalize_child(self):
-
-        cprof_env = os.getenv("RADICAL_PILOT_CPROFILE_COMPONENTS", "")
-        if "CONTINUOUS" in cprof_env.split():
-            self_thread = mt.current_thread()
-            cprof.dump_stats("python-%s.profile" % self_thread.name)
-
-        # make sure that parent finalizers are called
-        super(Continuous, self).finalize_child()
-
     # --------------------------------------------------------------------------
     #
     def _configure(self):
@@ -127,6 +90,28 @@ class Continuous(AgentSchedulingComponent):
         #
         self._scattered     = self._cfg.get('scattered',     False)
 
+        # * fit_policy:
+        #   Non-MPI units are placed on the first node which can host them.  The
+        #   order in which nodes are considered is determined by this option:
+        #     'first': lowest node index first (default)
+        #     'next' : continue with the node used for the last placement, and
+        #              wrap around at the end of the node list
+        #     'best' : nodes with the least free capacity first (pack nodes)
+        #   All policies use the node store's capacity index, so nodes which
+        #   cannot host the unit are never looked at.
+        self._fit_policy    = self._cfg.get('fit_policy',    FIT_FIRST)
+        self._fit_cursor    = 0
+
+        if self._fit_policy not in FIT_POLICIES:
+            raise ValueError('unknown fit policy %s' % self._fit_policy)
+
+        # * tag_history_size:
+        #   Units can be tagged with the uid of another unit, to be placed on
+        #   the same nodes.  Placements of units referenced by pending units
+        #   are always retained.  Beyond that, we retain this many of the most
+        #   recent placements for units which arrive later (see `TagStore`).
+        self._tag_history = TagStore(self._cfg.get('tag_history_size', 10000))
+
         # NOTE:  for non-oversubscribing mode, we reserve a number of cores
         #        for the GPU processes - even if those GPUs are not used by
         #        a specific workload.  In this case we rewrite the node list and
@@ -140,17 +125,22 @@ class Continuous(AgentSchedulingComponent):
 
             # since we just changed this fundamental setting, we need to
             # recreate the nodelist.
-            self.nodes = []
-            for node, node_uid in self._lrms_node_list:
-                self.nodes.append({
-                    'name': node,
-                    'uid': node_uid,
-                    'cores': [rpc.FREE] * self._lrms_cores_per_node,
-                    'gpus': [rpc.FREE] * self._lrms_gpus_per_node,
-                    'lfs': self._lrms_lfs_per_node
-                })
+            self._init_nodes()
+
+        # If the LRMS knows about the NUMA topology of the nodes, we keep the
+        # cores of each process within one NUMA domain, and place GPU processes
+        # close to the unit's cores (see `Topology`).  Locality violations are
+        # reported in the slots.
+        self._topology = Topology.create(self._lrms_info.get('node_topology'),
+                                         self._lrms_cores_per_node,
+                                         self._lrms_gpus_per_node)
+        self._locality = None
 
+        self._build_node_index()
 
+
+    # --------------------------------------------------------------------------
+    #
     def _try_allocation(self, unit):
         """
         attempt to allocate cores/gpus for a specific unit.
@@ -161,17 +151,8 @@ class Continuous(AgentSchedulingComponent):
         with self._slot_lock:
 
             self._prof.prof('schedule_try', uid=unit['uid'])
-            unit['slots'] = self._allocate_slot(unit['description'])
+            unit['slots'] = self._allocate(unit['description'])
 
-        if unit['slots']:
-            
-            unit_uid = unit['uid']
-            node_uids = []
-            for node in unit['slots']['nodes']:
-                node_uids.append(node['uid'])
-
-            self._tag_history[unit_uid] = node_uids
-            
         # the lock is freed here
         if not unit['slots']:
 
@@ -179,6 +160,8 @@ class Continuous(AgentSchedulingComponent):
             self._prof.prof('schedule_fail', uid=unit['uid'])
             return False
 
+        self._record_tag(unit)
+
         # got an allocation, we can go off and launch the process
         self._prof.prof('schedule_ok', uid=unit['uid'])
 
@@ -193,6 +176,110 @@ class Continuous(AgentSchedulingComponent):
         # True signals success
         return True
 
+    # --------------------------------------------------------------------------
+    #
+    def _try_allocations(self, units):
+        """
+        attempt to allocate cores/gpus for a bulk of units.
+
+        Units can be tagged to other units of the same bulk, and those need to
+        be placed (and recorded in the tag history) before the tagged unit is
+        attempted.  We thus split the bulk in front of any such unit.
+        """
+
+        placed = list()
+        failed = list()
+        chunk  = list()
+        uids   = set()
+
+        for unit in units + [None]:
+
+            if chunk and (unit is None or
+                          unit['description'].get('tag') in uids):
+
+                p, f = AgentSchedulingComponent._try_allocations(self, chunk)
+                for u in p:
+                    self._record_tag(u)
+
+                placed += p
+                failed += f
+                chunk   = list()
+                uids    = set()
+
+            if unit:
+                chunk.append(unit)
+                uids.add(unit['uid'])
+
+        return placed, failed
+
+    # --------------------------------------------------------------------------
+    #
+    def _record_tag(self, unit):
+        """
+        remember the nodes a unit got placed on, so that units tagged with its
+        uid can be placed on the same nodes.  If the unit itself is tagged, it
+        does not reference its tag anymore.
+        """
+
+        self._tag_history.record(unit['uid'],
+                                 [self._node_index[node['uid']]
+                                  for node in unit['slots']['nodes']])
+
+        tag = unit['description'].get('tag')
+        if tag:
+            self._tag_history.dereference(tag)
+
+    # --------------------------------------------------------------------------
+    #
+    def _place_units(self, units, offload=True):
+
+        # tagged units reference their tag until they are placed, so that the
+        # placement of the unit they refer to is retained until then.
+        for unit in units:
+            tag = unit['description'].get('tag')
+            if tag:
+                self._tag_history.reference(tag)
+
+        AgentSchedulingComponent._place_units(self, units, offload)
+
+    # --------------------------------------------------------------------------
+    #
+    def _withdraw(self, units):
+
+        # units handed over to another shard are not placed here anymore
+        for unit in units:
+            tag = unit['description'].get('tag')
+            if tag:
+                self._tag_history.dereference(tag)
+
+    # --------------------------------------------------------------------------
+    #
+    def _allocate_slots(self, cuds):
+        '''
+        Place a bulk of units in a single pass.  While the bulk is placed, we
+        hold the slot lock, so resources are only ever acquired, never released:
+        once a unit of some request shape fails to be placed, all later units of
+        the same shape will fail, too, and are not attempted at all.
+        '''
+
+        ret    = list()
+        failed = set()
+
+        for cud in cuds:
+
+            shape = unit_shape(cud)
+            if shape in failed:
+                ret.append(None)
+                continue
+
+            slots = self._allocate(cud)
+            if not slots:
+                failed.add(shape)
+
+            ret.append(slots)
+
+        return ret
+
     # --------------------------------------------------------------------------
     #
     def _allocate_slot(self, cud):
@@ -231,18 +318,22 @@ class Continuous(AgentSchedulingComponent):
 
     # --------------------------------------------------------------------------
     #
-    def _find_resources(self, node, requested_cores, requested_gpus,
+    def _find_resources(self, idx, requested_cores, requested_gpus,
                         requested_lfs, core_chunk=1, partial=False,
                         lfs_chunk=1, gpu_chunk=1):
         '''
-        Find up to the requested number of free cores and gpus in the node.
+        Find up to the requested number of free cores and gpus in the node with
+        index `idx`.
         This call will return two lists, for each matched set.  If the core
         does not have sufficient free resources to fulfill *both* requests, two
         empty lists are returned.  The call will *not* change the allocation
         status of the node, atomicity must be guaranteed by the caller.
 
         We don't care about continuity within a single node - cores `[1,5]` are
-        assumed to be as close together as cores `[1,2]`.
+        assumed to be as close together as cores `[1,2]`.  If the node topology
+        is known though, we keep each chunk of cores within a NUMA domain, and
+        prefer gpus close to the cores (see `Topology`).  The resulting number
+        of locality violations is left in `self._locality`.
 
         When `chunk` is set, only sets of exactly that size (or multiples
         thereof) are considered valid allocations.  The use case is OpenMP
@@ -261,11 +352,12 @@ class Continuous(AgentSchedulingComponent):
         gpus = list()
         lfs = 0
 
-        # first count the number of free cores, gpus, and local file storage.
-        # This is way quicker than actually finding the core IDs.
-        free_cores = node['cores'].count(rpc.FREE)
-        free_gpus = node['gpus'].count(rpc.FREE)
-        free_lfs = node['lfs']['size']
+        # first check the number of free cores, gpus, and local file storage.
+        # The node store keeps counters for those, so this is way quicker than
+        # actually finding the core IDs.
+        free_cores = self._store.free_cores[idx]
+        free_gpus = self._store.free_gpus[idx]
+        free_lfs = self._store.free_lfs[idx]
 
         alloc_lfs = alloc_cores = alloc_gpus = 0
 
@@ -320,21 +412,17 @@ class Continuous(AgentSchedulingComponent):
             alloc_gpus = num_procs * gpu_chunk
 
         # now dig out the core and gpu IDs.
-        for idx, state in enumerate(node['cores']):
-
-            # break if we have enough cores, else continue to pick FREE ones
-            if alloc_cores == len(cores):
-                break
-            if state == rpc.FREE:
-                cores.append(idx)
-
-        for idx, state in enumerate(node['gpus']):
+        if self._topology:
+            cores, split = self._topology.find_cores(self._store.core_row(idx),
+                                                     alloc_cores / core_chunk,
+                                                     core_chunk)
+            gpus, remote = self._topology.find_gpus(self._store.gpu_row(idx),
+                                                    alloc_gpus, cores)
+            self._locality = {'split': split, 'remote': remote}
 
-            # break if we have enough gpus, else continue to pick FREE ones
-            if alloc_gpus == len(gpus):
-                break
-            if state == rpc.FREE:
-                gpus.append(idx)
+        else:
+            cores = self._store.find_cores(idx, alloc_cores)
+            gpus = self._store.find_gpus(idx, alloc_gpus)
 
         return cores, gpus, alloc_lfs
 
@@ -424,20 +512,36 @@ class Continuous(AgentSchedulingComponent):
         node_name = None
         node_uid = None
 
-        for node in self.nodes:  # FIXME optimization: iteration start
+        # If the unit has a tag with a known placement, only consider the nodes
+        # of that placement.  Otherwise it is an invalid tag, and we continue
+        # as if the unit does not have a tag: we only consider nodes which have
+        # sufficient free cores and gpus, in the order defined by the fit
+        # policy
+        affine = None
+        if tag:
+            affine = self._tag_history.nodes(tag)
+
+        if affine is not None:
+            candidates = sorted(affine)
+        else:
+            candidates = self._store.candidates(requested_cores,
+                                                requested_gpus,
+                                                self._fit_policy,
+                                                self._fit_cursor)
+        for idx in candidates:
+
+            self._nodes_scanned += 1
+
+            node = self.nodes[idx]
 
-            # If unit has a tag, check if the tag is in the tag_history dict,
-            # else it is a invalid tag, continue as if the unit does not have
-            # a tag
-            # If the unit has a valid tag, find the node that matches the
-            # tag from tag_history dict
-            if tag and (tag in self._tag_history.keys()):
-                if node['uid'] not in self._tag_history[tag]:
-                    continue
+            # skip nodes which cannot possibly host the request
+            if not self._store.fits(idx, requested_cores, requested_gpus,
+                                    requested_lfs):
+                continue
 
             # attempt to find the required number of cores and gpus on this
             # node - do not allow partial matches.
-            cores, gpus, lfs = self._find_resources(node=node,
+            cores, gpus, lfs = self._find_resources(idx=idx,
                                                     requested_cores=requested_cores,
                                                     requested_gpus=requested_gpus,
                                                     requested_lfs=requested_lfs,
@@ -451,6 +555,9 @@ class Continuous(AgentSchedulingComponent):
                 # we found the needed resources - break out of search loop
                 node_uid = node['uid']
                 node_name = node['name']
+
+                if self._fit_policy == FIT_NEXT:
+                    self._fit_cursor = idx
                 break
 
         # If we did not find any node to host this request, return `None`
@@ -481,8 +588,30 @@ class Continuous(AgentSchedulingComponent):
                  'lm_info': self._lrms_lm_info
                  }
 
+        if self._topology:
+            self._add_locality(slots['nodes'][-1])
+
         return slots
 
+    # --------------------------------------------------------------------------
+    #
+    def _add_locality(self, node):
+        '''
+        record the locality violations of the last `_find_resources()` call in
+        the given slot node entry:
+
+            'locality': {'split' : number of processes whose cores span NUMA
+                                   domains,
+                         'remote': number of gpus not on a socket which hosts
+                                   any of the unit's cores on that node}
+        '''
+
+        node['locality'] = self._locality
+
+        if self._locality['split'] or self._locality['remote']:
+            self._log.debug('locality violation on %s: %s', node['uid'],
+                            self._locality)
+
     # --------------------------------------------------------------------------
     #
     #
@@ -572,20 +701,26 @@ class Continuous(AgentSchedulingComponent):
                  'lm_info': self._lrms_lm_info,
                  }
 
+        # If the unit has a tag with a known placement, only search the nodes
+        # of that placement.  Otherwise it is an invalid tag, and we continue
+        # as if the unit does not have a tag.
+        affine = None
+        if tag:
+            affine = self._tag_history.nodes(tag)
+
+        if affine is not None:
+            search = sorted(affine)
+        else:
+            search = range(len(self.nodes))
+
         # start the search
-        for node in self.nodes:
+        for idx in search:
 
-            node_uid = node['uid']
-            node_name = node['name']
+            self._nodes_scanned += 1
 
-            # If unit has a tag, check if the tag is in the tag_history dict,
-            # else it is a invalid tag, continue as if the unit does not have
-            # a tag
-            # If the unit has a valid tag, find the node that matches the
-            # tag from tag_history dict
-            if tag and (tag in self._tag_history.keys()):
-                if node['uid'] not in self._tag_history[tag]:
-                    continue
+            node      = self.nodes[idx]
+            node_uid  = node['uid']
+            node_name = node['name']
 
             # if only a small set of cores/gpus remains unallocated (ie. less
             # than node size), we are in fact looking for the last node.  Note
@@ -609,7 +744,7 @@ class Continuous(AgentSchedulingComponent):
             find_lfs = min(requested_lfs - alloced_lfs, lfs_per_node['size'])
 
             # under the constraints so derived, check what we find on this node
-            cores, gpus, lfs = self._find_resources(node=node,
+            cores, gpus, lfs = self._find_resources(idx=idx,
                                                     requested_cores=find_cores,
                                                     requested_gpus=find_gpus,
                                                     requested_lfs=find_lfs,
@@ -656,6 +791,9 @@ class Continuous(AgentSchedulingComponent):
                                    'gpu_map': gpu_map,
                                    'lfs': {'size': lfs, 'path': self._lrms_lfs_per_node['path']}})
 
+            if self._topology:
+                self._add_locality(slots['nodes'][-1])
+
             alloced_cores += len(cores)
             alloced_gpus += len(gpus)
             alloced_lfs += lfs
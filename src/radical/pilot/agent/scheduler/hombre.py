@@ -3,48 +3,25 @@ __copyright__ = "Copyright 2017, http://radical.rutgers.edu"
 __license__   = "MIT"
 
 
-
-import os
-import pprint
+import math
 import threading as mt
 
-import radical.utils as ru
-
 from .base import AgentSchedulingComponent
 
 
 # ------------------------------------------------------------------------------
 #
-# FIXME: make this a runtime switch depending on cprofile availability
-# FIXME: move this to utils (implies another parameter to `dec_all_methods()`)
+# unit description keys which define the shape of a unit, and thus the chunk
+# pool it is served from
 #
-import cProfile
-cprof = cProfile.Profile()
-
-
-def cprof_it(func):
-    def wrapper(*args, **kwargs):
-        retval = cprof.runcall(func, *args, **kwargs)
-        return retval
-    return wrapper
-
-
-def dec_all_methods(dec):
-    import inspect
-    def dectheclass(cls):
-        if ru.is_main_thread():
-            cprof_env   = os.getenv("RADICAL_PILOT_CPROFILE_COMPONENTS", "")
-            cprof_elems = cprof_env.split()
-            if "CONTINUOUS" in cprof_elems:
-                for name, m in inspect.getmembers(cls, inspect.ismethod):
-                    setattr(cls, name, dec(m))
-        return cls
-    return dectheclass
+CHUNK_KEYS = ['cpu_processes', 'cpu_process_type',
+              'cpu_threads',   'cpu_thread_type',
+              'gpu_processes', 'gpu_process_type',
+              'gpu_threads',   'gpu_thread_type']
 
 
 # ------------------------------------------------------------------------------
 #
-@dec_all_methods(cprof_it)
 class Hombre(AgentSchedulingComponent):
     '''
     HOMBRE: HOMogeneous Bag-of-task REsource allocator.  Don't kill me...
@@ -57,6 +34,13 @@ class Hombre(AgentSchedulingComponent):
     need to be made, the scheduler really just hands out pre-defined chunks,
     which is relatively quick - that's the point, to trade generality with
     performance.
+
+    Workloads which mix a few different unit shapes are supported by keeping
+    one chunk pool per shape.  Pools own whole nodes: when a pool runs out of
+    chunks, it splits a new group of nodes off the spare nodes, and when no
+    spare nodes are left, groups of other pools which have no allocated chunks
+    are merged back into the spare nodes.  Allocation and release thus remain
+    (amortized) constant time operations.
     '''
 
     # --------------------------------------------------------------------------
@@ -68,21 +52,6 @@ class Hombre(AgentSchedulingComponent):
         AgentSchedulingComponent.__init__(self, cfg, session)
 
 
-    # --------------------------------------------------------------------------
-    #
-    # FIXME: this should not be overloaded here, but in the base class
-    #
-    def finalize_child(self):
-
-        cprof_env = os.getenv("RADICAL_PILOT_CPROFILE_COMPONENTS", "")
-        if "HOMBRE" in cprof_env.split():
-            self_thread = mt.current_thread()
-            cprof.dump_stats("python-%s.profile" % self_thread.name)
-
-        # make sure that parent finalizers are called
-        super(Hombre, self).finalize_child()
-
-
     # --------------------------------------------------------------------------
     #
     def _configure(self):
@@ -96,37 +65,90 @@ class Hombre(AgentSchedulingComponent):
         #   for each set of requested GPU processes.
         self._oversubscribe = self._cfg.get('oversubscribe', True)
 
-        # NOTE: We delay the actual configuration until we received the first
-        #       unit to schedule - at that point we can slice and dice the
-        #       resources into suitable static slots.
-        self._configured = False
+        self.cpn = self._lrms_cores_per_node
+        self.gpn = self._lrms_gpus_per_node
+
+        # NOTE: We delay the actual slicing of resources until we receive the
+        #       first unit of a certain shape - at that point we create a chunk
+        #       pool for that shape (see `_create_pool()`).  Pools take nodes
+        #       from the list of spare nodes when they run out of chunks, and
+        #       return nodes to it when other pools need them.
+        self._pools = dict()                    # unit shape -> chunk pool
+        self._spare = range(len(self.nodes))    # indexes of unowned nodes
+        self._owner = dict()                    # node index -> owning group
+        self.lock   = mt.Lock()                 # lock for the above
 
-        self.free = list()     # declare for early debug output
+        self._build_node_index()
 
 
     # --------------------------------------------------------------------------
     #
-    def _delayed_configure(self, cud):
+    def _create_pool(self, cud):
+        '''
+        A pool hands out equally sized chunks of resources for units of one
+        shape.  Chunks are cut from groups of nodes: a group is the smallest
+        set of nodes which can host at least one chunk, and is owned by exactly
+        one pool.  A pool is a dict with the following entries:
+
+            chunk      : the unit shape served by this pool
+            group_size : number of nodes needed per group
+            free       : list of `(group, slots)` tuples for free chunks
+            n_free     : number of valid entries in `free`
+            idle       : list of groups with no allocated chunks
+
+        The chunking is fast, no decisions need to be made, the scheduler
+        really just hands out pre-defined chunks.  That remains true for mixed
+        workloads, as long as they consist of a few different unit shapes.
+        '''
 
-        if self._configured:
-            return
+        chunk = dict([(k, cud[k]) for k in CHUNK_KEYS])
 
-        self.chunk  = {'cpu_processes'    : cud['cpu_processes'   ],
-                       'cpu_process_type' : cud['cpu_process_type'],
-                       'cpu_threads'      : cud['cpu_threads'     ],
-                       'cpu_thread_type'  : cud['cpu_thread_type' ],
+        # check if we need single or multi-node chunks
+        if  cud['cpu_process_type'] != 'MPI' and \
+            cud['gpu_process_type'] != 'MPI' :
+
+            # single node chunks are cut from individual nodes
+            group_size = 1
+
+        else:
 
-                       'gpu_processes'    : cud['gpu_processes'   ],
-                       'gpu_process_type' : cud['gpu_process_type'],
-                       'gpu_threads'      : cud['gpu_threads'     ],
-                       'gpu_thread_type'  : cud['gpu_thread_type' ],
-                       }
+            # Multi node chunks can span a number of nodes.  Note that the
+            # chunking in `_carve()` never uses the last core and gpu on
+            # a node.
+            cores_per_node = (self.cpn - 1) / cud['cpu_threads']
+            gpus_per_node  = (self.gpn - 1)
 
-        self.cpn     = self._lrms_cores_per_node
-        self.gpn     = self._lrms_gpus_per_node
+            if (cud['cpu_processes'] and not cores_per_node) or \
+               (cud['gpu_processes'] and not gpus_per_node ) :
+                raise ValueError('unit processes do not fit onto nodes')
 
-        self.free    = list()     # list of free chunks
-        self.lock    = mt.Lock()  # lock for the above list
+            group_size = 1
+            if cud['cpu_processes']:
+                group_size = max(group_size, int(math.ceil(
+                        cud['cpu_processes'] / float(cores_per_node))))
+            if cud['gpu_processes']:
+                group_size = max(group_size, int(math.ceil(
+                        cud['gpu_processes'] / float(gpus_per_node))))
+
+        if group_size > len(self.nodes):
+            raise ValueError('unit does not fit onto allocation')
+
+        return {'chunk'      : chunk,
+                'group_size' : group_size,
+                'free'       : list(),
+                'n_free'     : 0,
+                'idle'       : list()}
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _carve(self, cud, nodes):
+        '''
+        Create as many equal sized chunks from the given nodes as possible, and
+        return them as list of slots.
+        '''
+
+        chunks = list()
 
         cores_needed = cud['cpu_processes'] * cud['cpu_threads']
         gpus_needed  = cud['gpu_processes']
@@ -135,14 +157,9 @@ class Hombre(AgentSchedulingComponent):
         single_node = False
         if  cud['cpu_process_type'] != 'MPI' and \
             cud['gpu_process_type'] != 'MPI' :
-
             single_node = True
 
         # ---------------------------------------------------------------------
-        # create as many equal sized chunks from the available nodes as
-        # possible, and put them into the `free` list.  The actual scheduling
-        # algorithm will blindly pick chunks from that list whenever a new CUD
-        # arrives.
         if single_node:
 
             # how many CUs fit on a single node?
@@ -160,10 +177,12 @@ class Hombre(AgentSchedulingComponent):
                 else:
                     units_per_node = self.cpn / (cores_needed + gpus_needed)
 
-            assert(units_per_node), 'Non-mpi unit does not fit onto single node'
+            if not units_per_node:
+                raise ValueError('Non-mpi unit does not fit onto single node')
+
             self._log.debug('upn: %d', units_per_node)
 
-            for node in self.nodes:
+            for node in nodes:
 
                 node_uid  = node['uid']
                 node_name = node['name']
@@ -200,8 +219,7 @@ class Hombre(AgentSchedulingComponent):
                              'gpus_per_node' : self.gpn,
                              'lm_info'       : self._lrms_lm_info
                              }
-                    self.free.append(slots)
-                  # self._log.debug('--> %s', slots['nodes'])
+                    chunks.append(slots)
 
                 assert(core_idx <= self.cpn), 'inconsistent scheduler state'
                 assert(gpu_idx  <= self.gpn), 'inconsistent scheduler state'
@@ -217,24 +235,23 @@ class Hombre(AgentSchedulingComponent):
             #       cores or GPUs - whichever coes first will limit the max
             #       number of concurrent units anyway.
 
-            core_map = list()
-            gpu_map  = list()
+            # a chunk can span several nodes: we collect the cores and gpus
+            # used on each node in a separate entry of the chunk's node list.
+            chunk_nodes = list()
+            n_cores     = 0
+            n_gpus      = 0
 
-            for node in self.nodes:
+            for node in nodes:
 
-                node_uid  = node['uid']
-                node_name = node['name']
-
-                core_idx  = 0
-                gpu_idx   = 0
-
-              # self._log.debug('reset idxs')
+                entry    = [node['name'], node['uid'], list(), list()]
+                core_idx = 0
+                gpu_idx  = 0
 
                 # allocate chunks for as long as possible
                 while True:
 
                     # do we still need cores?
-                    while len(core_map) < cud['cpu_processes']:
+                    while n_cores < cud['cpu_processes']:
                         # do we still have cores on this node:
                         if core_idx + cud['cpu_threads'] < self.cpn:
                             # use them
@@ -242,45 +259,46 @@ class Hombre(AgentSchedulingComponent):
                             for _ in range(cud['cpu_threads']):
                                 tmp.append(core_idx)
                                 core_idx += 1 
-                            core_map.append(tmp)
+                            entry[2].append(tmp)
+                            n_cores += 1
                         else:
                             break
 
-                    # do we still need gpu_map?
-                    while len(gpu_map) < cud['gpu_processes']:
-                        # do we still have gpu_map on this node:
+                    # do we still need gpus?
+                    while n_gpus < cud['gpu_processes']:
+                        # do we still have gpus on this node:
                         if gpu_idx + 1 < self.gpn:
                             # use them
-                            gpu_map.append([gpu_idx])
+                            entry[3].append([gpu_idx])
                             gpu_idx += 1 
+                            n_gpus  += 1
                         else:
                             break
 
+                    if entry[2] or entry[3]:
+                        chunk_nodes.append(entry)
+
                     # is a chunk filled?
-                    if  len(core_map) == cud['cpu_processes'] and \
-                        len(gpu_map)  == cud['gpu_processes']:
+                    if  n_cores == cud['cpu_processes'] and \
+                        n_gpus  == cud['gpu_processes']:
 
-                        slots = {'nodes'         : [[node_name, node_uid, core_map, gpu_map]],
+                        slots = {'nodes'         : chunk_nodes,
                                  'cores_per_node': self.cpn,
                                  'gpus_per_node' : self.gpn,
                                  'lm_info'       : self._lrms_lm_info
                                  }
-                        self.free.append(slots)
-                      # self._log.debug('got ', slots)
+                        chunks.append(slots)
 
-                        core_map = list()
-                        gpu_map  = list()
+                        chunk_nodes = list()
+                        n_cores     = 0
+                        n_gpus      = 0
+                        entry       = [node['name'], node['uid'], list(), list()]
 
                     else:
-                      # self._log.debug('enough')
                         # no more slots on this node - go to next
                         break
 
-        self._log.debug('free:')
-        self._log.debug(pprint.pformat([s['nodes'] for s in self.free]))
-      # self._log.debug(' = initial  [%d]', len(self.free))
-
-        self._configured = True
+        return chunks
 
 
     # --------------------------------------------------------------------------
@@ -291,25 +309,22 @@ class Hombre(AgentSchedulingComponent):
         a unit needs to be mapped to a set of cores / gpus.
         '''
 
-      # self._log.debug('=> allocate [%d]', len(self.free))
-        if not self._configured:
-            self._delayed_configure(cud)
+        shape = tuple([cud[k] for k in CHUNK_KEYS])
+
+        with self.lock:
+
+            pool = self._pools.get(shape)
+            if not pool:
+                pool = self._create_pool(cud)
+                self._pools[shape] = pool
 
-        # ensure that all CUDs require the same amount of reources
-        for k,v in self.chunk.iteritems():
-            if cud[k] != v:
-                raise ValueError('hetbre?  %d != %d' % (v, cud[k]))
+            slots = self._find_slots(pool)
 
-      # self._log.debug('find new slot')
-        slots = self._find_slots(cud)
         if slots:
             self._log.debug('allocate slot %s', slots['nodes'])
         else:
             self._log.debug('allocate slot %s', slots)
 
-      # self._log.debug('<= allocate [%d]', len(self.free))
-
-
         return slots
 
 
@@ -322,23 +337,127 @@ class Hombre(AgentSchedulingComponent):
         `_allocate_slots()`.
         '''
 
-      # self._log.debug('=> release  [%d]', len(self.free))
         self._log.debug('release  slot %s', slots['nodes'])
+
+        # the first node of the slots identifies the group the chunk belongs to
+        idx = self._node_index[slots['nodes'][0][1]]
+
         with self.lock:
-             self.free.append(slots)
-      # self._log.debug('<= release  [%d]', len(self.free))
+
+            group = self._owner[idx]
+            pool  = group['pool']
+
+            pool['free'].append((group, slots))
+            pool['n_free'] += 1
+            group['busy']  -= 1
+
+            # groups without allocated chunks can be merged back into the
+            # spare nodes, when other pools need them
+            if not group['busy'] and not group['idle']:
+                group['idle'] = True
+                pool['idle'].append(group)
 
 
     # --------------------------------------------------------------------------
     #
-    def _find_slots(self, cores_requested):
+    def _find_slots(self, pool):
 
         # check if we have free chunks laying around - return one
-        with self.lock:
-            if self.free:
-                return self.free.pop()
-            else:
-                return None
+        slots = self._pop_chunk(pool)
+        if slots:
+            return slots
+
+        # otherwise split a new group off the spare nodes - if there are not
+        # enough of those, merge idle groups of all pools back in first.
+        if len(self._spare) < pool['group_size']:
+            self._merge(pool['group_size'])
+
+        if len(self._spare) < pool['group_size']:
+            return None
+
+        self._split(pool)
+
+        return self._pop_chunk(pool)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _pop_chunk(self, pool):
+
+        # entries of groups which were merged back are skipped
+        free = pool['free']
+        while free:
+
+            group, slots = free.pop()
+            if group['dead']:
+                continue
+
+            group['busy']  += 1
+            pool['n_free'] -= 1
+            return slots
+
+        return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _split(self, pool):
+
+        # take nodes for a new group off the spare nodes, and cut it into
+        # chunks
+        nodes  = [self._spare.pop() for _ in range(pool['group_size'])]
+        chunks = self._carve(pool['chunk'], [self.nodes[idx] for idx in nodes])
+        group  = {'pool'    : pool,
+                  'nodes'   : nodes,
+                  'n_chunks': len(chunks),
+                  'busy'    : 0,
+                  'idle'    : False,
+                  'dead'    : False}
+
+        for idx in nodes:
+            self._owner[idx] = group
+
+        for slots in chunks:
+            pool['free'].append((group, slots))
+
+        pool['n_free'] += len(chunks)
+
+        self._log.debug('split %d chunks off %s', len(chunks), nodes)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _merge(self, needed):
+
+        # return idle groups to the spare nodes, until `needed` nodes are spare
+        for pool in self._pools.itervalues():
+
+            idle = pool['idle']
+            while idle and len(self._spare) < needed:
+
+                group = idle.pop()
+                group['idle'] = False
+
+                if group['busy']:
+                    # group got used again since it became idle
+                    continue
+
+                group['dead']   = True
+                pool['n_free'] -= group['n_chunks']
+
+                for idx in group['nodes']:
+                    del(self._owner[idx])
+                    self._spare.append(idx)
+
+                self._log.debug('merge %s', group['nodes'])
+
+            # the free list still holds the chunks of merged groups - compact
+            # it if it got too stale
+            if len(pool['free']) > 2 * pool['n_free']:
+                pool['free'] = [e for e in pool['free'] if not e[0]['dead']]
+
+            if len(self._spare) >= needed:
+                break
 
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,353 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import array
+import heapq
+import bisect
+import string
+
+from ... import constants as rpc
+
+
+# ------------------------------------------------------------------------------
+#
+# search pattern for free resources, and translation table for visual
+# representation of the resource states (see `NodeStore.status()`)
+#
+_FREE   = bytes(bytearray([rpc.FREE]))
+_STATUS = string.maketrans(chr(rpc.FREE) + chr(rpc.BUSY), '-#')
+
+
+# ------------------------------------------------------------------------------
+#
+# node selection policies for `NodeStore.candidates()`
+#
+FIT_FIRST = 'first'     # lowest node index first
+FIT_NEXT  = 'next'      # lowest node index after a rotating cursor first
+FIT_BEST  = 'best'      # least free capacity first
+FIT_POLICIES = [FIT_FIRST, FIT_NEXT, FIT_BEST]
+
+
+# ==============================================================================
+#
+class NodeStore(object):
+    '''
+    The node store keeps track of the state of all cores, gpus and local file
+    system space of the nodes managed by an agent scheduler.  Instead of one
+    python list per node and resource type, the store keeps one `bytearray` per
+    resource type, with one byte per core (or gpu), laid out node by node:
+
+        cores = [----------------################--------########--------]
+                 |    node 0    ||    node 1    ||    node 2    | ...
+
+    Each byte is either `rpc.FREE` or `rpc.BUSY`.  Additionally, the store keeps
+    the number of free cores, gpus and lfs for each node in `array`s, which are
+    kept up to date on every state change.  That renders the check if a request
+    fits onto a node an O(1) operation, and the search for free core and gpu IDs
+    a `bytearray.find()` scan over the node's row.
+
+    Nodes are referred to by their index in the LRMS node list, which is also
+    the index into the scheduler's `self.nodes` list.  The store itself does not
+    know about node names or uids.
+
+    The store also maintains a capacity index: nodes are kept in buckets keyed
+    by their number of free cores and gpus, each bucket being a sorted list of
+    node indexes.  The number of buckets is bound by the node size, not by the
+    number of nodes, so that `candidates()` can find the nodes which are able
+    to host a request without looking at any full or too fragmented nodes.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, n_nodes, cores_per_node, gpus_per_node, lfs_per_node):
+
+        self.n_nodes        = n_nodes
+        self.cores_per_node = cores_per_node
+        self.gpus_per_node  = gpus_per_node
+
+        if lfs_per_node:
+            self.lfs_path = lfs_per_node.get('path')
+            self.lfs_size = lfs_per_node.get('size', 0)
+        else:
+            self.lfs_path = None
+            self.lfs_size = 0
+
+        # resource state matrices, one byte per core / gpu
+        self.cores = bytearray([rpc.FREE]) * (n_nodes * cores_per_node)
+        self.gpus  = bytearray([rpc.FREE]) * (n_nodes * gpus_per_node)
+
+        # per-node free counters
+        self.free_cores = array.array('l', [cores_per_node] * n_nodes)
+        self.free_gpus  = array.array('l', [gpus_per_node ] * n_nodes)
+        self.free_lfs   = array.array('l', [self.lfs_size ] * n_nodes)
+
+        # capacity index: (free_cores, free_gpus) -> sorted list of node indexes
+        key           = (cores_per_node, gpus_per_node)
+        self._keys    = [key] * n_nodes
+        self._buckets = {key: range(n_nodes)} if n_nodes else dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        return self.n_nodes
+
+
+    # --------------------------------------------------------------------------
+    #
+    def fits(self, idx, cores, gpus, lfs):
+        '''
+        Check if the given number of cores, gpus and lfs is available on the
+        node with index `idx`.
+        '''
+
+        return cores <= self.free_cores[idx] and \
+               gpus  <= self.free_gpus [idx] and \
+               lfs   <= self.free_lfs  [idx]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def find_cores(self, idx, n):
+        '''
+        return the IDs of up to `n` free cores on the node with index `idx`.
+        '''
+
+        return self._find(self.cores, idx, self.cores_per_node, n)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def find_gpus(self, idx, n):
+        '''
+        return the IDs of up to `n` free gpus on the node with index `idx`.
+        '''
+
+        return self._find(self.gpus, idx, self.gpus_per_node, n)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def core_row(self, idx):
+        '''
+        return a copy of the core states of the node with index `idx`
+        '''
+
+        cpn = self.cores_per_node
+        return self.cores[idx * cpn:(idx + 1) * cpn]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def gpu_row(self, idx):
+        '''
+        return a copy of the gpu states of the node with index `idx`
+        '''
+
+        gpn = self.gpus_per_node
+        return self.gpus[idx * gpn:(idx + 1) * gpn]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _find(self, matrix, idx, width, n):
+
+        ret   = list()
+        start = idx * width
+        end   = start + width
+
+        if n <= 0:
+            return ret
+
+        pos = matrix.find(_FREE, start, end)
+        while pos >= 0:
+            ret.append(pos - start)
+            if len(ret) == n:
+                break
+            pos = matrix.find(_FREE, pos + 1, end)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def set_slots(self, idx, cores, gpus, state):
+        '''
+        set the given cores and gpus of node `idx` to `state`, and update the
+        node's free counters.  The node is moved in the capacity index once,
+        for both resource types.
+        '''
+
+        self.free_cores[idx] += self._set(self.cores, idx, self.cores_per_node,
+                                          cores, state)
+        self.free_gpus[idx]  += self._set(self.gpus,  idx, self.gpus_per_node,
+                                          gpus,  state)
+        self._reindex(idx)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def set_cores(self, idx, cores, state):
+        '''
+        set the given cores of node `idx` to `state`, and update the node's free
+        core counter.
+        '''
+
+        self.set_slots(idx, cores, [], state)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def set_gpus(self, idx, gpus, state):
+        '''
+        set the given gpus of node `idx` to `state`, and update the node's free
+        gpu counter.
+        '''
+
+        self.set_slots(idx, [], gpus, state)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _set(self, matrix, idx, width, ids, state):
+
+        # returns the change in the number of free resources
+        base    = idx * width
+        changed = 0
+
+        for i in ids:
+            if matrix[base + i] != state:
+                matrix[base + i] = state
+                changed += 1
+
+        if state == rpc.BUSY:
+            return -changed
+        else:
+            return changed
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reindex(self, idx):
+
+        # move the node into the bucket matching its current free capacity.
+        # The bisection finds the positions in O(log n), but the list delete
+        # and insert shift the tail of the buckets, so this is O(n) in the
+        # bucket sizes - a memmove of pointers, which is fast enough for any
+        # node count we see, but not free: call this once per node change.
+        old = self._keys[idx]
+        new = (self.free_cores[idx], self.free_gpus[idx])
+
+        if old == new:
+            return
+
+        bucket = self._buckets[old]
+        del(bucket[bisect.bisect_left(bucket, idx)])
+        if not bucket:
+            del(self._buckets[old])
+
+        if new not in self._buckets:
+            self._buckets[new] = list()
+        bisect.insort(self._buckets[new], idx)
+
+        self._keys[idx] = new
+
+
+    # --------------------------------------------------------------------------
+    #
+    def candidates(self, cores, gpus, policy=FIT_FIRST, cursor=0):
+        '''
+        Generate the indexes of all nodes which have at least the given number
+        of free cores and gpus, in the order defined by `policy`:
+
+          FIT_FIRST: ascending node index
+          FIT_NEXT : ascending node index, starting at `cursor` and wrapping
+                     around
+          FIT_BEST : ascending free capacity, then ascending node index
+
+        The generator is lazy, and must not be used across state changes of the
+        store.  Note that lfs is not part of the capacity index, so the caller
+        still needs to check that on the generated nodes.
+        '''
+
+        keys = [key for key in self._buckets
+                     if key[0] >= cores and key[1] >= gpus]
+
+        if policy == FIT_BEST:
+            for key in sorted(keys):
+                for idx in self._buckets[key]:
+                    yield idx
+            return
+
+        buckets = [self._buckets[key] for key in keys]
+
+        if policy == FIT_NEXT:
+            starts = [bisect.bisect_left(b, cursor) for b in buckets]
+            for idx in heapq.merge(*[_tail(b, s)
+                                     for b, s in zip(buckets, starts)]):
+                yield idx
+            for idx in heapq.merge(*[_head(b, s)
+                                     for b, s in zip(buckets, starts)]):
+                yield idx
+            return
+
+        for idx in heapq.merge(*buckets):
+            yield idx
+
+
+    # --------------------------------------------------------------------------
+    #
+    def set_lfs(self, idx, size, state):
+        '''
+        reserve (`rpc.BUSY`) or release (`rpc.FREE`) the given amount of local
+        file system space on node `idx`.
+        '''
+
+        if self.lfs_path is None:
+            return
+
+        if state == rpc.BUSY: self.free_lfs[idx] -= size
+        else                : self.free_lfs[idx] += size
+
+
+    # --------------------------------------------------------------------------
+    #
+    def status(self):
+        '''
+        Returns a string representation of the core and gpu states of all nodes,
+        as `|--##:-#|----:--|...`.
+        '''
+
+        cpn = self.cores_per_node
+        gpn = self.gpus_per_node
+
+        cores = str(self.cores).translate(_STATUS)
+        gpus  = str(self.gpus ).translate(_STATUS)
+
+        ret = '|'
+        for idx in range(self.n_nodes):
+            ret += '%s:%s|' % (cores[idx * cpn:(idx + 1) * cpn],
+                               gpus [idx * gpn:(idx + 1) * gpn])
+
+        return ret
+
+
+# ------------------------------------------------------------------------------
+#
+# iterate over a sorted bucket without copying it
+#
+def _head(bucket, end):
+    for i in xrange(end):
+        yield bucket[i]
+
+
+def _tail(bucket, start):
+    for i in xrange(start, len(bucket)):
+        yield bucket[i]
+
+
+# ------------------------------------------------------------------------------
+
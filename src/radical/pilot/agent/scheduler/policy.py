@@ -0,0 +1,327 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import heapq
+
+
+# ------------------------------------------------------------------------------
+#
+# Agent scheduling policies:
+#
+#   default  : units are placed as they arrive; units which don't fit wait in
+#              buckets of identical shape and are retried when resources are
+#              freed (see `wait_pool.py`).
+#   backfill : units are placed in order of priority (higher first) and
+#              arrival.  If the first unit in that order does not fit, nodes
+#              are reserved for it (EASY backfilling): later units may only
+#              use the remaining holes if they are estimated to complete
+#              before the reservation starts, or if they don't touch the
+#              reserved resources.
+#   fifo     : units are placed strictly in order of submission (see
+#              `unit_order()`): as long as the oldest waiting unit does not
+#              fit, no other unit is placed.  Unit priorities are ignored.
+#
+POLICY_DEFAULT  = 'default'
+POLICY_BACKFILL = 'backfill'
+POLICY_FIFO     = 'fifo'
+POLICIES        = [POLICY_DEFAULT, POLICY_BACKFILL, POLICY_FIFO]
+
+# units without runtime estimate are assumed to run forever
+INFINITY = float('inf')
+
+
+# ------------------------------------------------------------------------------
+#
+def unit_priority(cud):
+    '''
+    Return the scheduling priority of a unit description (default `0`).
+    '''
+
+    return cud.get('priority') or 0
+
+
+# ------------------------------------------------------------------------------
+#
+def unit_order(unit):
+    '''
+    Return the submission sequence number of a unit, which the unit manager
+    stamps on submission.  Units without one (which were not submitted through
+    a unit manager) are ordered after all others.
+    '''
+
+    seq = unit.get('submit_seq')
+    if seq is None:
+        return INFINITY
+
+    return seq
+
+
+# ------------------------------------------------------------------------------
+#
+def unit_end(cud, now):
+    '''
+    Return the estimated end time of a unit description which starts at `now`,
+    or `INFINITY` if the description has no runtime estimate.
+    '''
+
+    runtime = cud.get('runtime_estimate')
+    if not runtime:
+        return INFINITY
+
+    return now + runtime
+
+
+# ------------------------------------------------------------------------------
+#
+def slot_usage(slots, node_index):
+    '''
+    Return the resources used by the given slots as list of tuples
+    `(node idx, cores, gpus)`, or `None` if the slots don't follow the default
+    slot structure (see top of `base.py`).
+    '''
+
+    if not slots or 'nodes' not in slots:
+        return None
+
+    usage = list()
+    for node in slots['nodes']:
+
+        if not isinstance(node, dict):
+            return None
+
+        idx = node_index.get(node['uid'])
+        if idx is None:
+            return None
+
+        usage.append((idx, sum([len(cslot) for cslot in node['core_map']]),
+                           sum([len(gslot) for gslot in node['gpu_map']])))
+
+    return usage
+
+
+# ==============================================================================
+#
+class OrderedPool(object):
+    '''
+    A wait pool which orders units by priority (higher first, unless
+    `prioritized` is `False`), submission (see `unit_order()`) and arrival.
+    Each unit gets a monotonic arrival sequence number when it is added, which
+    also identifies its heap entry.  Units are kept in a heap, so that adding
+    a unit and removing the first unit are `O(log n)`.  Units removed from
+    elsewhere in the pool are dropped lazily, once they reach the top of the
+    heap.
+
+    The pool is interface compatible with `WaitPool` as far as the generic
+    scheduler code is concerned (`add()`, `units()`, `remove()`).  It is not
+    thread safe - locking is up to the caller.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, prioritized=True):
+
+        self._prioritized = prioritized
+
+        self._heap = list()   # [-priority, submit seq, seq, unit]
+        self._live = dict()   # uid -> seq of the live heap entry
+        self._seq  = 0        # arrival counter
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        return len(self._live)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, unit):
+
+        if self._prioritized: prio = unit_priority(unit['description'])
+        else                : prio = 0
+
+        entry = [-prio, unit_order(unit), self._seq, unit]
+        self._live[unit['uid']] = self._seq
+        self._seq += 1
+
+        heapq.heappush(self._heap, entry)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _is_live(self, entry):
+
+        return self._live.get(entry[3]['uid']) == entry[2]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def head(self):
+        '''
+        return the first unit in order, or `None`
+        '''
+
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            return None
+
+        return self._heap[0][3]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pop(self):
+        '''
+        remove and return the first unit in order
+        '''
+
+        self.head()
+        unit = heapq.heappop(self._heap)[3]
+        del(self._live[unit['uid']])
+
+        return unit
+
+
+    # --------------------------------------------------------------------------
+    #
+    def units(self, n=None):
+        '''
+        return a list of all waiting units (or of the first `n`), in order
+        '''
+
+        live = [entry for entry in self._heap if self._is_live(entry)]
+
+        if n is None or n >= len(live):
+            return [entry[3] for entry in sorted(live)]
+
+        return [entry[3] for entry in heapq.nsmallest(n, live)]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def remove(self, units):
+        '''
+        remove the given units from the pool
+        '''
+
+        for unit in units:
+            self._live.pop(unit['uid'], None)
+
+        # don't let the heap fill up with dead entries
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+
+# ==============================================================================
+#
+class Reservation(object):
+    '''
+    The resources reserved for a blocked unit: the estimated time at which the
+    unit can start (`shadow`), and the resources which are spare at that time
+    once the unit is placed (free cores and gpus per node).  Units placed
+    before the shadow time are admitted if they are estimated to complete
+    before it, or if they fit into the spare resources (which they then use
+    up).
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, shadow, spare_cores, spare_gpus):
+
+        self.shadow      = shadow
+        self.spare_cores = spare_cores
+        self.spare_gpus  = spare_gpus
+
+
+    # --------------------------------------------------------------------------
+    #
+    def admit(self, end, usage):
+        '''
+        Check if a unit with the given estimated end time and resource usage
+        (see `slot_usage()`) can be placed without delaying the reservation.
+        '''
+
+        if end <= self.shadow and end != INFINITY:
+            return True
+
+        if usage is None:
+            return False
+
+        for idx, cores, gpus in usage:
+            if cores > self.spare_cores[idx] or gpus > self.spare_gpus[idx]:
+                return False
+
+        for idx, cores, gpus in usage:
+            self.spare_cores[idx] -= cores
+            self.spare_gpus[idx]  -= gpus
+
+        return True
+
+
+# ------------------------------------------------------------------------------
+#
+def reserve(shape, free_cores, free_gpus, running):
+    '''
+    Find the earliest time at which a unit of the given shape (see
+    `wait_pool.unit_shape()`) can be placed, given the currently free cores and
+    gpus per node, and the list of running units as `(end, usage)` tuples (see
+    `unit_end()` and `slot_usage()`).  Return a `Reservation`, or `None` if the
+    unit can't be placed even after all running units completed, or if the
+    usage of a running unit is unknown.
+
+    Single-node units are reserved on the first node which fits, multi-node
+    units on the first nodes with free resources.  The scheduler may place the
+    unit elsewhere in the end, so this is an estimate.
+    '''
+
+    cores, gpus, _, mpi, _ = shape
+
+    free_cores = list(free_cores)
+    free_gpus  = list(free_gpus)
+
+    for end, usage in [(0.0, list())] + sorted(running):
+
+        if usage is None:
+            return None
+
+        for idx, ucores, ugpus in usage:
+            free_cores[idx] += ucores
+            free_gpus [idx] += ugpus
+
+        if mpi:
+            if cores > sum(free_cores) or gpus > sum(free_gpus):
+                continue
+
+            spare_cores = list(free_cores)
+            spare_gpus  = list(free_gpus)
+            need_cores  = cores
+            need_gpus   = gpus
+            for idx in range(len(spare_cores)):
+                take_cores = min(need_cores, spare_cores[idx])
+                take_gpus  = min(need_gpus,  spare_gpus [idx])
+                spare_cores[idx] -= take_cores
+                spare_gpus [idx] -= take_gpus
+                need_cores       -= take_cores
+                need_gpus        -= take_gpus
+
+            return Reservation(end, spare_cores, spare_gpus)
+
+        for idx in range(len(free_cores)):
+            if cores <= free_cores[idx] and gpus <= free_gpus[idx]:
+                spare_cores = list(free_cores)
+                spare_gpus  = list(free_gpus)
+                spare_cores[idx] -= cores
+                spare_gpus [idx] -= gpus
+                return Reservation(end, spare_cores, spare_gpus)
+
+    return None
+
+
+# ------------------------------------------------------------------------------
+
@@ -34,13 +34,16 @@ class Scattered(AgentSchedulingComponent):
         # TODO: use real core/gpu numbers for non-exclusive reservations
 
         self.nodes = []
-        for node in self._lrms_node_list:
+        for node, node_uid in self._lrms_node_list:
             self.nodes.append({
                 'name' : '%s:0' % node,
+                'uid'  : node_uid,
                 'cores': rpc.FREE * self._lrms_cores_per_node,
                 'gpus' : rpc.FREE * self._lrms_gpus_per_node
             })
 
+        self._build_node_index()
+
 
     # --------------------------------------------------------------------------
     #
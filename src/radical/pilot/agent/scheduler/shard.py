@@ -0,0 +1,186 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import zlib
+
+
+# ------------------------------------------------------------------------------
+#
+# Unit routing policies for sharded agent scheduling:
+#
+#   hash     : units are routed to the shard selected by a hash over the unit's
+#              tag (if it has one) or uid.  Tagged units thus land on the same
+#              shard as the unit they refer to (unless that one is tagged, too).
+#   capacity : units are placed by the shard which receives them, and are
+#              forwarded to other shards only if they can't be placed locally,
+#              but the capacity hints of another shard show sufficient room.
+#
+ROUTE_HASH     = 'hash'
+ROUTE_CAPACITY = 'capacity'
+ROUTE_POLICIES = [ROUTE_HASH, ROUTE_CAPACITY]
+
+# units which are too large for any shard but the coordinator are escalated to
+# the coordinator shard
+COORDINATOR = 0
+
+
+# ------------------------------------------------------------------------------
+#
+def shard_topic(pubsub, shard=None):
+    '''
+    Return the topic for messages to the given shard on the given pubsub
+    channel, so that each shard only receives its own messages.  Messages to
+    all shards are published on the topic returned for `shard=None`.
+
+    Subscriptions match topics by prefix: shard numbers are padded to the same
+    width, so that no shard's topic is a prefix of another one.
+    '''
+
+    if shard is None:
+        return '%s.all' % pubsub
+
+    return '%s.%04d' % (pubsub, shard)
+
+
+# ------------------------------------------------------------------------------
+#
+def partition(node_list, n_shards, shard, coordinator_share=0.0):
+    '''
+    Return the part of `node_list` owned by the given shard.  The list is cut
+    into consecutive partitions, so that multi-node units are placed on
+    neighboring nodes.  The coordinator shard (shard 0) owns the given share of
+    the nodes (a fraction between 0 and 1, `0` for an equal share), the other
+    shards share the remaining nodes evenly.
+    '''
+
+    n_nodes = len(node_list)
+
+    if n_shards < 1 or not 0 <= shard < n_shards:
+        raise ValueError('invalid shard %s of %s' % (shard, n_shards))
+
+    if n_nodes < n_shards:
+        raise ValueError('cannot partition %d nodes over %d shards'
+                        % (n_nodes, n_shards))
+
+    if n_shards == 1:
+        return list(node_list)
+
+    if coordinator_share:
+        n_coord = int(round(n_nodes * coordinator_share))
+        n_coord = max(1, min(n_coord, n_nodes - (n_shards - 1)))
+        sizes   = [n_coord]
+        n_rest  = n_nodes - n_coord
+        n_other = n_shards - 1
+    else:
+        sizes   = list()
+        n_rest  = n_nodes
+        n_other = n_shards
+
+    # spread the remainder over the first partitions
+    size, rem = divmod(n_rest, n_other)
+    sizes    += [size + 1 if i < rem else size for i in range(n_other)]
+
+    start = sum(sizes[:shard])
+    return list(node_list[start:start + sizes[shard]])
+
+
+# ==============================================================================
+#
+class ShardRouter(object):
+    '''
+    Decide which shard a unit should be placed on.  For the capacity policy,
+    the router keeps the latest capacity hints received from the other shards,
+    in the form
+
+        {'cores'     : total free cores,
+         'gpus'      : total free gpus,
+         'node_cores': max free cores on any node,
+         'node_gpus' : max free gpus  on any node}
+
+    The router is not thread safe - locking is up to the caller.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, n_shards, shard, policy=ROUTE_HASH):
+
+        if policy not in ROUTE_POLICIES:
+            raise ValueError('unknown routing policy %s' % policy)
+
+        self.n_shards = n_shards
+        self.shard    = shard
+        self.policy   = policy
+        self._hints   = dict()   # shard -> capacity hint
+
+
+    # --------------------------------------------------------------------------
+    #
+    def route(self, unit):
+        '''
+        Return the shard a newly arriving unit should be placed on.
+        '''
+
+        if self.policy == ROUTE_HASH:
+            key = unit['description'].get('tag') or unit['uid']
+            return (zlib.crc32(key) & 0xffffffff) % self.n_shards
+
+        return self.shard
+
+
+    # --------------------------------------------------------------------------
+    #
+    def update(self, shard, hint):
+        '''
+        Record the capacity hint of another shard.
+        '''
+
+        if shard != self.shard:
+            self._hints[shard] = hint
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pick(self, shape, shards=None):
+        '''
+        For a unit of the given shape (see `wait_pool.unit_shape()`) which
+        cannot be placed locally, return the shard (out of `shards`, or out of
+        all other shards) with the most free cores which can possibly host the
+        unit, or `None`.  The hint of that shard is reduced by the unit's
+        request, so that we don't forward more units than the shard can take
+        before its next hint arrives.
+        '''
+
+        cores, gpus, _, mpi, _ = shape
+
+        if shards is None:
+            shards = self._hints.keys()
+
+        best = None
+        for shard in shards:
+
+            hint = self._hints.get(shard)
+            if not hint:
+                continue
+
+            if mpi:
+                fits = cores <= hint['cores']      and gpus <= hint['gpus']
+            else:
+                fits = cores <= hint['node_cores'] and gpus <= hint['node_gpus']
+
+            if fits and (best is None or hint['cores'] > self._hints[best]['cores']):
+                best = shard
+
+        if best is not None:
+            hint = self._hints[best]
+            hint['cores'] -= cores
+            hint['gpus']  -= gpus
+            hint['node_cores'] = min(hint['node_cores'], hint['cores'])
+            hint['node_gpus']  = min(hint['node_gpus'],  hint['gpus'])
+
+        return best
+
+
+# ------------------------------------------------------------------------------
+
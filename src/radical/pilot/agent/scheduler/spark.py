@@ -52,6 +52,8 @@ class Spark(AgentSchedulingComponent):
         self.avail_cores = self._mnum_of_cores - self._num_of_cores
         self.avail_mem   = self._mmem_size     - self._mem_size
 
+        self._build_node_index()
+
 
     # --------------------------------------------------------------------------
     #
@@ -0,0 +1,210 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import math
+
+
+# ------------------------------------------------------------------------------
+#
+# The metrics recorded by the agent scheduler:
+#
+#   allocate     : time spent in `_allocate_slot()` per call  (seconds)
+#   release      : time spent in `_release_slot()` per call   (seconds)
+#   scanned      : number of nodes inspected per allocation attempt
+#   wait_pool    : number of units in the wait pool (sampled on change)
+#   wait_time    : time units spent in the wait pool          (seconds)
+#   fragmentation: free cores on partially used nodes (sampled periodically,
+#                  only for schedulers which maintain the node store)
+#
+METRICS = ['allocate', 'release', 'scanned', 'wait_pool', 'wait_time',
+           'fragmentation']
+
+# sub-buckets per power of two: 4 keeps the relative error of the reported
+# quantiles below 25%
+_SUB_BUCKETS = 4
+
+
+# ==============================================================================
+#
+class Histogram(object):
+    '''
+    A log-scale histogram of non-negative values.  Values are counted in
+    buckets which grow exponentially (a power of two is split into
+    `_SUB_BUCKETS` buckets), so that recording a value is cheap and memory use
+    does not depend on the number of values, while quantiles can still be
+    derived with a bounded relative error.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        self.n       = 0
+        self.total   = 0.0
+        self.min     = None
+        self.max     = None
+        self._counts = dict()   # bucket key -> count
+
+
+    # --------------------------------------------------------------------------
+    #
+    def record(self, value):
+
+        self.n     += 1
+        self.total += value
+
+        if self.min is None or value < self.min: self.min = value
+        if self.max is None or value > self.max: self.max = value
+
+        key = _bucket(value)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+
+    # --------------------------------------------------------------------------
+    #
+    def quantile(self, q):
+        '''
+        Return an upper bound for the `q` quantile (0 <= q <= 1) of the recorded
+        values, or `None` if no values were recorded.
+        '''
+
+        if not self.n:
+            return None
+
+        rank  = q * self.n
+        count = 0
+        for key in sorted(self._counts):
+            count += self._counts[key]
+            if count >= rank:
+                return min(_upper(key), self.max)
+
+        return self.max
+
+
+    # --------------------------------------------------------------------------
+    #
+    def summary(self):
+        '''
+        Return a dict with count, mean, min, max and the p50, p90 and p99
+        quantiles of the recorded values.
+        '''
+
+        if not self.n:
+            return {'n': 0}
+
+        return {'n'   : self.n,
+                'mean': self.total / self.n,
+                'min' : self.min,
+                'max' : self.max,
+                'p50' : self.quantile(0.50),
+                'p90' : self.quantile(0.90),
+                'p99' : self.quantile(0.99)}
+
+
+# ==============================================================================
+#
+class SchedulerStats(object):
+    '''
+    A set of histograms for the scheduler metrics listed in `METRICS`, plus the
+    bookkeeping needed to measure wait times.  The stats are not thread safe -
+    locking is up to the caller.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        self.hists    = dict([(name, Histogram()) for name in METRICS])
+        self._waiting = dict()   # uid -> time the unit entered the wait pool
+
+
+    # --------------------------------------------------------------------------
+    #
+    def record(self, name, value):
+
+        self.hists[name].record(value)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_start(self, uid, now):
+
+        self._waiting[uid] = now
+
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_stop(self, uid, now):
+
+        start = self._waiting.pop(uid, None)
+        if start is not None:
+            self.hists['wait_time'].record(now - start)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def summary(self):
+        '''
+        Return a dict of histogram summaries (see `Histogram.summary()`), keyed
+        by metric name.
+        '''
+
+        return dict([(name, hist.summary())
+                     for name, hist in self.hists.iteritems()])
+
+
+# ------------------------------------------------------------------------------
+#
+def stats2str(name, summary):
+    '''
+    Serialize a histogram summary into a profile event message.  Profiles are
+    stored as CSV, so we separate fields by spaces: `name key:value ...`.
+    '''
+
+    return ' '.join([name] + ['%s:%r' % (k, summary[k])
+                              for k in sorted(summary)])
+
+
+# ------------------------------------------------------------------------------
+#
+def str2stats(msg):
+    '''
+    Inverse of `stats2str()`: return the metric name and the summary dict.
+    '''
+
+    elems   = msg.split()
+    summary = dict()
+    for elem in elems[1:]:
+        key, val = elem.split(':', 1)
+        summary[key] = float(val) if val != 'None' else None
+
+    return elems[0], summary
+
+
+# ------------------------------------------------------------------------------
+#
+def _bucket(value):
+
+    if value <= 0:
+        return (-1024, 0)
+
+    # value = mant * 2**exp, with 0.5 <= mant < 1
+    mant, exp = math.frexp(value)
+    return (exp, int((mant - 0.5) * 2 * _SUB_BUCKETS))
+
+
+# ------------------------------------------------------------------------------
+#
+def _upper(key):
+
+    exp, sub = key
+    if exp == -1024:
+        return 0.0
+
+    return math.ldexp(0.5 + (sub + 1) / (2.0 * _SUB_BUCKETS), exp)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,135 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import collections
+
+
+# ==============================================================================
+#
+class TagStore(object):
+    '''
+    A unit can be tagged with the uid of another unit, and is then placed on the
+    same nodes as that unit (tag affinity).  The tag store records the node
+    indexes units have been placed on, so that the scheduler can look up the
+    affine nodes of a tagged unit directly.
+
+    Placements are only retained for as long as they can be of use:
+
+      - a tag is *referenced* while a unit carrying that tag is pending (ie.
+        waiting to be placed), and the placement of the tagged unit is kept for
+        as long as any such reference exists;
+      - placements which are not (or not anymore) referenced are kept in LRU
+        order, and only the `size` most recent of those are retained, so that
+        units which arrive later can still find their affine nodes.
+
+    Tags for which no placement is known are treated as invalid, ie. the unit
+    is placed as if it did not have a tag.
+
+    The store is not thread safe - locking is up to the caller.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, size):
+
+        self._size   = size
+        self._nodes  = dict()                     # uid -> set of node indexes
+        self._refs   = dict()                     # uid -> number of references
+        self._recent = collections.OrderedDict()  # unreferenced uids, LRU order
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        return len(self._nodes)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __contains__(self, uid):
+
+        return uid in self._nodes
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __iter__(self):
+
+        return iter(self._nodes)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def nodes(self, tag):
+        '''
+        return the set of node indexes the unit `tag` was placed on, or `None`
+        if that placement is not known.
+        '''
+
+        return self._nodes.get(tag)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def reference(self, tag):
+        '''
+        a unit carrying the given tag is pending placement
+        '''
+
+        self._refs[tag] = self._refs.get(tag, 0) + 1
+
+        # a referenced placement is retained regardless of its age
+        self._recent.pop(tag, None)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def dereference(self, tag):
+        '''
+        a unit carrying the given tag has been placed
+        '''
+
+        count = self._refs.get(tag, 0) - 1
+
+        if count > 0:
+            self._refs[tag] = count
+            return
+
+        self._refs.pop(tag, None)
+
+        if tag in self._nodes:
+            self._expire(tag)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def record(self, uid, nodes):
+        '''
+        record the node indexes the unit `uid` has been placed on
+        '''
+
+        self._nodes[uid] = set(nodes)
+
+        if uid not in self._refs:
+            self._expire(uid)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _expire(self, uid):
+
+        # move the placement to the end of the LRU list, and evict the oldest
+        # placements beyond the configured size
+        self._recent.pop(uid, None)
+        self._recent[uid] = None
+
+        while len(self._recent) > self._size:
+            old, _ = self._recent.popitem(last=False)
+            del(self._nodes[old])
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,150 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+from ... import constants as rpc
+
+
+# ==============================================================================
+#
+class Topology(object):
+    '''
+    The NUMA topology of a node, as described by the LRMS (see
+    `LRMS._get_node_topology()`): a list of NUMA domains, each of the form
+
+        {'socket': 0, 'cores': [0, 1, 2, 3], 'gpus': [0]}
+
+    All nodes are assumed to have the same topology.  Cores and gpus beyond
+    the number of cores and gpus per node used by the scheduler are ignored.
+
+    The topology is used to place the cores of each process (the process core
+    and its thread cores) into a single NUMA domain, and to place GPU processes
+    on gpus attached to the sockets hosting the unit's cores.  Where that is
+    not possible (the node has sufficient free resources, but not in the right
+    domains), the placement crosses domains, and the number of such locality
+    violations is reported.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, domains, cores_per_node, gpus_per_node):
+
+        self.sockets = list()   # socket per domain
+        self.cores   = list()   # list of core ids per domain
+        self.gpus    = list()   # list of gpu  ids per domain
+
+        for domain in domains:
+
+            cores = [c for c in domain.get('cores', []) if c < cores_per_node]
+            gpus  = [g for g in domain.get('gpus',  []) if g < gpus_per_node ]
+
+            if not cores and not gpus:
+                continue
+
+            self.sockets.append(domain.get('socket', len(self.sockets)))
+            self.cores.append(sorted(cores))
+            self.gpus.append(sorted(gpus))
+
+        # domain per core and gpu
+        self.core_domain = dict()
+        self.gpu_domain  = dict()
+        for d in range(len(self.cores)):
+            for core in self.cores[d]: self.core_domain[core] = d
+            for gpu  in self.gpus [d]: self.gpu_domain [gpu]  = d
+
+        if sorted(self.core_domain) != range(cores_per_node) or \
+           sorted(self.gpu_domain)  != range(gpus_per_node):
+            raise ValueError('topology does not cover all cores and gpus '
+                             '(%d/%d)' % (cores_per_node, gpus_per_node))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def create(cls, domains, cores_per_node, gpus_per_node):
+        '''
+        Return a `Topology` instance, or `None` if no domains are given, or if
+        there is only a single domain (in which case locality is moot).
+        '''
+
+        if not domains or len(domains) < 2:
+            return None
+
+        return cls(domains, cores_per_node, gpus_per_node)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def find_cores(self, row, n_chunks, chunk):
+        '''
+        Find `n_chunks` sets of `chunk` free cores in the given row of core
+        states (the node's row in `NodeStore.cores`).  Each set is placed in
+        the domain with the fewest free cores which can host it, so that larger
+        domains remain available for larger sets.  Returns the list of core
+        ids (set by set), and the number of sets which had to cross domains.
+        The caller must make sure that sufficient free cores are available.
+        '''
+
+        free = [[c for c in cores if row[c] == rpc.FREE]
+                for cores in self.cores]
+
+        ret   = list()
+        split = 0
+        for _ in range(n_chunks):
+
+            best = None
+            for d in range(len(free)):
+                if len(free[d]) >= chunk and \
+                   (best is None or len(free[d]) < len(free[best])):
+                    best = d
+
+            if best is not None:
+                ret += free[best][:chunk]
+                del(free[best][:chunk])
+                continue
+
+            # no domain can host the set: take cores from the domains with the
+            # most free cores
+            split += 1
+            need   = chunk
+            for d in sorted(range(len(free)), key=lambda x: -len(free[x])):
+                take  = free[d][:need]
+                ret  += take
+                need -= len(take)
+                del(free[d][:len(take)])
+                if not need:
+                    break
+
+        return ret, split
+
+
+    # --------------------------------------------------------------------------
+    #
+    def find_gpus(self, row, n, cores):
+        '''
+        Find `n` free gpus in the given row of gpu states, preferring gpus
+        attached to the sockets of the given cores.  Returns the list of gpu ids
+        and the number of gpus on other sockets (`0` if no cores are given).
+        The caller must make sure that sufficient free gpus are available.
+        '''
+
+        sockets = set([self.sockets[self.core_domain[c]] for c in cores])
+
+        near = list()
+        far  = list()
+        for d in range(len(self.gpus)):
+            for gpu in self.gpus[d]:
+                if row[gpu] == rpc.FREE:
+                    if not sockets or self.sockets[d] in sockets:
+                        near.append(gpu)
+                    else:
+                        far.append(gpu)
+
+        ret = (near + far)[:n]
+
+        return ret, max(0, len(ret) - len(near))
+
+
+# ------------------------------------------------------------------------------
+
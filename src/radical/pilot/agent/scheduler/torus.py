@@ -12,7 +12,8 @@ from ... import utils     as rpu
 from ... import states    as rps
 from ... import constants as rpc
 
-from .base import AgentSchedulingComponent
+from .base  import AgentSchedulingComponent
+from .buddy import BuddyAllocator
 
 
 # ==============================================================================
@@ -36,6 +37,10 @@ class Torus(AgentSchedulingComponent):
 
         self.nodes            = None
         self._cores_per_node  = None
+        self._buddy           = None
+        self._offsets         = None
+        self._corners         = None
+        self._shape_sizes     = None
 
         AgentSchedulingComponent.__init__(self, cfg, session)
 
@@ -49,9 +54,29 @@ class Torus(AgentSchedulingComponent):
 
         self._cores_per_node = self._lrms_cores_per_node
 
+        # the torus block is not partitioned over scheduler instances
+        if self._n_shards > 1:
+            raise RuntimeError('Torus scheduler does not support sharding')
+
         # TODO: get rid of field below
         self.nodes = 'bogus'
 
+        # sub-blocks are handed out by a buddy allocator over the torus block,
+        # for the sub-block sizes of the LRMS' shape table.  We also keep
+        # indexes to map a corner node back to its offset in the block, and
+        # a sub-block shape back to its size, for releasing sub-blocks.
+        block = self._lrms.torus_block
+        table = self._lrms.shape_table
+
+        self._buddy       = BuddyAllocator(len(block), table.keys())
+        self._offsets     = dict()
+        self._corners     = dict()
+        for offset, e in enumerate(block):
+            self._offsets[e[self.TORUS_BLOCK_NAME]] = offset
+            self._corners[self._lrms.loc2str(e[self.TORUS_BLOCK_COOR])] = offset
+        self._shape_sizes = dict([(self._lrms.shape2str(shape), size)
+                                  for size, shape in table.iteritems()])
+
 
     # --------------------------------------------------------------------------
     #
@@ -78,11 +103,14 @@ class Torus(AgentSchedulingComponent):
     # Currently only implements full-node allocation, so core count must
     # be a multiple of cores_per_node.
     #
-    def _allocate_slot(self, cores_requested, gpus_requested):
+    def _allocate_slot(self, cud):
 
         block = self._lrms.torus_block
         sub_block_shape_table = self._lrms.shape_table
 
+        cores_requested = cud['cpu_processes'] * cud['cpu_threads']
+        gpus_requested  = cud['gpu_processes']
+
         self._log.info("Trying to allocate %d core(s / %d gpus.",
                 cores_requested, gpus_requested)
 
@@ -93,9 +121,20 @@ class Torus(AgentSchedulingComponent):
                         * self._lrms_cores_per_node
             self._log.error('Core not multiple of %d, increasing to %d!',
                            self._lrms_cores_per_node, num_cores)
+            cores_requested = num_cores
 
         num_nodes = cores_requested / self._lrms_cores_per_node
 
+        # sub-blocks only come in the sizes of the shape table
+        sub_block_size = self._buddy.fit(num_nodes)
+        if sub_block_size is None:
+            raise ValueError('no sub-block holds %d nodes' % num_nodes)
+
+        if sub_block_size != num_nodes:
+            self._log.error('Sub-block size %d not supported, increasing to %d!',
+                            num_nodes, sub_block_size)
+            num_nodes = sub_block_size
+
         offset = self._alloc_sub_block(block, num_nodes)
 
         if offset is None:
@@ -106,8 +145,7 @@ class Torus(AgentSchedulingComponent):
         sub_block_shape     = sub_block_shape_table[num_nodes]
         sub_block_shape_str = self._lrms.shape2str(sub_block_shape)
         corner              = block[offset][self.TORUS_BLOCK_COOR]
-        corner_offset       = self.corner2offset(self._lrms.torus_block, corner)
-        corner_node         = self._lrms.torus_block[corner_offset][self.TORUS_BLOCK_NAME]
+        corner_node         = block[offset][self.TORUS_BLOCK_NAME]
 
         end = self.get_last_node(corner, sub_block_shape)
         self._log.debug('Allocating sub-block of %d node(s) with dimensions %s'
@@ -125,54 +163,25 @@ class Torus(AgentSchedulingComponent):
     # --------------------------------------------------------------------------
     #
     # Allocate a sub-block within a block
-    # Currently only works with offset that are exactly the sub-block size
+    # Sub-blocks are aligned to offsets which are a multiple of their size
     #
     def _alloc_sub_block(self, block, num_nodes):
 
-        offset = 0
-        # Iterate through all nodes with offset a multiple of the sub-block size
-        while True:
-
-            # Verify the assumption (needs to be an assert?)
-            if offset % num_nodes != 0:
-                msg = 'Sub-block needs to start at correct offset!'
-                self._log.exception(msg)
-                raise ValueError(msg)
-                # TODO: If we want to workaround this, the coordinates need to overflow
-
-            not_free = False
-            # Check if all nodes from offset till offset+size are rpc.FREE
-            for peek in range(num_nodes):
-                try:
-                    if block[offset+peek][self.TORUS_BLOCK_STATUS] == rpc.BUSY:
-                        # Once we find the first rpc.BUSY node we can discard this attempt
-                        not_free = True
-                        break
-                except IndexError:
-                    self._log.exception('Block out of bound. Num_nodes: %d, offset: %d, peek: %d.',
-                            num_nodes, offset, peek)
-
-            if not_free == True:
-                # No success at this offset
-                self._log.info("No free nodes found at this offset: %d.", offset)
-
-                # If we weren't the last attempt, then increase the offset and iterate again.
-                if offset + num_nodes < self._block2num_nodes(block):
-                    offset += num_nodes
-                    continue
-                else:
-                    return
+        offset = self._buddy.alloc(num_nodes)
 
-            else:
-                # At this stage we have found a free spot!
+        if offset is None:
+            self._log.info("No free sub-block of %d nodes found.", num_nodes)
+            return
 
-                self._log.info("Free nodes found at this offset: %d.", offset)
+        self._log.info("Free nodes found at this offset: %d.", offset)
 
-                # Then mark the nodes busy
-                for peek in range(num_nodes):
-                    block[offset+peek][self.TORUS_BLOCK_STATUS] = rpc.BUSY
+        # Then mark the nodes busy
+        for peek in range(num_nodes):
+            assert block[offset+peek][self.TORUS_BLOCK_STATUS] == rpc.FREE, \
+                'Block %d not Free!' % (offset+peek)
+            block[offset+peek][self.TORUS_BLOCK_STATUS] = rpc.BUSY
 
-                return offset
+        return offset
 
 
     # --------------------------------------------------------------------------
@@ -185,8 +194,14 @@ class Torus(AgentSchedulingComponent):
 
     # --------------------------------------------------------------------------
     #
-    def _release_slot(self, (corner, shape)):
-        self._free_cores(self._lrms.torus_block, corner, shape)
+    def _release_slot(self, slots):
+
+        block  = self._lrms.torus_block
+        offset = self._offsets[slots['corner_node']]
+        size   = self._shape_sizes[slots['sub_block_shape_str']]
+
+        self._free_cores(block, block[offset][self.TORUS_BLOCK_COOR],
+                         self._lrms.shape_table[size])
 
 
     # --------------------------------------------------------------------------
@@ -208,6 +223,8 @@ class Torus(AgentSchedulingComponent):
                 'Block %d not Free!' % block[offset+peek]
             block[offset+peek][self.TORUS_BLOCK_STATUS] = rpc.FREE
 
+        self._buddy.free(offset, num_nodes)
+
 
     # --------------------------------------------------------------------------
     #
@@ -237,9 +254,14 @@ class Torus(AgentSchedulingComponent):
     #
     # Return the offset into the node list from a corner
     #
-    # TODO: Can this be determined instead of searched?
+    # Corners in our own block are looked up in the corner index, others are
+    # searched.
     #
     def corner2offset(self, block, corner):
+
+        if block is self._lrms.torus_block and self._corners:
+            return self._corners[self._lrms.loc2str(corner)]
+
         offset = 0
 
         for e in block:
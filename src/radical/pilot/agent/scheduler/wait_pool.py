@@ -0,0 +1,176 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import heapq
+import collections
+
+from ... import constants as rpc
+
+
+# ------------------------------------------------------------------------------
+#
+def unit_shape(cud):
+    '''
+    Return the request shape of a unit description, as tuple of
+
+        (cores, gpus, lfs_per_process, is_mpi, tag)
+
+    Units of the same shape are interchangeable for the purpose of resource
+    allocation: if one of them cannot be placed, neither can the others.
+    '''
+
+    cores = cud['cpu_processes'] * (cud.get('cpu_threads') or 1)
+    gpus  = cud['gpu_processes']
+    lfs   = cud.get('lfs_per_process') or 0
+    mpi   = rpc.MPI in [cud.get('cpu_process_type'),
+                        cud.get('gpu_process_type')]
+
+    return (cores, gpus, lfs, mpi, cud.get('tag'))
+
+
+# ==============================================================================
+#
+class WaitPool(object):
+    '''
+    The wait pool holds units for which the agent scheduler could not (yet) find
+    resources.  Units are kept in buckets of identical request shape (see
+    `unit_shape()`), each bucket being a FIFO.  When resources are freed, the
+    scheduler only needs to look at those shapes which can possibly fit into
+    the freed resources, and for each such shape it can stop at the first unit
+    which fails to be placed.
+
+    The pool also retains the overall arrival order of units, for schedulers
+    which need to consider units in that order (see `units()`).
+
+    The pool is not thread safe - locking is up to the caller.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        self._buckets = collections.OrderedDict()  # shape -> deque([seq, unit])
+        self._seq     = 0                          # arrival counter
+        self._size    = 0
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        return self._size
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, unit):
+
+        shape = unit_shape(unit['description'])
+
+        if shape not in self._buckets:
+            self._buckets[shape] = collections.deque()
+
+        self._buckets[shape].append([self._seq, unit])
+        self._seq  += 1
+        self._size += 1
+
+
+    # --------------------------------------------------------------------------
+    #
+    def shapes(self):
+        '''
+        return the list of shapes for which units are waiting, in the order in
+        which the shapes first arrived.
+        '''
+
+        return self._buckets.keys()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def count(self, shape):
+        '''
+        return the number of units waiting with the given shape
+        '''
+
+        bucket = self._buckets.get(shape)
+        if not bucket:
+            return 0
+
+        return len(bucket)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def head(self, shape):
+        '''
+        return the oldest unit of the given shape, or `None`
+        '''
+
+        bucket = self._buckets.get(shape)
+        if not bucket:
+            return None
+
+        return bucket[0][1]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pop(self, shape):
+        '''
+        remove and return the oldest unit of the given shape
+        '''
+
+        bucket = self._buckets[shape]
+        _, unit = bucket.popleft()
+
+        if not bucket:
+            del(self._buckets[shape])
+
+        self._size -= 1
+        return unit
+
+
+    # --------------------------------------------------------------------------
+    #
+    def units(self):
+        '''
+        return a list of all waiting units, in order of arrival
+        '''
+
+        return [unit for _, unit in heapq.merge(*self._buckets.values())]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def remove(self, units):
+        '''
+        remove the given units from the pool.  Only the buckets of the units'
+        shapes are looked at, so this is linear in the number of units waiting
+        with those shapes, not in the pool size.
+        '''
+
+        uids   = set()
+        shapes = set()
+        for unit in units:
+            uids.add(unit['uid'])
+            shapes.add(unit_shape(unit['description']))
+
+        for shape in shapes:
+
+            bucket = self._buckets.get(shape)
+            if not bucket:
+                continue
+
+            keep   = collections.deque([entry for entry in bucket
+                                              if entry[1]['uid'] not in uids])
+            self._size -= len(bucket) - len(keep)
+
+            if keep: self._buckets[shape] = keep
+            else   : del(self._buckets[shape])
+
+
+# ------------------------------------------------------------------------------
+
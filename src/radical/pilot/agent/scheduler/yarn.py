@@ -73,6 +73,8 @@ class Yarn(AgentSchedulingComponent):
         self._log.debug('YARN Service and RM URLs: %s - %s' \
                      % (self._service_url, self._rm_url))
 
+        self._build_node_index()
+
 
     # --------------------------------------------------------------------------
     #
@@ -26,6 +26,8 @@ GPU_THREAD_TYPE        = 'gpu_thread_type'
 
 LFS_PER_PROCESS        = 'lfs_per_process'
 TAG                    = 'tag'
+PRIORITY               = 'priority'
+RUNTIME_ESTIMATE       = 'runtime_estimate'
 
 INPUT_STAGING          = 'input_staging'
 OUTPUT_STAGING         = 'output_staging'
@@ -214,6 +216,24 @@ class ComputeUnitDescription(attributes.Attributes):
        default: `False`
 
 
+    .. data:: priority
+
+       The agent scheduling priority of the unit (`int`, higher first).  Only
+       used by the agent scheduler if configured for the `backfill` policy.
+
+       default: `0`
+
+
+    .. data:: runtime_estimate
+
+       The estimated runtime of the unit (`float`, seconds).  The `backfill`
+       policy of the agent scheduler uses it to place short units into resource
+       holes without delaying larger units.  Units without estimate are assumed
+       to run forever.
+
+       default: `None`
+
+
     .. data:: metadata
 
        user defined metadata
@@ -340,6 +360,10 @@ class ComputeUnitDescription(attributes.Attributes):
         # tag -- user level tag that can be used in scheduling
         self._attributes_register(TAG,              None, attributes.STRING, attributes.SCALAR, attributes.WRITEABLE)
 
+        # priority and runtime estimate -- used for backfill scheduling
+        self._attributes_register(PRIORITY,         None, attributes.INT,    attributes.SCALAR, attributes.WRITEABLE)
+        self._attributes_register(RUNTIME_ESTIMATE, None, attributes.FLOAT,  attributes.SCALAR, attributes.WRITEABLE)
+
         # dependencies
       # self._attributes_register(RUN_AFTER,        None, attributes.STRING, attributes.VECTOR, attributes.WRITEABLE)
       # self._attributes_register(START_AFTER,      None, attributes.STRING, attributes.VECTOR, attributes.WRITEABLE)
@@ -372,6 +396,8 @@ class ComputeUnitDescription(attributes.Attributes):
         self.set_attribute (LFS_PER_PROCESS,     0)
 
         self.set_attribute (TAG,              None)
+        self.set_attribute (PRIORITY,            0)
+        self.set_attribute (RUNTIME_ESTIMATE, None)
 
         self.set_attribute (RESTARTABLE,     False)
         self.set_attribute (METADATA,         None)
@@ -126,7 +126,8 @@ class PilotManager(rpu.Component):
                                timer=self._cfg['db_poll_sleeptime'])
 
         # also listen to the state pubsub for pilot state changes
-        self.register_subscriber(rpc.STATE_PUBSUB, self._state_sub_cb)
+        self.register_subscriber(rpc.STATE_PUBSUB, self._state_sub_cb,
+                                 state_filter={'types': ['pilot']})
 
         # let session know we exist
         self._session._register_pmgr(self)
@@ -803,6 +803,7 @@ class Default(PMGRLaunchingComponent):
         gpus_per_node           = rcfg.get('gpus_per_node',  0)
         lfs_path_per_node       = rcfg.get('lfs_path_per_node', None)
         lfs_size_per_node       = rcfg.get('lfs_size_per_node',  0)
+        node_topology           = rcfg.get('node_topology')
         python_dist             = rcfg.get('python_dist')
         virtenv_dist            = rcfg.get('virtenv_dist',        DEFAULT_VIRTENV_DIST)
         cu_tmp                  = rcfg.get('cu_tmp')
@@ -1062,6 +1063,7 @@ class Default(PMGRLaunchingComponent):
         agent_cfg['gpus_per_node']      = gpus_per_node
         agent_cfg['lfs_path_per_node']  = lfs_path_per_node
         agent_cfg['lfs_size_per_node']  = lfs_size_per_node
+        agent_cfg['node_topology']      = node_topology
         agent_cfg['cu_tmp']             = cu_tmp
         agent_cfg['export_to_cu']       = export_to_cu
         agent_cfg['cu_pre_exec']        = cu_pre_exec
@@ -49,6 +49,7 @@ VIRTENV_DISTRIBUTION        = 'virtenv_dist'
 SAGA_JD_SUPPLEMENT          = 'saga_jd_supplement'
 LFS_PATH_PER_NODE           = 'lfs_path_per_node'
 LFS_SIZE_PER_NODE           = 'lfs_size_per_node'
+NODE_TOPOLOGY               = 'node_topology'
 
 # ------------------------------------------------------------------------------
 #
@@ -259,6 +260,7 @@ class ResourceConfig(attributes.Attributes):
         self._attributes_register(SAGA_JD_SUPPLEMENT     ,  None, attributes.DICT  , attributes.SCALAR, attributes.WRITEABLE)
         self._attributes_register(LFS_PATH_PER_NODE      ,  None, attributes.STRING, attributes.SCALAR, attributes.WRITEABLE)
         self._attributes_register(LFS_SIZE_PER_NODE      ,  None, attributes.INT,    attributes.SCALAR, attributes.WRITEABLE)
+        self._attributes_register(NODE_TOPOLOGY          ,  None, attributes.ANY,    attributes.SCALAR, attributes.WRITEABLE)
 
         self['label'] = label
 
@@ -664,10 +664,12 @@ class Session(rs.Session):
     def _get_profiler(self, name):
         """
         This is a thin wrapper around `ru.Profiler()` which makes sure that
-        log files end up in a separate directory with the name of `session.uid`.
+        log files end up in a separate directory with the name of `session.uid`,
+        and which buffers the profile events (see `utils/profiler.py`).
         """
 
-        prof = ru.Profiler(name=name, ns='radical.pilot', path=self._logdir)
+        prof = rpu.Profiler(name=name, ns='radical.pilot', path=self._logdir,
+                            events=self._cfg.get('profile_events'))
 
         return prof
 
@@ -691,10 +693,12 @@ class Session(rs.Session):
     def _get_profiler(self, name):
         """
         This is a thin wrapper around `ru.Profiler()` which makes sure that
-        log files end up in a separate directory with the name of `session.uid`.
+        log files end up in a separate directory with the name of `session.uid`,
+        and which buffers the profile events (see `utils/profiler.py`).
         """
 
-        prof = ru.Profiler(name=name, ns='radical.pilot', path=self._logdir)
+        prof = rpu.Profiler(name=name, ns='radical.pilot', path=self._logdir,
+                            events=self._cfg.get('profile_events'))
 
         return prof
 
@@ -6,6 +6,7 @@ __license__   = "MIT"
 import os
 import time
 import threading
+import itertools
 
 import radical.utils as ru
 
@@ -19,6 +20,13 @@ from . import compute_unit_description as rpcud
 from .umgr import scheduler as rpus
 
 
+# Units are stamped with a sequence number on submission, which is shared by all
+# unit managers in this process.  The agent scheduler uses it to place units
+# in submission order under the FIFO policy, no matter in which order they
+# arrive there.
+_submit_seq = itertools.count()
+
+
 # ------------------------------------------------------------------------------
 #
 class UnitManager(rpu.Component):
@@ -142,7 +150,8 @@ class UnitManager(rpu.Component):
                                timer=self._cfg['db_poll_sleeptime'])
 
         # also listen to the state pubsub for unit state changes
-        self.register_subscriber(rpc.STATE_PUBSUB, self._state_sub_cb)
+        self.register_subscriber(rpc.STATE_PUBSUB, self._state_sub_cb,
+                                 state_filter={'types': ['unit']})
 
         # let session know we exist
         self._session._register_umgr(self)
@@ -742,6 +751,9 @@ class UnitManager(rpu.Component):
 
         # insert units into the database, as a bulk.
         unit_docs = [u.as_dict() for u in units]
+        for doc in unit_docs:
+            doc['submit_seq'] = next(_submit_seq)
+
         self._session._dbs.insert_units(unit_docs)
 
         # Only after the insert can we hand the units over to the next
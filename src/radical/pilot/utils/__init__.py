@@ -19,9 +19,13 @@ version = version_short
 #
 from .db_utils     import *
 from .prof_utils   import *
+from .profiler     import *
 from .misc         import *
+from .channel      import *
 from .queue        import *
 from .pubsub       import *
+from .store        import *
+from .reactor      import *
 from .session      import *
 from .component    import *
 from .slot_utils   import *
@@ -0,0 +1,335 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import time
+import tempfile
+import collections
+
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+# The component channels (`Queue` and `Pubsub`) can use different transports,
+# which are selected per bridge by the `transport` setting in the bridge config
+# (or `bridge_transport` for all bridges of a config):
+#
+#   tcp   : the bridge binds tcp ports on the host, endpoints can connect from
+#           anywhere (the default)
+#   ipc   : the bridge binds unix domain sockets, endpoints must live on the
+#           same node
+#   inproc: no bridge process is started, and messages are handed over via
+#           thread-safe deques.  Endpoints must live in the same process as
+#           the bridge (ie. they must not be in forked child processes).
+#   auto  : use `ipc` if all components which use the bridges are known to
+#           live on the local node (no sub-agent has target `node`), and `tcp`
+#           otherwise.
+#
+# The endpoints derive the transport from the bridge address they connect to.
+# `inproc` channels don't support stalling, bulking or credits: messages are
+# delivered one by one, as they were put.
+#
+TRANSPORT_TCP    = 'tcp'
+TRANSPORT_IPC    = 'ipc'
+TRANSPORT_INPROC = 'inproc'
+TRANSPORT_AUTO   = 'auto'
+TRANSPORTS       = [TRANSPORT_TCP, TRANSPORT_IPC, TRANSPORT_INPROC,
+                    TRANSPORT_AUTO]
+
+_INPROC_WAIT = 1.0  # s between wakeups of a blocking get()
+
+
+# ------------------------------------------------------------------------------
+#
+def get_transport(cfg, bcfg):
+    '''
+    Resolve the transport for a bridge, given the config which defines the
+    bridge, and the bridge config itself.
+    '''
+
+    transport = bcfg.get('transport', cfg.get('bridge_transport',
+                                              TRANSPORT_TCP))
+
+    if transport not in TRANSPORTS:
+        raise ValueError('invalid bridge transport %s' % transport)
+
+    if transport == TRANSPORT_AUTO:
+        for acfg in cfg.get('agents', {}).values():
+            if acfg.get('target') != 'local':
+                return TRANSPORT_TCP
+        return TRANSPORT_IPC
+
+    return transport
+
+
+# ------------------------------------------------------------------------------
+#
+def get_bridge_addr(transport):
+    '''
+    Return the address a bridge with the given transport binds to (for
+    `inproc` bridges the address is set when the channel is created).
+    '''
+
+    if transport == TRANSPORT_IPC:
+        return 'ipc://%s' % tempfile.gettempdir()
+
+    return 'tcp://*:*'
+
+
+# ------------------------------------------------------------------------------
+#
+def get_bind_addr(addr, name, end):
+    '''
+    Bridges bind both ends on the same address, which works for tcp port
+    wildcards, but ipc endpoints need a unique socket path per end.
+    '''
+
+    if addr.startswith('ipc://'):
+        return '%s/rp.%s.%d.%s' % (addr, name, os.getpid(), end)
+
+    return addr
+
+
+# ------------------------------------------------------------------------------
+#
+def unlink_ipc(addr):
+    '''
+    Remove the socket file of a bound ipc address.
+    '''
+
+    if addr and addr.startswith('ipc://'):
+        try:
+            os.unlink(addr[len('ipc://'):])
+        except OSError:
+            pass
+
+
+# ------------------------------------------------------------------------------
+#
+def is_inproc(addr):
+
+    return bool(addr) and str(addr).startswith('%s://' % TRANSPORT_INPROC)
+
+
+# ==============================================================================
+#
+class InprocChannel(object):
+    '''
+    Base class for in-process channels, which are registered by address, so
+    that the endpoints in the same process can find them.
+    '''
+
+    _registry = dict()
+    _reg_lock = mt.Lock()
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name):
+
+        self._addr  = '%s://%s' % (TRANSPORT_INPROC, name)
+        self._pid   = os.getpid()
+        self._lock  = mt.Lock()
+
+        with InprocChannel._reg_lock:
+            if self._addr in InprocChannel._registry:
+                raise ValueError('inproc channel %s exists' % self._addr)
+            InprocChannel._registry[self._addr] = self
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def addr(self):
+        return self._addr
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def lookup(cls, addr):
+
+        with InprocChannel._reg_lock:
+            channel = InprocChannel._registry.get(str(addr))
+
+        if not channel:
+            raise ValueError('no inproc channel at %s' % addr)
+
+        if not isinstance(channel, cls):
+            raise TypeError('%s is not a %s' % (addr, cls.__name__))
+
+        # forked children see a copy of the registry, but messages would not
+        # cross the process boundary
+        if channel._pid != os.getpid():
+            raise RuntimeError('inproc channel %s used across processes'
+                               % addr)
+
+        return channel
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        with InprocChannel._reg_lock:
+            InprocChannel._registry.pop(self._addr, None)
+
+
+# ==============================================================================
+#
+class _Mailbox(object):
+    '''
+    A thread-safe FIFO of messages, with a blocking and timed `get()`.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        self._msgs = collections.deque()
+        self._cond = mt.Condition(mt.Lock())
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, data):
+
+        with self._cond:
+            self._msgs.append(data)
+            self._cond.notify()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, timeout=None):
+        '''
+        Return the next message, or `None` if none arrived within `timeout`
+        (ms, `None` to wait forever).
+        '''
+
+        with self._cond:
+
+            if timeout is None:
+                while not self._msgs:
+                    self._cond.wait(_INPROC_WAIT)
+
+            elif not self._msgs and timeout > 0:
+                stop = time.time() + timeout / 1000.0
+                while not self._msgs:
+                    left = stop - time.time()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+
+            if self._msgs:
+                return self._msgs.popleft()
+
+        return None
+
+
+# ==============================================================================
+#
+class InprocQueue(InprocChannel):
+    '''
+    In-process counterpart of a queue bridge: messages put by any input end
+    are retrieved by whichever output end calls `get()` first.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name):
+
+        InprocChannel.__init__(self, name)
+
+        self._mailbox = _Mailbox()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, data):
+
+        self._mailbox.put(data)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, timeout=None):
+
+        return self._mailbox.get(timeout)
+
+
+# ==============================================================================
+#
+class InprocPubsub(InprocChannel):
+    '''
+    In-process counterpart of a pubsub bridge: messages are delivered to all
+    subscribers whose topic subscriptions match (by prefix, as with zmq).
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name):
+
+        InprocChannel.__init__(self, name)
+
+        self._subs = list()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def subscriber(self):
+
+        sub = InprocSubscriber()
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, topic, data):
+
+        with self._lock:
+            subs = list(self._subs)
+
+        for sub in subs:
+            if sub.matches(topic):
+                sub.put([topic, data])
+
+
+# ==============================================================================
+#
+class InprocSubscriber(_Mailbox):
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        _Mailbox.__init__(self)
+
+        self._topics = list()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def subscribe(self, topic):
+
+        with self._cond:
+            if topic not in self._topics:
+                self._topics.append(topic)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def matches(self, topic):
+
+        for t in self._topics:
+            if topic.startswith(t):
+                return True
+        return False
+
+
+# ------------------------------------------------------------------------------
+
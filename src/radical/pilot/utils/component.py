@@ -1,9 +1,12 @@
 
 import os
 import sys
+import zmq
 import copy
 import time
+import errno
 import pprint
+import msgpack
 import signal
 
 import setproctitle    as spt
@@ -23,6 +26,20 @@ from .pubsub     import Pubsub         as rpu_Pubsub
 from .pubsub     import PUBSUB_PUB     as rpu_PUBSUB_PUB
 from .pubsub     import PUBSUB_SUB     as rpu_PUBSUB_SUB
 from .pubsub     import PUBSUB_BRIDGE  as rpu_PUBSUB_BRIDGE
+from .pubsub     import StateFilter    as rpu_StateFilter
+
+from .store      import Store          as rpu_Store
+from .store      import STORE_CLIENT   as rpu_STORE_CLIENT
+from .store      import STORE_BRIDGE   as rpu_STORE_BRIDGE
+
+from .channel    import get_transport  as rpu_get_transport
+
+from .reactor    import Reactor        as rpu_Reactor
+
+
+_INPUT_TIMEOUT  = 1000  # ms to wait for input before checking for termination
+_INPROC_TIMEOUT =   10  # ms to wait if inproc inputs need to be checked
+_INPUT_BUDGET   =   16  # max number of bulks to get from an input in one go
 
 
 # ==============================================================================
@@ -106,6 +123,14 @@ class Component(ru.Process):
     # FIXME:
     #  - make state transitions more formal
    
+    _in_poller  = None          # poller over the input queues
+    _in_names   = list()        # input names, in polling order
+    _in_socks   = dict()        # input sockets by name (None for inproc)
+    _in_next    = 0             # first input to serve in the next iteration
+    _reactor    = None          # loop for timed callbacks and subscribers
+    _unit_store = None          # unit store client, for delta mode
+    _snapshots  = None          # stored units as fetched (packed), by uid
+
 
     # --------------------------------------------------------------------------
     #
@@ -147,13 +172,20 @@ class Component(ru.Process):
             
             bcfg_clone = copy.deepcopy(bcfg)
 
-            # The type of bridge (queue or pubsub) is derived from the name.
+            # the transport is derived from the config (see `channel.py`)
+            bcfg_clone['transport'] = rpu_get_transport(cfg, bcfg)
+
+            # The type of bridge (queue, pubsub or store) is derived from the
+            # name.
             if bname.endswith('queue'):
                 bridge = rpu_Queue(session, bname, rpu_QUEUE_BRIDGE, bcfg_clone)
 
             elif bname.endswith('pubsub'):
                 bridge = rpu_Pubsub(session, bname, rpu_PUBSUB_BRIDGE, bcfg_clone)
 
+            elif bname.endswith('store'):
+                bridge = rpu_Store(session, bname, rpu_STORE_BRIDGE, bcfg_clone)
+
             else:
                 raise ValueError('unknown bridge type for %s' % bname)
 
@@ -312,10 +344,11 @@ class Component(ru.Process):
         self._bridges    = list()       # communication bridges
         self._components = list()       # sub-components
         self._inputs     = dict()       # queues to get things from
+        self._in_budget  = cfg.get('input_budget', _INPUT_BUDGET)
         self._outputs    = dict()       # queues to send things to
         self._workers    = dict()       # methods to work on things
         self._publishers = dict()       # channels to send notifications to
-        self._threads    = dict()       # subscriber and idler threads
+        self._threads    = dict()       # reactor thread
         self._cb_lock    = mt.RLock()   # guard threaded callback invokations
 
         if self._owner == self.uid:
@@ -575,6 +608,13 @@ class Component(ru.Process):
         self.register_publisher(rpc.STATE_PUBSUB)
         self.register_publisher(rpc.CONTROL_PUBSUB)
 
+        # if a unit store is configured, units are passed on in delta mode
+        if rpc.UNIT_STORE in self._cfg['bridges']:
+            addr = self._cfg['bridges'][rpc.UNIT_STORE]['addr_in']
+            self._unit_store = rpu_Store(self._session, rpc.UNIT_STORE,
+                                         rpu_STORE_CLIENT, self._cfg, addr=addr)
+            self._snapshots  = dict()
+
         # call component level initialize
         self.initialize_common()
 
@@ -642,6 +682,10 @@ class Component(ru.Process):
         self.unregister_publisher(rpc.STATE_PUBSUB)
         self.unregister_publisher(rpc.CONTROL_PUBSUB)
 
+        if self._unit_store:
+            self._unit_store.stop()
+            self._unit_store = None
+
         self._log.debug('%s close prof', self.uid)
         try:
             self._prof.prof('component_final')
@@ -766,6 +810,7 @@ class Component(ru.Process):
         q = rpu_Queue(self._session, input, rpu_QUEUE_OUTPUT, self._cfg, addr=addr)
         self._inputs[name] = {'queue'  : q,
                               'states' : states}
+        self._in_poller    = None
 
         self._log.debug('registered input %s', name)
 
@@ -804,6 +849,7 @@ class Component(ru.Process):
 
         self._inputs[name]['queue'].stop()
         del(self._inputs[name])
+        self._in_poller = None
         self._log.debug('unregistered input %s', name)
 
         for state in states:
@@ -899,6 +945,9 @@ class Component(ru.Process):
         to *not* be called more frequently than 'timer' seconds, no promise is
         made on a minimal call frequency.  The intent for these callbacks is to
         run lightweight work in semi-regular intervals.  
+
+        The callbacks are invoked by the component's reactor thread (see
+        `utils/reactor.py`), at their deadlines.
         """
 
         self.is_valid()
@@ -906,63 +955,12 @@ class Component(ru.Process):
         name = "%s.idler.%s" % (self.uid, cb.__name__)
         self._log.debug('START: %s register idler %s', self.uid, name)
 
-        with self._cb_lock:
-            if name in self._threads:
-                raise ValueError('cb %s already registered' % cb.__name__)
+        if timer == None: timer = 0.0  # NOTE: busy idle loop
+        else            : timer = float(timer)
 
-            if timer == None: timer = 0.0  # NOTE: busy idle loop
-            else            : timer = float(timer)
-
-            # create a separate thread per idle cb, and let it be watched by the
-            # ru.Process base class
-            #
-            # ----------------------------------------------------------------------
-            # NOTE: idle timing is a tricky beast: if we sleep for too long, then we
-            #       have to wait that long on stop() for the thread to get active
-            #       again and terminate/join.  So we always sleep just a little, and
-            #       explicitly check if sufficient time has passed to activate the
-            #       callback.
-            class Idler(ru.Thread):
-
-                # ------------------------------------------------------------------
-                def __init__(self, name, log, timer, cb, cb_data, cb_lock):
-                    self._name    = name
-                    self._log     = log
-                    self._timeout = timer
-                    self._cb      = cb
-                    self._cb_data = cb_data
-                    self._cb_lock = cb_lock
-                    self._last    = 0.0
-
-                    super(Idler, self).__init__(name=self._name, log=self._log)
-
-                    # immediately start the thread upon construction
-                    self.start()
-
-                # ------------------------------------------------------------------
-                def work_cb(self):
-                    self.is_valid()
-                    if self._timeout and (time.time()-self._last) < self._timeout:
-                        # not yet
-                        time.sleep(0.1) # FIXME: make configurable
-                        return True
+        with self._cb_lock:
+            self._get_reactor().add_timer(name, cb, cb_data, timer)
 
-                    with self._cb_lock:
-                        if self._cb_data != None:
-                            ret = self._cb(cb_data=self._cb_data)
-                        else:
-                            ret = self._cb()
-                    if self._timeout:
-                        self._last = time.time()
-                    return ret
-            # ----------------------------------------------------------------------
-
-            idler = Idler(name=name, timer=timer, log=self._log,
-                          cb=cb, cb_data=cb_data, cb_lock=self._cb_lock)
-            self._threads[name] = idler
-
-        self.register_watchable(idler)
-        self._session._to_stop.append(idler)
         self._log.debug('%s registered idler %s', self.uid, name)
 
 
@@ -971,8 +969,8 @@ class Component(ru.Process):
     def unregister_timed_cb(self, cb):
         """
         This method is reverts the register_timed_cb() above: it
-        removes an idler from the component, and will terminate the
-        respective thread.
+        removes an idler from the component.  The callback is not invoked
+        anymore once this method returns.
         """
 
         self.is_valid()
@@ -980,19 +978,45 @@ class Component(ru.Process):
         name = "%s.idler.%s" % (self.uid, cb.__name__)
         self._log.debug('TERM : %s unregister idler %s', self.uid, name)
 
+        # callbacks are invoked under the cb lock, so none is active while we
+        # hold it
         with self._cb_lock:
 
-            if name not in self._threads:
+            if not self._reactor or not self._reactor.remove_timer(name):
                 self._log.warn('timed cb %s is not registered', name)
               # raise ValueError('%s is not registered' % name)
                 return
 
-            self._threads[name].stop()  # implies join
-            del(self._threads[name])
-
         self._log.debug("TERM : %s unregistered idler %s", self.uid, name)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _get_reactor(self):
+        """
+        Return the reactor thread for timed callbacks and subscribers in this
+        process, and create it on first use.  A reactor inherited over a fork
+        is not running in the child, and is replaced.
+        """
+
+        with self._cb_lock:
+
+            if not self._reactor or self._reactor.pid != os.getpid():
+
+                name = "%s.reactor" % self.uid
+                if self._reactor:
+                    self.unregister_watchable(name)
+
+                self._reactor = rpu_Reactor(name=name, log=self._log,
+                                            cb_lock=self._cb_lock)
+                self._threads[name] = self._reactor
+
+                self.register_watchable(self._reactor)
+                self._session._to_stop.append(self._reactor)
+
+            return self._reactor
+
+
     # --------------------------------------------------------------------------
     #
     def register_publisher(self, pubsub):
@@ -1045,7 +1069,8 @@ class Component(ru.Process):
 
     # --------------------------------------------------------------------------
     #
-    def register_subscriber(self, pubsub, cb, cb_data=None):
+    def register_subscriber(self, pubsub, cb, cb_data=None, state_filter=None,
+                            topics=None):
         """
         This method is complementary to the register_publisher() above: it
         registers a subscription to a pubsub channel.  If a notification
@@ -1057,15 +1082,30 @@ class Component(ru.Process):
 
         where 'topic' is set to the name of the pubsub channel.
 
-        The subscription will be handled in a separate thread, which implies
-        that the callback invocation will also happen in that thread.  It is the
-        caller's responsibility to ensure thread safety during callback
-        invocation.
+        The subscription will be handled by the component's reactor thread
+        (along with all other subscriptions and timed callbacks, see
+        `utils/reactor.py`), which implies that the callback invocation will
+        also happen in that thread.  It is the caller's responsibility to
+        ensure thread safety during callback invocation.
+
+        Subscribers to the state pubsub can pass a `state_filter` dict to only
+        receive the state updates they need, like:
+
+          {'types' : ['unit'],            # only units (default: all types)
+           'states': rps.FINAL,           # only final states (default: all)
+           'last'  : True}                # only the last state per uid and msg
+
+        The filter is applied before the callback is invoked, and updates which
+        end up empty are not passed on (see `utils/pubsub.py`).
+
+        By default, all messages published on the channel are received.  If
+        `topics` is given, only messages published on those topics (see
+        `publish()`) are.  Topics match by prefix.
         """
 
         self.is_valid()
 
-        name = "%s.subscriber.%s" % (self.uid, cb.__name__)
+        name = "%s.subscriber.%s.%s" % (self.uid, pubsub, cb.__name__)
         self._log.debug('START: %s register subscriber %s', self.uid, name)
 
         # get address for pubsub
@@ -1085,63 +1125,21 @@ class Component(ru.Process):
         #        to be created right after -- but it fits here better logically.
       # time.sleep(0.1)
 
-        # ----------------------------------------------------------------------
-        class Subscriber(ru.Thread):
-
-            # ------------------------------------------------------------------
-            def __init__(self, name, l, q, cb, cb_data, cb_lock):
-                self._name     = name
-                self._log      = l
-                self._q        = q
-                self._cb       = cb
-                self._cb_data  = cb_data
-                self._cb_lock  = cb_lock
-
-                super(Subscriber, self).__init__(name=self._name, log=self._log)
-
-                # immediately start the thread upon construction
-                self.start()
-
-            # ------------------------------------------------------------------
-            def work_cb(self):
-                self.is_valid()
-                topic, msg = None, None
-                try:
-                    topic, msg = self._q.get_nowait(500)  # timout in ms
-                except Exception as e:
-                    if not self._ru_term.is_set():
-                        # abort during termination
-                        return False
-
-                if topic and msg:
-                    if not isinstance(msg,list):
-                        msg = [msg]
-                    for m in msg:
-                        with self._cb_lock:
-                            if self._cb_data != None:
-                                ret = cb(topic=topic, msg=m, cb_data=self._cb_data)
-                            else:
-                                ret = self._cb(topic=topic, msg=m)
-                        # we abort whenever a callback indicates thus
-                        if not ret:
-                            return False
-                return True
-            def ru_finalize_common(self):
-                self._q.stop()
-        # ----------------------------------------------------------------------
         # create a pubsub subscriber (the pubsub name doubles as topic)
-        # FIXME: this should be moved into the thread child_init
         q = rpu_Pubsub(self._session, pubsub, rpu_PUBSUB_SUB, self._cfg, addr=addr)
-        q.subscribe(pubsub)
+        for topic in topics or [pubsub]:
+            q.subscribe(topic)
 
-        subscriber = Subscriber(name=name, l=self._log, q=q, 
-                                cb=cb, cb_data=cb_data, cb_lock=self._cb_lock)
+        if state_filter:
+            q.set_filter(rpu_StateFilter(**state_filter))
 
-        with self._cb_lock:
-            self._threads[name] = subscriber
+        try:
+            with self._cb_lock:
+                self._get_reactor().add_subscriber(name, q, cb, cb_data)
+        except:
+            q.stop()
+            raise
 
-        self.register_watchable(subscriber)
-        self._session._to_stop.append(subscriber)
         self._log.debug('%s registered %s subscriber %s', self.uid, pubsub, name)
 
 
@@ -1150,24 +1148,20 @@ class Component(ru.Process):
     def unregister_subscriber(self, pubsub, cb):
         """
         This method is reverts the register_subscriber() above: it
-        removes a subscription from a pubsub channel, and will terminate the
-        respective thread.
+        removes a subscription from a pubsub channel.
         """
 
         self.is_valid()
 
-        name = "%s.subscriber.%s" % (self.uid, cb.__name__)
+        name = "%s.subscriber.%s.%s" % (self.uid, pubsub, cb.__name__)
         self._log.debug('TERM : %s unregister subscriber %s', self.uid, name)
 
         with self._cb_lock:
-            if name not in self._threads:
+            if not self._reactor or not self._reactor.remove_subscriber(name):
                 self._log.warn('subscriber %s is not registered', cb.__name__)
               # raise ValueError('%s is not subscribed to %s' % (cb.__name__, pubsub))
                 return
 
-            self._threads[name]  # implies join
-            del(self._threads[name])
-
         self._log.debug("unregistered subscriber %s", name)
 
 
@@ -1195,10 +1189,10 @@ class Component(ru.Process):
         """
         This is the main routine of the component, as it runs in the component
         process.  It will first initialize the component in the process context.
-        Then it will attempt to get new things from all input queues
-        (round-robin).  For each thing received, it will route that thing to the
-        respective worker method.  Once the thing is worked upon, the next
-        attempt on getting a thing is up.
+        Then it will wait for new things on all input queues at once, and will
+        serve the inputs which have things available in round-robin order,
+        getting up to `input_budget` bulks from each.  For each thing received,
+        it will route that thing to the respective worker method.
         """
 
         self.is_valid()
@@ -1208,74 +1202,146 @@ class Component(ru.Process):
             time.sleep(0.1)
             return True
 
-        for name in self._inputs:
-            input  = self._inputs[name]['queue']
-            states = self._inputs[name]['states']
-
-            # FIXME: a simple, 1-thing caching mechanism would likely
-            #        remove the req/res overhead completely (for any
-            #        non-trivial worker).
-            things = input.get_nowait(1000) # timeout in microseconds
+        if not self._in_poller:
+            self._in_poller = zmq.Poller()
+            self._in_names  = sorted(self._inputs.keys())
+            self._in_socks  = dict()
+            self._in_next   = 0
+            for name in self._in_names:
+                sock = self._inputs[name]['queue'].poll_socket()
+                self._in_socks[name] = sock
+                if sock is not None:
+                    self._in_poller.register(sock, zmq.POLLIN)
+
+        # make sure all inputs have requests (or credits) out.  Inproc inputs
+        # can't be polled, so we only wait for a short while if there are any,
+        # and then try them regardless
+        timeout = _INPUT_TIMEOUT
+        for name in self._in_names:
+            if self._in_socks[name] is None:
+                timeout = _INPROC_TIMEOUT
+            else:
+                self._inputs[name]['queue'].poll_socket()
 
-            if not things:
+        try:
+            ready = dict(self._in_poller.poll(timeout))
+        except zmq.ZMQError as e:
+            if e.errno == errno.EINTR:
                 return True
+            raise
 
-            if not isinstance(things, list):
-                things = [things]
+        n_names = len(self._in_names)
+        n_got   = 0
+        for i in range(n_names):
 
-            # the worker target depends on the state of things, so we 
-            # need to sort the things into buckets by state before 
-            # pushing them
-            buckets = dict()
-            for thing in things:
-                
-                state = thing['state']
-                uid   = thing['uid']
-                self._prof.prof('get', uid=uid, state=state)
+            # workers may have unregistered inputs
+            name = self._in_names[(self._in_next + i) % n_names]
+            if name not in self._inputs:
+                continue
 
-                if not state in buckets:
-                    buckets[state] = list()
-                buckets[state].append(thing)
+            input = self._inputs[name]['queue']
+            sock  = self._in_socks[name]
 
-            # We now can push bulks of things to the workers
+            if sock is not None and sock not in ready:
+                continue
 
-            for state,things in buckets.iteritems():
+            # NOTE: if the bridge is configured with `credits`, bulks are
+            #       prefetched, and this will not cause a round trip to the
+            #       bridge (see `utils/queue.py`).
+            for _ in range(self._in_budget):
 
-                assert(state in states), 'inconsistent state'
-                assert(state in self._workers), 'no worker for state %s' % state
+                things = input.get_nowait(0)
+                if not things:
+                    break
 
-                try:
-                    to_cancel = list()
-                    for thing in things:
-                        uid   = thing['uid']
-                        ttype = thing['type']
-                        state = thing['state']
+                n_got += 1
+                self._work_on(name, things)
 
-                        # FIXME: this can become expensive over time
-                        #        if the cancel list is never cleaned
-                        if uid in self._cancel_list:
-                            with self._cancel_lock:
-                                self._cancel_list.remove(uid)
-                            to_cancel.append(thing)
+        self._in_next = (self._in_next + 1) % n_names
 
-                        self._log.debug('got %s (%s)', ttype, uid)
+        # with only inproc inputs, the poll did not wait
+        if not n_got and not ready and \
+           self._in_poller and not self._in_poller.sockets:
+            time.sleep(_INPROC_TIMEOUT / 1000.0)
 
-                    if to_cancel:
-                        self.advance(to_cancel, rps.CANCELED, publish=True, push=False)
+        # keep work_cb registered
+        return True
 
-                    with self._cb_lock:
-                        self._workers[state](things)
 
-                except Exception as e:
+    # --------------------------------------------------------------------------
+    #
+    def _work_on(self, name, things):
+        """
+        Route the things received on the named input to the worker methods
+        registered for their states.
+        """
 
-                    # this is not fatal -- only the 'things' fail, not
-                    # the component
-                    self._log.exception("worker %s failed", self._workers[state])
-                    self.advance(things, rps.FAILED, publish=True, push=False)
+        states = self._inputs[name]['states']
 
+        if not isinstance(things, list):
+            things = [things]
 
-        # keep work_cb registered
-        return True
+        things = self._store_decode(things)
+
+        # the worker target depends on the state of things, so we 
+        # need to sort the things into buckets by state before 
+        # pushing them
+        buckets = dict()
+        for thing in things:
+            
+            state = thing['state']
+
+            if not state in buckets:
+                buckets[state] = list()
+            buckets[state].append(thing)
+
+        ts = time.time()
+        for state,things in buckets.iteritems():
+            self._prof.prof_bulk('get', [thing['uid'] for thing in things],
+                                 state=state, timestamp=ts)
+
+        # We now can push bulks of things to the workers
+
+        for state,things in buckets.iteritems():
+
+            assert(state in states), 'inconsistent state'
+            assert(state in self._workers), 'no worker for state %s' % state
+
+            try:
+                to_cancel = list()
+                for thing in things:
+                    uid   = thing['uid']
+                    ttype = thing['type']
+                    state = thing['state']
+
+                    # FIXME: this can become expensive over time
+                    #        if the cancel list is never cleaned
+                    if uid in self._cancel_list:
+                        with self._cancel_lock:
+                            self._cancel_list.remove(uid)
+                        to_cancel.append(thing)
+
+                    self._log.debug('got %s (%s)', ttype, uid)
+
+                # canceled things are not passed to the worker: they are final,
+                # and are released from the unit store by `advance()`
+                if to_cancel:
+                    self.advance(to_cancel, rps.CANCELED, publish=True, push=False)
+                    canceled = [thing['uid'] for thing in to_cancel]
+                    things   = [thing for thing in things
+                                      if  thing['uid'] not in canceled]
+
+                if things:
+                    with self._cb_lock:
+                        self._workers[state](things)
+
+            except Exception as e:
+
+                # this is not fatal -- only the 'things' fail, not
+                # the component.  The failed things are released from the unit
+                # store by `advance()`.
+                self._log.exception("worker %s failed", self._workers[state])
+                self.advance(things, rps.FAILED, publish=True, push=False)
 
 
     # --------------------------------------------------------------------------
@@ -1329,14 +1395,15 @@ class Component(ru.Process):
                 thing['state'] = state
             _state = thing['state']
 
-            if prof:
-                self._prof.prof('advance', uid=uid, state=_state,
-                                timestamp=timestamp)
-
             if not _state in buckets:
                 buckets[_state] = list()
             buckets[_state].append(thing)
 
+        if prof:
+            for _state,_things in buckets.iteritems():
+                self._prof.prof_bulk('advance', [t['uid'] for t in _things],
+                                     state=_state, timestamp=timestamp)
+
         # should we publish state information on the state pubsub?
         if publish:
 
@@ -1364,9 +1431,9 @@ class Component(ru.Process):
 
             self.publish(rpc.STATE_PUBSUB, {'cmd': 'update', 'arg': to_publish})
             ts = time.time()
-            for thing in things:
-                self._prof.prof('publish', uid=thing['uid'], 
-                                state=thing['state'], timestamp=ts)
+            for _state,_things in buckets.iteritems():
+                self._prof.prof_bulk('publish', [t['uid'] for t in _things],
+                                     state=_state, timestamp=ts)
 
         # never carry $all across component boundaries!
         else:
@@ -1374,6 +1441,10 @@ class Component(ru.Process):
                 if '$all' in thing:
                     del(thing['$all'])
 
+        # units in final states are not fetched from the unit store anymore
+        if self._unit_store:
+            self._store_release([t for t in things if t['state'] in rps.FINAL])
+
         # should we push things downstream, to the next component
         if push:
 
@@ -1387,43 +1458,175 @@ class Component(ru.Process):
                     # things in final state are dropped
                     for thing in _things:
                         self._log.debug('final %s [%s]', thing['uid'], _state)
-                        self._prof.prof('drop', uid=thing['uid'], state=_state,
-                                        timestamp=ts)
+                    self._prof.prof_bulk('drop', [t['uid'] for t in _things],
+                                         state=_state, timestamp=ts)
                     continue
 
                 if _state not in self._outputs:
                     # unknown target state -- error
                     for thing in _things:
                         self._log.debug("lost  %s [%s]", thing['uid'], _state)
-                        self._prof.prof('lost', uid=thing['uid'], state=_state,
-                                        timestamp=ts)
+                    self._prof.prof_bulk('lost', [t['uid'] for t in _things],
+                                         state=_state, timestamp=ts)
+                    self._store_release(_things)
                     continue
 
                 if not self._outputs[_state]:
                     # empty output -- drop thing
                     for thing in _things:
                         self._log.debug('drop  %s [%s]', thing['uid'], _state)
-                        self._prof.prof('drop', uid=thing['uid'], state=_state,
-                                        timestamp=ts)
+                    self._prof.prof_bulk('drop', [t['uid'] for t in _things],
+                                         state=_state, timestamp=ts)
+                    self._store_release(_things)
                     continue
 
                 output = self._outputs[_state]
 
                 # push the thing down the drain
                 self._log.debug('put bulk %s: %s', _state, len(_things))
-                output.put(_things)
+                output.put(self._store_encode(_things))
 
-                ts = time.time()
-                for thing in _things:
-                    self._prof.prof('put', uid=thing['uid'], state=_state,
-                                    msg=output.name, timestamp=ts)
+                self._prof.prof_bulk('put', [t['uid'] for t in _things],
+                                     state=_state, msg=output.name)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _store_encode(self, things):
+        """
+        In delta mode (if a unit store is configured, see `utils/store.py`),
+        replace the units in `things` by stubs which only contain the uid,
+        state, and the fields which differ from the unit as stored.  Units
+        which were not fetched from the store are stored first.  The returned
+        stubs are marked by a '$stored' key.
+        """
+
+        if not self._unit_store:
+            return things
+
+        ret = list()
+        new = list()
+        for thing in things:
+
+            if thing['type'] != 'unit':
+                ret.append(thing)
+                continue
+
+            uid  = thing['uid']
+            snap = self._snapshots.pop(uid, None)
+
+            if snap is None:
+                new.append(thing)
+                stub = dict()
+
+            else:
+                snap  = msgpack.unpackb(snap)
+                stub  = dict([[k, v] for k, v in thing.iteritems()
+                                     if  k not in snap or snap[k] != v])
+                unset = [k for k in snap if k not in thing]
+                if unset:
+                    stub['$unset'] = unset
+
+            stub['uid']     = uid
+            stub['type']    = thing['type']
+            stub['state']   = thing['state']
+            stub['$stored'] = True
+            ret.append(stub)
+
+        if new:
+            self._unit_store.put(new)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _store_decode(self, things):
+        """
+        Reverse `_store_encode()`: complete the stubs in `things` with the
+        stored units, fetched in a single request.  The stored units are kept
+        as snapshots, to find the fields which changed when the units are
+        passed on.  Snapshots are kept packed as fetched, and are only unpacked
+        by `_store_encode()`.
+        """
+
+        stubs = [thing for thing in things if thing.get('$stored')]
+
+        if not stubs:
+            return things
+
+        if not self._unit_store:
+            raise RuntimeError('got unit stubs but no unit store')
+
+        raw = self._unit_store.get_raw([stub['uid'] for stub in stubs])
+        ret = list()
+        for thing in things:
+
+            if not thing.get('$stored'):
+                ret.append(thing)
+                continue
+
+            uid  = thing['uid']
+            data = raw.pop(0)
+            del(thing['$stored'])
+
+            if not data:
+                # the worker will fail on the incomplete unit
+                self._log.error('unit %s not found in store', uid)
+                ret.append(thing)
+                continue
+
+            # the packed data is a snapshot which the worker can't change
+            unit = msgpack.unpackb(data)
+            self._snapshots[uid] = data
+
+            for key in thing.pop('$unset', []):
+                unit.pop(key, None)
+            unit.update(thing)
+            ret.append(unit)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _store_release(self, things):
+        """
+        Remove units which are not passed on anymore from the unit store.
+        """
+
+        if not self._unit_store:
+            return
+
+        uids = [thing['uid'] for thing in things
+                             if  self._snapshots.pop(thing['uid'], None)]
+        if uids:
+            self._unit_store.delete(uids)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _store_forget(self, things):
+        """
+        Drop the snapshots of units which are passed on other than via
+        `advance()` (like units published to another component).  Those units
+        are stored again in full by the component which advances them next,
+        and the stored units are left in place for it.
+        """
+
+        if not self._unit_store:
+            return
+
+        for thing in things:
+            self._snapshots.pop(thing['uid'], None)
 
 
     # --------------------------------------------------------------------------
     #
-    def publish(self, pubsub, msg):
+    def publish(self, pubsub, msg, topic=None):
         """
-        push information into a publication channel
+        push information into a publication channel.  The message is published
+        on the given topic, or on the channel name if none is given.
         """
 
         self.is_valid()
@@ -1439,7 +1642,7 @@ class Component(ru.Process):
         if not self._publishers[pubsub]:
             raise RuntimeError("no route for '%s' notification: %s" % (pubsub, msg))
 
-        self._publishers[pubsub].put(pubsub, msg)
+        self._publishers[pubsub].put(topic or pubsub, msg)
 
 
 
@@ -26,6 +26,28 @@ def get_hostmap(profile):
     return hostmap
 
 
+# ------------------------------------------------------------------------------
+#
+def get_scheduler_stats(profile):
+    '''
+    The agent scheduler periodically records `sched_stats` events with
+    histogram summaries of its metrics (see `agent/scheduler/stats.py`).  Return
+    the last of those summaries for each scheduler, as a dict of the form:
+
+        {scheduler_uid: {metric: {'n': ..., 'p50': ..., ...}}}
+    '''
+
+    from ..agent.scheduler.stats import str2stats
+
+    ret = dict()
+    for entry in profile:
+        if  entry[ru.EVENT] == 'sched_stats':
+            name, summary = str2stats(entry[ru.MSG])
+            ret.setdefault(entry[ru.UID], dict())[name] = summary
+
+    return ret
+
+
 # ------------------------------------------------------------------------------
 #
 def get_hostmap_deprecated(profiles):
@@ -0,0 +1,295 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import time
+import atexit
+import weakref
+import collections
+
+import threading     as mt
+import radical.utils as ru
+
+
+# ------------------------------------------------------------------------------
+#
+# Profile events are grouped into classes, which can be enabled or disabled
+# individually via the `profile_events` setting in the session config, like:
+#
+#     "profile_events" : {"state": true, "transport": false}
+#
+# Classes which are not listed are enabled.  The event classes are:
+#
+#   state    : state transitions (`advance` events)
+#   transport: things passed between components and to the DB
+#   other    : all other events
+#
+PROF_STATE     = 'state'
+PROF_TRANSPORT = 'transport'
+PROF_OTHER     = 'other'
+
+_EVENT_CLASSES = {'advance'      : PROF_STATE,
+                  'get'          : PROF_TRANSPORT,
+                  'put'          : PROF_TRANSPORT,
+                  'drop'         : PROF_TRANSPORT,
+                  'lost'         : PROF_TRANSPORT,
+                  'publish'      : PROF_TRANSPORT,
+                  'update_pushed': PROF_TRANSPORT}
+
+_BUFFER_SIZE    = 4096  # number of events buffered before the caller flushes
+_FORMAT         = "%.4f,%s,%s,%s,%s,%s,%s\n"  # as written by `ru.Profiler`
+_FLUSH_INTERVAL =  1.0  # s between flushes by the background thread
+
+_profilers = weakref.WeakSet()  # stopped and flushed on exit
+
+
+# ------------------------------------------------------------------------------
+#
+@atexit.register
+def _stop_all():
+
+    # stop the flush threads before the interpreter tears down the modules
+    for prof in list(_profilers):
+        prof._stop()
+
+
+# ==============================================================================
+#
+class Profiler(object):
+    '''
+    A wrapper around `ru.Profiler` which takes the formatting and writing of
+    profile events out of the hot paths: events are recorded as tuples in
+    a deque (which is thread-safe without locking), and a background thread
+    writes them to the profile every `_FLUSH_INTERVAL` seconds, in a single
+    write.  If the buffer fills up, the caller flushes it.  `ru.Profiler`
+    still writes the header, the time sync info and the final event, so the
+    profile format is not changed.
+
+    `prof_bulk()` records one event for many uids, with a shared timestamp.
+    Events of disabled classes are not recorded at all.
+    '''
+
+    _start_lock = mt.Lock()  # guards the per-process start of flush threads
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name, ns=None, path=None, events=None):
+
+        self._name    = name
+        self._prof    = ru.Profiler(name=name, ns=ns, path=path)
+        self._enabled = self._prof.enabled
+        self._classes = dict(events or {})
+        self._events  = dict()  # event: enabled, cached
+        self._handle  = None
+
+        self._buffer  = collections.deque()
+        self._pid     = None    # the flush thread's process
+        self._thread  = None
+        self._term    = None
+
+        if self._enabled:
+            self._handle = open("%s/%s.prof" % (path or os.getcwd(), name), 'a')
+            _profilers.add(self)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def enabled(self):
+
+        return self._enabled
+
+
+    # --------------------------------------------------------------------------
+    #
+    def timestamp(self):
+
+        return self._prof.timestamp()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def is_enabled(self, event):
+        '''
+        Return `True` if events of this kind are recorded.
+        '''
+
+        enabled = self._events.get(event)
+
+        if enabled is None:
+            eclass  = _EVENT_CLASSES.get(event, PROF_OTHER)
+            enabled = self._enabled and bool(self._classes.get(eclass, True))
+            self._events[event] = enabled
+
+        return enabled
+
+
+    # --------------------------------------------------------------------------
+    #
+    def prof(self, event, uid=None, state=None, msg=None, timestamp=None,
+             comp=None, tid=None):
+
+        enabled = self._events.get(event)
+        if enabled is None:
+            enabled = self.is_enabled(event)
+        if not enabled:
+            return
+
+        if timestamp is None: timestamp = time.time()
+        if tid       is None: tid       = mt.current_thread().name
+
+        self._record((event, uid, state, msg, timestamp, comp, tid))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def prof_bulk(self, event, uids, state=None, msg=None, timestamp=None):
+        '''
+        Record the same event for all given uids, with the same timestamp.
+        '''
+
+        enabled = self._events.get(event)
+        if enabled is None:
+            enabled = self.is_enabled(event)
+        if not enabled or not uids:
+            return
+
+        if timestamp is None: timestamp = time.time()
+
+        self._record((event, list(uids), state, msg, timestamp, None,
+                      mt.current_thread().name))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _record(self, event):
+
+        if self._pid != os.getpid():
+            with Profiler._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+        self._buffer.append(event)
+
+        if len(self._buffer) >= _BUFFER_SIZE:
+            self._flush()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _start(self):
+        '''
+        Start the flush thread for this process.  A forked child discards the
+        events inherited from the parent, which the parent will write.
+        '''
+
+        self._wlock  = mt.Lock()    # serializes writes to the profile
+        self._buffer = collections.deque()
+        self._pid    = os.getpid()
+        self._term   = mt.Event()
+        self._thread = mt.Thread(target=self._flush_loop,
+                                 name='%s.flush' % self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flush_loop(self):
+
+        term = self._term
+        while not term.wait(_FLUSH_INTERVAL):
+            self._flush()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flush(self):
+        '''
+        Write all recorded events to the profile.
+        '''
+
+        if self._pid != os.getpid():
+            return
+
+        with self._wlock:
+
+            events = list()
+            try:
+                while True:
+                    events.append(self._buffer.popleft())
+            except IndexError:
+                pass
+
+            if not events or not self._handle:
+                return
+
+            # one line per uid for lists of uids, as `ru.Profiler` does
+            lines = list()
+            for event, uid, state, msg, timestamp, comp, tid in events:
+
+                if comp  is None: comp  = self._name
+                if state is None: state = ''
+                if msg   is None: msg   = ''
+
+                if isinstance(uid, list): uids = uid
+                else                    : uids = [uid]
+
+                for uid in uids:
+                    if uid is None: uid = ''
+                    lines.append(_FORMAT % (timestamp, event, comp, tid, uid,
+                                            state, msg))
+
+            self._handle.write(''.join(lines))
+            self._handle.flush()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def flush(self, verbose=True):
+
+        if not self._enabled:
+            return
+
+        self._flush()
+        self._prof.flush(verbose=verbose)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _stop(self):
+        '''
+        Stop the flush thread of this process, and write the remaining events.
+        '''
+
+        if self._pid != os.getpid():
+            return
+
+        self._term.set()
+        if self._thread is not mt.current_thread():
+            self._thread.join()
+
+        self._flush()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        if not self._enabled:
+            return
+
+        self._stop()
+
+        self._enabled = False
+        self._events  = dict()
+        self._handle.close()
+        self._handle  = None
+        self._prof.close()
+        _profilers.discard(self)
+
+
+# ------------------------------------------------------------------------------
+
@@ -8,6 +8,7 @@ import time
 import errno
 import pprint
 import msgpack
+import collections
 
 import Queue           as pyq
 import setproctitle    as spt
@@ -15,7 +16,8 @@ import multiprocessing as mp
 
 import radical.utils   as ru
 
-from .misc import hostip as rpu_hostip
+from .misc    import hostip as rpu_hostip
+from .        import channel as rpu_channel
 
 
 # --------------------------------------------------------------------------
@@ -30,6 +32,8 @@ _USE_MULTIPART   = False  # send [topic, data] as multipart message
 _BRIDGE_TIMEOUT  =     5  # how long to wait for bridge startup
 _LINGER_TIMEOUT  =   250  # ms to linger after close
 _HIGH_WATER_MARK =     0  # number of messages to buffer before dropping
+_FORWARD_BATCH   =  1024  # max number of messages forwarded in one go
+_BRIDGE_POLL     =  1000  # ms to wait for messages in the bridge
 
 
 # --------------------------------------------------------------------------
@@ -61,12 +65,89 @@ def _uninterruptible(f, *args, **kwargs):
                 raise
 
 
+# ==============================================================================
+#
+class StateFilter(object):
+    '''
+    Notifications on the state pubsub are of the form
+
+        {'cmd': 'update', 'arg': [thing, thing, ...]}
+
+    where each thing has (at least) a 'uid', 'type' and 'state'.  A subscriber
+    can set a filter (see `Pubsub.set_filter()`) so that it only receives the
+    things of the given `types` and in the given `states` (all types and all
+    states if not specified).  With `last=True`, only the last notification
+    for each uid is kept from each message.  Updates which end up empty are
+    dropped, messages with other commands are not filtered.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, types=None, states=None, last=False):
+
+        self._types  = set(types)  if types  else None
+        self._states = set(states) if states else None
+        self._last   = bool(last)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def apply(self, msg):
+        '''
+        Return the filtered message, or `None` if nothing is left to deliver.
+        '''
+
+        if not isinstance(msg, dict) or msg.get('cmd') != 'update':
+            return msg
+
+        things = msg.get('arg')
+        if not isinstance(things, list):
+            things = [things]
+
+        ret = list()
+        idx = dict()  # uid: index of the last notification in ret
+        for thing in things:
+
+            if self._types  and thing.get('type')  not in self._types : continue
+            if self._states and thing.get('state') not in self._states: continue
+
+            if self._last:
+                uid = thing.get('uid')
+                if uid in idx:
+                    ret[idx[uid]] = None
+                idx[uid] = len(ret)
+
+            ret.append(thing)
+
+        if self._last:
+            ret = [thing for thing in ret if thing is not None]
+
+        if not ret:
+            return None
+
+        if len(ret) == len(things):
+            return msg
+
+        return {'cmd': 'update', 'arg': ret}
+
+
 # ==============================================================================
 #
 # Notifications between components are based on pubsub channels.  Those channels
 # have different scope (bound to the channel name).  Only one specific topic is
 # predefined: 'state' will be used for unit state updates.
 #
+# The transport used by a pubsub channel is configured on the bridge, see
+# `channel.py`.
+#
+# A bridge with `coalesce` set (in seconds, default 0: disabled) collects the
+# 'update' notifications it receives for that long, and then publishes them as
+# a single update, with one entry per uid.  The entries for the same uid are
+# merged (later values win), so subscribers get the latest state and all keys
+# which were published for it, but not the intermediate states.  Other
+# messages are forwarded immediately (after the pending updates for their
+# topic).  inproc bridges do not coalesce.
+#
 class Pubsub(ru.Process):
 
     def __init__(self, session, channel, role, cfg, addr=None):
@@ -98,19 +179,49 @@ class Pubsub(ru.Process):
         self._addr_in   = None  # bridge input  addr
         self._addr_out  = None  # bridge output addr
 
-        self._q    = None
-        self._in   = None
-        self._out  = None
-        self._ctx  = None
+        self._q      = None
+        self._in     = None
+        self._out    = None
+        self._ctx    = None
+        self._inproc = None     # inproc channel, instead of zmq sockets
+        self._sub    = None     # inproc subscriber
+        self._bound  = list()   # addresses bound by the bridge
+        self._filter = None     # StateFilter applied by subscribers
+
+        self._coalesce   = float(self._cfg.get('coalesce', 0.0))
+        self._pending    = dict()  # topic: {uid: merged update}
+        self._pending_t0 = None    # arrival time of the oldest pending update
+
+        self._transport = self._cfg.get('transport', rpu_channel.TRANSPORT_TCP)
 
         if not self._addr:
-            self._addr = 'tcp://*:*'
+            self._addr = rpu_channel.get_bridge_addr(self._transport)
 
         self._log.info("create %s - %s - %s", self._channel, self._role, self._addr)
 
         super(Pubsub, self).__init__(name=self._uid, log=self._log)
 
 
+        # ----------------------------------------------------------------------
+        # inproc channels replace the bridge and the zmq sockets
+        if self._role == PUBSUB_BRIDGE and \
+           self._transport == rpu_channel.TRANSPORT_INPROC:
+
+            self._inproc   = rpu_channel.InprocPubsub(self._uid)
+            self._addr_in  = ru.Url(self._inproc.addr)
+            self._addr_out = ru.Url(self._inproc.addr)
+            self.start(spawn=False)
+            return
+
+        if self._role != PUBSUB_BRIDGE and rpu_channel.is_inproc(self._addr):
+
+            self._inproc = rpu_channel.InprocPubsub.lookup(self._addr)
+            if self._role == PUBSUB_SUB:
+                self._sub = self._inproc.subscriber()
+            self.start(spawn=False)
+            return
+
+
         # ----------------------------------------------------------------------
         # behavior depends on the role...
         if self._role == PUBSUB_PUB:
@@ -146,8 +257,9 @@ class Pubsub(ru.Process):
                 self._addr_out = ru.Url(addr_out)
 
                 # use the local hostip for bridge addresses
-                self._addr_in.host  = rpu_hostip()
-                self._addr_out.host = rpu_hostip()
+                if self._addr_in.schema == rpu_channel.TRANSPORT_TCP:
+                    self._addr_in.host  = rpu_hostip()
+                    self._addr_out.host = rpu_hostip()
 
             except pyq.Empty as e:
                 raise RuntimeError ("bridge did not come up! (%s)" % e)
@@ -218,18 +330,19 @@ class Pubsub(ru.Process):
         self._in  = self._ctx.socket(zmq.XSUB)
         self._in.linger = _LINGER_TIMEOUT
         self._in.hwm    = _HIGH_WATER_MARK
-        self._in.bind(self._addr)
+        self._in.bind(rpu_channel.get_bind_addr(self._addr, self._channel, 'in'))
 
         self._out = self._ctx.socket(zmq.XPUB)
         self._out.linger = _LINGER_TIMEOUT
         self._out.hwm    = _HIGH_WATER_MARK
-        self._out.bind(self._addr)
+        self._out.bind(rpu_channel.get_bind_addr(self._addr, self._channel, 'out'))
 
         # communicate the bridge ports to the parent process
         _addr_in  = self._in.getsockopt( zmq.LAST_ENDPOINT)
         _addr_out = self._out.getsockopt(zmq.LAST_ENDPOINT)
 
         self._pqueue.put([_addr_in, _addr_out])
+        self._bound = [_addr_in, _addr_out]
 
         self._log.info('bound bridge %s to %s : %s', self._uid, _addr_in, _addr_out)
 
@@ -239,52 +352,162 @@ class Pubsub(ru.Process):
         self._poll.register(self._out, zmq.POLLIN)
 
 
+    # --------------------------------------------------------------------------
+    # 
+    def ru_finalize_child(self):
+
+        # don't lose coalesced updates
+        if self._pending:
+            self._release()
+
+
     # --------------------------------------------------------------------------
     # 
     def ru_finalize_common(self):
 
         if self._q   : self._q  .close()
         if self._in  : self._in .close()
+        if self._inproc and self._role == PUBSUB_BRIDGE:
+            self._inproc.close()
         if self._out : self._out.close()
         if self._ctx : self._ctx.destroy()
 
+        for addr in self._bound:
+            rpu_channel.unlink_ipc(addr)
+
 
     # --------------------------------------------------------------------------
     # 
     def work_cb(self):
 
-        _socks = dict(_uninterruptible(self._poll.poll, timeout=1000)) # timeout in ms
+        # don't sleep past the end of the coalescing window
+        timeout = _BRIDGE_POLL
+        if self._pending:
+            left    = self._pending_t0 + self._coalesce - time.time()
+            timeout = max(0, min(timeout, int(left * 1000)))
+
+        _socks = dict(_uninterruptible(self._poll.poll, timeout=timeout))
 
         if self._in in _socks:
             
             # if any incoming socket signals a message, get the
             # message on the subscriber channel, and forward it
-            # to the publishing channel, no questions asked.
-            if _USE_MULTIPART:
-                msg = _uninterruptible(self._in.recv_multipart, flags=zmq.NOBLOCK)
-                _uninterruptible(self._out.send_multipart, msg)
+            # to the publishing channel, no questions asked (unless we
+            # coalesce updates).
+            if self._coalesce:
+                self._collect()
             else:
-                msg = _uninterruptible(self._in.recv, flags=zmq.NOBLOCK)
-                _uninterruptible(self._out.send, msg)
-          # if self._debug:
-          #     self._log.debug("-> %s", pprint.pformat(msg))
-
+                self._forward(self._in, self._out)
 
         if self._out in _socks:
             # if any outgoing socket signals a message, it's
             # likely a topic subscription.  We forward that on
             # the incoming channels to subscribe for the
             # respective messages.
+            self._forward(self._out, self._in)
+
+        if self._pending and \
+           time.time() >= self._pending_t0 + self._coalesce:
+            self._release()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _forward(self, src, dst):
+        '''
+        Forward all messages which are available on `src` (up to
+        `_FORWARD_BATCH`) to `dst`.  The bridge never decodes the messages: they
+        are forwarded as raw zmq frames (single or multipart), without copying
+        them.
+        '''
+
+        for _ in range(_FORWARD_BATCH):
+            try:
+                frames = _uninterruptible(src.recv_multipart,
+                                          flags=zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                break
+            if not frames:
+                break
+            _uninterruptible(dst.send_multipart, frames, copy=False)
+          # if self._debug:
+          #     self._log.debug("-> %s", [f.bytes for f in frames])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _collect(self):
+        '''
+        Receive the messages available on the bridge input (up to
+        `_FORWARD_BATCH`), and merge all updates into the pending ones.  Other
+        messages are forwarded.
+        '''
+
+        for _ in range(_FORWARD_BATCH):
+
+            try:
+                frames = _uninterruptible(self._in.recv_multipart,
+                                          flags=zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            if not frames:
+                break
+
+            if len(frames) == 2: topic, data = frames
+            else               : topic, data = frames[0].split(' ', 1)
+
+            msg = msgpack.unpackb(data)
+
+            if not isinstance(msg, dict) or msg.get('cmd') != 'update':
+                # keep the order of messages on the same topic
+                self._release(topic)
+                _uninterruptible(self._out.send_multipart, frames)
+                continue
+
+            things = msg.get('arg')
+            if not isinstance(things, list):
+                things = [things]
+
+            if topic not in self._pending:
+                self._pending[topic] = collections.OrderedDict()
+            pending = self._pending[topic]
+
+            for thing in things:
+                uid = thing.get('uid') or object()  # don't merge w/o uid
+                if uid in pending: pending[uid].update(thing)
+                else             : pending[uid] = thing
+
+            if not self._pending_t0:
+                self._pending_t0 = time.time()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _release(self, topic=None):
+        '''
+        Publish the pending updates for the given topic (all topics if `None`).
+        '''
+
+        if topic: topics = [topic]
+        else    : topics = self._pending.keys()
+
+        for t in topics:
+
+            pending = self._pending.pop(t, None)
+            if not pending:
+                continue
+
+            data = msgpack.packb({'cmd': 'update', 'arg': pending.values()})
+
             if _USE_MULTIPART:
-                msg = _uninterruptible(self._out.recv_multipart)
-                _uninterruptible(self._in.send_multipart, msg)
+                _uninterruptible(self._out.send_multipart, [t, data])
             else:
-                msg = _uninterruptible(self._out.recv)
-                _uninterruptible(self._in.send, msg)
-          # if self._debug:
-          #     self._log.debug("<- %s", pprint.pformat(msg))
+                _uninterruptible(self._out.send, "%s %s" % (t, data))
 
-        return True
+        if not self._pending:
+            self._pending_t0 = None
 
 
     # --------------------------------------------------------------------------
@@ -296,9 +519,45 @@ class Pubsub(ru.Process):
         topic = topic.replace(' ', '_')
 
       # self._log.debug("~~ %s", topic)
+        if self._sub:
+            self._sub.subscribe(topic)
+            return
+
         _uninterruptible(self._q.setsockopt, zmq.SUBSCRIBE, topic)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def set_filter(self, state_filter):
+        '''
+        Only deliver the messages which pass the given `StateFilter` (`None`
+        to deliver all messages).  Messages are filtered before `get()` and
+        `get_nowait()` return them.
+        '''
+
+        assert(self._role == PUBSUB_SUB), 'incorrect role on set_filter'
+
+        self._filter = state_filter
+
+
+    # --------------------------------------------------------------------------
+    #
+    def poll_socket(self):
+        '''
+        Return the zmq socket on which this subscriber receives messages, so
+        that callers can poll several subscribers at once, and then call
+        `get_nowait(0)` on the ready ones.  Returns `None` for inproc channels,
+        which can't be polled.
+        '''
+
+        assert(self._role == PUBSUB_SUB), 'incorrect role on poll_socket'
+
+        if self._sub:
+            return None
+
+        return self._q
+
+
     # --------------------------------------------------------------------------
     #
     def put(self, topic, msg):
@@ -311,7 +570,10 @@ class Pubsub(ru.Process):
         topic = topic.replace(' ', '_')
         data  = msgpack.packb(msg) 
 
-        if _USE_MULTIPART:
+        if self._inproc:
+            self._inproc.put(topic, data)
+
+        elif _USE_MULTIPART:
           # if self._debug:
           #     self._log.debug("-> %s", ([topic, pprint.pformat(msg)]))
             _uninterruptible(self._q.send_multipart, [topic, data])
@@ -328,9 +590,24 @@ class Pubsub(ru.Process):
 
         assert(self._role == PUBSUB_SUB), 'invalid role on get'
 
+        while True:
+            topic, msg = self._get()
+            if self._filter:
+                msg = self._filter.apply(msg)
+            if msg is not None:
+                return [topic, msg]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get(self):
+
         # FIXME: add timeout to allow for graceful termination
 
-        if _USE_MULTIPART:
+        if self._sub:
+            topic, data = self._sub.get()
+
+        elif _USE_MULTIPART:
             topic, data = _uninterruptible(self._q.recv_multipart)
 
         else:
@@ -349,6 +626,32 @@ class Pubsub(ru.Process):
 
         assert(self._role == PUBSUB_SUB), 'invalid role on get_nowait'
 
+        while True:
+
+            topic, msg = self._get_nowait(timeout)
+
+            if not topic or not self._filter:
+                return [topic, msg]
+
+            msg = self._filter.apply(msg)
+            if msg is not None:
+                return [topic, msg]
+
+            # the message was filtered out: return the next one if it is
+            # already available
+            timeout = 0
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_nowait(self, timeout):
+
+        if self._sub:
+            msg = self._sub.get(timeout)
+            if not msg:
+                return [None, None]
+            return [msg[0], msgpack.unpackb(msg[1])]
+
         if _uninterruptible(self._q.poll, flags=zmq.POLLIN, timeout=timeout):
 
             if _USE_MULTIPART:
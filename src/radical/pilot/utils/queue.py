@@ -8,6 +8,7 @@ import time
 import errno
 import pprint
 import msgpack
+import collections
 
 import Queue           as pyq
 import setproctitle    as spt
@@ -16,7 +17,8 @@ import multiprocessing as mp
 
 import radical.utils   as ru
 
-from .misc import hostip as rpu_hostip
+from .misc    import hostip as rpu_hostip
+from .        import channel as rpu_channel
 
 
 # --------------------------------------------------------------------------
@@ -27,9 +29,14 @@ QUEUE_BRIDGE  = 'bridge'
 QUEUE_OUTPUT  = 'output'
 QUEUE_ROLES   = [QUEUE_INPUT, QUEUE_BRIDGE, QUEUE_OUTPUT]
 
-_BRIDGE_TIMEOUT  =     1  # how long to wait for bridge startup
-_LINGER_TIMEOUT  =   250  # ms to linger after close
-_HIGH_WATER_MARK =     0  # number of messages to buffer before dropping
+_BRIDGE_TIMEOUT    =     1  # how long to wait for bridge startup
+_LINGER_TIMEOUT    =   250  # ms to linger after close
+_HIGH_WATER_MARK   =     0  # number of messages to buffer before dropping
+_PASSTHROUGH_BATCH =  1024  # max number of messages forwarded in one go
+
+# control message to release stalled messages (see `Queue.flush()`).  It is
+# sent pre-encoded, so that bridges can recognize it without decoding frames.
+_FLUSH_DATA = msgpack.packb('__rp_queue_flush__')
 
 
 # --------------------------------------------------------------------------
@@ -97,6 +104,26 @@ def _uninterruptible(f, *args, **kwargs):
 # forwarder.  'address' denominates a connection endpoint, and 'name' is
 # a unique identifier: if multiple instances in the current process space use
 # the same identifier, they will get the same queue instance.
+#
+# By default, each 'get()' on the output end sends a request to the bridge, and
+# waits for the bridge to reply with the next bulk of messages.  If `credits` is
+# configured for a bridge, the output ends instead announce that number of
+# credits to the bridge, and return a credit for each bulk they receive.  The
+# bridge streams bulks to the output ends as long as they have credits left, so
+# that each output end has up to `credits` bulks prefetched, and 'get()' does
+# not need a round trip to the bridge anymore.  Bulks are distributed
+# round-robin over the output ends which have credits, so that competing output
+# ends are served fairly - but an output end which is slow to consume its bulks
+# will hold on to the bulks prefetched for it.
+#
+# Bridges can stall messages until `stall_hwm` messages are collected, to
+# release them in bulks of `bulk_size`.  With `stall_timeout` (in seconds),
+# a partial set of stalled messages is released once the first of them has
+# waited for that long, so that the tail of a workload does not remain stuck in
+# the bridge.  An input end can also release the stalled messages immediately
+# via `flush()`.
+#
+# The transport used by a queue is configured on the bridge, see `channel.py`.
 
 
 # ==============================================================================
@@ -150,16 +177,50 @@ class Queue(ru.Process):
         self._addr_out   = None           # bridge output addr
         self._stall_hwm  = cfg.get('stall_hwm', 1)
         self._bulk_size  = cfg.get('bulk_size', 1)
+        self._stall_tout = cfg.get('stall_timeout', 0)  # 0: wait for hwm
+        self._stalled    = list()         # messages collected by the bridge
+        self._stall_t0   = None           # time of oldest stalled message
+
+        # bridges only need to decode messages if they re-bulk them
+        self._passthrough = self._stall_hwm <= 1 and self._bulk_size <= 0
+
+        # The queue ends are created with the component config, which contains
+        # the bridge configs.  Bridges get their own config.
+        bcfg = self._cfg.get('bridges', {}).get(self._qname, self._cfg)
+
+        self._credits    = bcfg.get('credits', 0)  # bulks to prefetch
+        self._announced  = False                   # initial credits sent
+
+        self._transport  = self._cfg.get('transport', rpu_channel.TRANSPORT_TCP)
 
         if not self._addr:
-            self._addr = 'tcp://*:*'
+            self._addr = rpu_channel.get_bridge_addr(self._transport)
 
         self._log.info("create %s - %s - %s", self._qname, self._role, self._addr)
 
-        self._q    = None           # the zmq queue
-        self._in   = None
-        self._out  = None
-        self._ctx  = None
+        self._q       = None        # the zmq queue
+        self._in      = None
+        self._out     = None
+        self._ctx     = None
+        self._channel = None        # inproc channel, instead of zmq sockets
+        self._bound   = list()      # addresses bound by the bridge
+
+        # ----------------------------------------------------------------------
+        # inproc channels replace the bridge and the zmq sockets
+        if self._role == QUEUE_BRIDGE and \
+           self._transport == rpu_channel.TRANSPORT_INPROC:
+
+            self._channel  = rpu_channel.InprocQueue(self._uid)
+            self._addr_in  = ru.Url(self._channel.addr)
+            self._addr_out = ru.Url(self._channel.addr)
+            self.start(spawn=False)
+            return
+
+        if self._role != QUEUE_BRIDGE and rpu_channel.is_inproc(self._addr):
+
+            self._channel = rpu_channel.InprocQueue.lookup(self._addr)
+            self.start(spawn=False)
+            return
 
 
         # ----------------------------------------------------------------------
@@ -197,8 +258,9 @@ class Queue(ru.Process):
                 self._addr_out = ru.Url(addr_out)
 
                 # use the local hostip for bridge addresses
-                self._addr_in.host  = rpu_hostip()
-                self._addr_out.host = rpu_hostip()
+                if self._addr_in.schema == rpu_channel.TRANSPORT_TCP:
+                    self._addr_in.host  = rpu_hostip()
+                    self._addr_out.host = rpu_hostip()
 
             except pyq.Empty as e:
                 raise RuntimeError ("bridge did not come up! (%s)" % e)
@@ -210,7 +272,8 @@ class Queue(ru.Process):
             self._ctx = zmq.Context()
             self._session._to_destroy.append(self._ctx)
 
-            self._q   = self._ctx.socket(zmq.REQ)
+            if self._credits: self._q = self._ctx.socket(zmq.DEALER)
+            else            : self._q = self._ctx.socket(zmq.REQ)
             self._q.linger = _LINGER_TIMEOUT
             self._q.hwm    = _HIGH_WATER_MARK
             self._q.connect(self._addr)
@@ -272,18 +335,26 @@ class Queue(ru.Process):
         self._in = self._ctx.socket(zmq.PULL)
         self._in.linger = _LINGER_TIMEOUT
         self._in.hwm    = _HIGH_WATER_MARK
-        self._in.bind(self._addr)
-
-        self._out = self._ctx.socket(zmq.REP)
+        self._in.bind(rpu_channel.get_bind_addr(self._addr, self._qname, 'in'))
+
+        # output ends which use credits send them from DEALER sockets, and we
+        # need to know who sent them.  We also need to know when an output end
+        # went away, so that we don't silently drop the bulks sent to it.
+        if self._credits:
+            self._out = self._ctx.socket(zmq.ROUTER)
+            self._out.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        else:
+            self._out = self._ctx.socket(zmq.REP)
         self._out.linger = _LINGER_TIMEOUT
         self._out.hwm    = _HIGH_WATER_MARK
-        self._out.bind(self._addr)
+        self._out.bind(rpu_channel.get_bind_addr(self._addr, self._qname, 'out'))
 
         # communicate the bridge ports to the parent process
         _addr_in  = self._in.getsockopt( zmq.LAST_ENDPOINT)
         _addr_out = self._out.getsockopt(zmq.LAST_ENDPOINT)
 
         self._pqueue.put([_addr_in, _addr_out])
+        self._bound = [_addr_in, _addr_out]
 
         self._log.info('bound bridge %s to %s : %s', self._uid, _addr_in, _addr_out)
 
@@ -291,6 +362,11 @@ class Queue(ru.Process):
         self._poll = zmq.Poller()
         self._poll.register(self._out, zmq.POLLIN)
 
+        # credits per output end, and the output ends with credits left, in
+        # order of service
+        self._granted = dict()
+        self._ready   = collections.deque()
+
 
     # --------------------------------------------------------------------------
     # 
@@ -298,9 +374,14 @@ class Queue(ru.Process):
 
         if self._q   : self._q   .close()
         if self._in  : self._in  .close()
+        if self._channel and self._role == QUEUE_BRIDGE:
+            self._channel.close()
         if self._out : self._out .close()
         if self._ctx : self._ctx.destroy()
 
+        for addr in self._bound:
+            rpu_channel.unlink_ipc(addr)
+
 
     # --------------------------------------------------------------------------
     # 
@@ -310,48 +391,81 @@ class Queue(ru.Process):
         # we'll poll all outgoing sockets for requests, and the
         # forward the message to whoever requested it.
         #
+        # Unless stalling or bulking is configured (see below), the bridge
+        # does not need to look into the messages: they are forwarded as raw
+        # frames, without decoding and re-encoding them (pass-through).  All
+        # messages which are available at that point are forwarded in one go.
+        if self._passthrough:
+            frames = self._recv_raw()
+            if frames is None:
+                return False
+            return self._send(frames)
+
         # If so configured, we can stall messages until reaching
         # a certain high-water-mark, and upon reaching that will
         # release all messages at once.  When stalling for such set
         # of messages, we wait for self._stall_hwm messages, and
         # then forward those to whatever output channel requesting
-        # them (individually),
-        # FIXME: we may want to release all stalled messages after
-        #        some (configurable) timeout?
-        # FIXME: is it worth introducing a 'flush' command or
-        #        message type?
-        # NOTE:  hwm collection interferes with termination:
-        #        while we wait for messages to arrive, we will not leave this
-        #        work_cb, and thus will not allow the `ru.Process` main loop to
-        #        terminate gracefully as needed.  One solution would be to
-        #        inject manual statements to check for termination conditions.
-        #        The other option would be to collect the messages across
-        #        multiple work_cb invocations -- but the latter options would
-        #        significantly increase the code complexity, as we would need to
-        #        maintain state across method invocations, so we opt for the
-        #        first option.
-        hwm  = self._stall_hwm
-        bulk = self._bulk_size
-
-        msgs = list()
-        while len(msgs) < hwm:
-            data = None
-            while self.is_alive(strict=False):
-                if _uninterruptible(self._in.poll, flags=zmq.POLLIN, 
-                                   timeout=1000):
-                    data = _uninterruptible(self._in.recv)
+        # them (individually).  Stalled messages are also released
+        # when the oldest of them waited for `stall_timeout` seconds,
+        # or when a flush message arrives.
+        # NOTE:  the stalled messages are collected across multiple work_cb
+        #        invocations, so that we never wait longer than a second
+        #        before returning to the `ru.Process` main loop, which can
+        #        then terminate the bridge as needed.
+        hwm   = self._stall_hwm
+        bulk  = self._bulk_size
+        tout  = self._stall_tout
+        flush = False
+
+        # wait for messages, but not beyond the deadline of stalled ones
+        wait = 1000  # ms
+        if self._stalled and tout:
+            wait = min(wait, (self._stall_t0 + tout - time.time()) * 1000)
+            wait = max(0, int(wait))
+
+        if _uninterruptible(self._in.poll, flags=zmq.POLLIN, timeout=wait):
+
+            while len(self._stalled) < hwm:
+                try:
+                    data = _uninterruptible(self._in.recv, flags=zmq.NOBLOCK)
+                except zmq.Again:
                     break
-            if not data:
-                if not self.is_alive(strict=False):
-                    self._log.warn('not alive anymore?')
+
+                if data is None:
                     return False
-            msg = msgpack.unpackb(data) 
-            if isinstance(msg, list): 
-                msgs += msg
-            else: 
-                msgs.append(msg)
-            self._log.debug('stall %s/%s', len(msgs), hwm)
-        self._log.debug('hwm   %s/%s', len(msgs), hwm)
+
+                if data == _FLUSH_DATA:
+                    flush = True
+                    break
+
+                if not self._stalled:
+                    self._stall_t0 = time.time()
+
+                msg = msgpack.unpackb(data) 
+                if isinstance(msg, list): 
+                    self._stalled += msg
+                else: 
+                    self._stalled.append(msg)
+
+            self._log.debug('stall %s/%s', len(self._stalled), hwm)
+
+        elif not self.is_alive(strict=False):
+            self._log.warn('not alive anymore?')
+            return False
+
+        if not self._stalled:
+            return True
+
+        if  not flush \
+            and len(self._stalled) < hwm \
+            and (not tout or time.time() < self._stall_t0 + tout):
+            return True
+
+        self._log.debug('hwm   %s/%s', len(self._stalled), hwm)
+
+        msgs          = self._stalled
+        self._stalled = list()
 
         # if 'bulk' is '0', we send all messages as
         # a single bulk.  Otherwise, we chop them up
@@ -363,22 +477,153 @@ class Queue(ru.Process):
             nbulks = int(math.ceil(len(msgs) / float(bulk)))
             bulks  = ru.partition(msgs, nbulks)
 
-        while bulks:
+        return self._send([msgpack.packb(b) for b in bulks])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _recv_raw(self):
+        '''
+        Wait for incoming messages, and return all messages which are available
+        (up to `_PASSTHROUGH_BATCH`) as list of raw zmq frames.  Return `None`
+        if the bridge got terminated while waiting.
+        '''
+
+        while not _uninterruptible(self._in.poll, flags=zmq.POLLIN,
+                                   timeout=1000):
+            if not self.is_alive(strict=False):
+                self._log.warn('not alive anymore?')
+                return None
+
+        frames = list()
+        while len(frames) < _PASSTHROUGH_BATCH:
+            try:
+                frame = _uninterruptible(self._in.recv, flags=zmq.NOBLOCK,
+                                         copy=False)
+            except zmq.Again:
+                break
+            if frame is None:
+                break
+
+            # nothing is stalled, so there is nothing to flush
+            if len(frame) == len(_FLUSH_DATA) and frame.bytes == _FLUSH_DATA:
+                continue
+
+            frames.append(frame)
+
+        return frames
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _send(self, frames):
+        '''
+        Send the given encoded bulks (strings or zmq frames) to the output ends,
+        in order, either on request or according to their credits.
+        '''
+
+        if self._credits:
+            return self._send_credited(frames)
+
+        nframes = len(frames)
+        while frames:
             # timeout in ms
             events = dict(_uninterruptible(self._poll.poll, 1000))
 
             if self._out in events:
 
-                req  = _uninterruptible(self._out.recv)
-                data = msgpack.packb(bulks.pop(0)) 
-                _uninterruptible(self._out.send, data)
+                req = _uninterruptible(self._out.recv)
+                _uninterruptible(self._out.send, frames.pop(0), copy=False)
 
                 # go to next message/bulk (break while loop)
-                self._log.debug('sent  %s [hwm: %s]', (nbulks-len(bulks)), hwm)
+                self._log.debug('sent  %s/%s', nframes - len(frames), nframes)
+
+            elif not self.is_alive(strict=False):
+                self._log.warn('not alive anymore?')
+                return False
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _send_credited(self, frames):
+        '''
+        Send the given encoded bulks to the output ends which have credits
+        left, in round-robin order.  Credit announcements are collected before
+        each send, and we only wait for them if no output end has credits left.
+        Bulks which can't be routed to an output end (because it disconnected)
+        are sent to the next one.  Bulks already prefetched by an output end
+        are lost when it exits.
+        '''
+
+        while frames:
+
+            timeout = 0 if self._ready else 1000
+            while _uninterruptible(self._out.poll, flags=zmq.POLLIN,
+                                   timeout=timeout):
+
+                msg = _uninterruptible(self._out.recv_multipart)
+                if not msg:
+                    return False
+
+                # requests from output ends which don't use credits
+                if len(msg) != 2:
+                    self._log.error('invalid credit message: %s', msg)
+                    continue
+
+                ident, data = msg
+                if not self._granted.get(ident):
+                    self._ready.append(ident)
+                self._granted[ident] = self._granted.get(ident, 0) \
+                                     + msgpack.unpackb(data)
+                timeout = 0
+
+            if not self._ready:
+                if not self.is_alive(strict=False):
+                    self._log.warn('not alive anymore?')
+                    return False
+                continue
+
+            ident = self._ready.popleft()
+            try:
+                _uninterruptible(self._out.send_multipart, [ident, frames[0]],
+                                 copy=False)
+            except zmq.ZMQError as e:
+                if e.errno != errno.EHOSTUNREACH:
+                    raise
+                # the output end went away: forget its credits, and send the
+                # bulk to some other output end
+                self._log.warn('output end %s is gone', repr(ident))
+                self._granted.pop(ident, None)
+                continue
+
+            frames.pop(0)
+            self._granted[ident] -= 1
+            if self._granted[ident]:
+                self._ready.append(ident)
 
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _credit(self):
+        '''
+        On the output end, return a credit for a received bulk to the bridge -
+        or announce the initial credits if we did not do so, yet.  This must be
+        called with `self._lock` held.
+        '''
+
+        if self._announced:
+            n = 1
+        else:
+            n = self._credits
+            self._announced = True
+
+        _uninterruptible(self._q.send, msgpack.packb(n))
+
+
     # --------------------------------------------------------------------------
     #
     def put(self, msg):
@@ -389,9 +634,31 @@ class Queue(ru.Process):
       # if self._debug:
       #     self._log.debug("-> %s", pprint.pformat(msg))
         data = msgpack.packb(msg) 
+
+        if self._channel:
+            self._channel.put(data)
+            return
+
         _uninterruptible(self._q.send, data)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def flush(self):
+        '''
+        Ask the bridge to release all stalled messages right away.
+        '''
+
+        if not self._role == QUEUE_INPUT:
+            raise RuntimeError("queue %s (%s) can't flush()" % (self._qname, self._role))
+
+        # inproc channels don't stall
+        if self._channel:
+            return
+
+        _uninterruptible(self._q.send, _FLUSH_DATA)
+
+
     # --------------------------------------------------------------------------
     #
     def get(self):
@@ -399,6 +666,17 @@ class Queue(ru.Process):
         if not self._role == QUEUE_OUTPUT:
             raise RuntimeError("queue %s (%s) can't get()" % (self._qname, self._role))
 
+        if self._channel:
+            return msgpack.unpackb(self._channel.get())
+
+        if self._credits:
+            with self._lock:
+                if not self._announced:
+                    self._credit()
+                data = _uninterruptible(self._q.recv)
+                self._credit()
+            return msgpack.unpackb(data)
+
         _uninterruptible(self._q.send, 'request')
 
         data = _uninterruptible(self._q.recv)
@@ -408,6 +686,37 @@ class Queue(ru.Process):
         return msg
 
 
+    # --------------------------------------------------------------------------
+    #
+    def poll_socket(self):
+        '''
+        Return the zmq socket on which this output end receives messages, so
+        that callers can poll several queues at once, and then call
+        `get_nowait(0)` on the ready ones.  This makes sure that a request (or
+        the initial credits) is sent to the bridge, and thus must be called
+        before each poll.  Returns `None` for inproc channels, which can't be
+        polled.
+        '''
+
+        if not self._role == QUEUE_OUTPUT:
+            raise RuntimeError("queue %s (%s) can't poll" % (self._qname, self._role))
+
+        if self._channel:
+            return None
+
+        with self._lock:
+
+            if self._credits:
+                if not self._announced:
+                    self._credit()
+
+            elif not self._requested:
+                _uninterruptible(self._q.send, 'request')
+                self._requested = True
+
+        return self._q
+
+
     # --------------------------------------------------------------------------
     #
     def get_nowait(self, timeout=None): # timeout in ms
@@ -415,8 +724,24 @@ class Queue(ru.Process):
         if not self._role == QUEUE_OUTPUT:
             raise RuntimeError("queue %s (%s) can't get_nowait()" % (self._qname, self._role))
 
+        if self._channel:
+            data = self._channel.get(timeout)
+            if data is None:
+                return None
+            return msgpack.unpackb(data)
+
         with self._lock: # need to protect self._requested
 
+            if self._credits:
+                if not self._announced:
+                    self._credit()
+                if _uninterruptible(self._q.poll, flags=zmq.POLLIN,
+                                    timeout=timeout):
+                    data = _uninterruptible(self._q.recv)
+                    self._credit()
+                    return msgpack.unpackb(data)
+                return None
+
             if not self._requested:
                 # we can only send the request once per recieval
                 _uninterruptible(self._q.send, 'request')
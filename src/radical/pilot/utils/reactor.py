@@ -0,0 +1,355 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import zmq
+import time
+import heapq
+import errno
+import fcntl
+import itertools
+
+import threading     as mt
+import radical.utils as ru
+
+
+_REACTOR_TIMEOUT = 1000  # ms to wait if nothing is due
+_INPROC_TIMEOUT  =   10  # ms to wait if inproc subscribers need to be checked
+_SUB_BUDGET      =  100  # max number of messages to handle per subscriber
+
+
+# ==============================================================================
+#
+class Reactor(ru.Thread):
+    '''
+    A component's event loop for its timed callbacks and pubsub subscribers
+    (see `Component.register_timed_cb()` and `Component.register_subscriber()`).
+    A single thread waits on one poller over all subscriber sockets, with
+    a timeout set by the earliest timer deadline (kept in a heap), and then
+    invokes the callbacks which are due.  Callbacks are invoked under the
+    component's callback lock.
+
+    Subscribers are served before timers, and each subscriber with pending
+    messages gets up to `_SUB_BUDGET` messages per loop iteration.  Timers thus
+    fire late when subscribers are busy: a slow subscriber callback (or a flood
+    of messages) delays *all* timers of the component, not only its own work.
+    Callbacks should therefore be short, and hand off expensive work.
+
+    As with the separate threads used before, the reactor terminates when any
+    callback returns `False` (or raises).  Timers with an interval of `0` are
+    called on every loop iteration.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name, log, cb_lock):
+
+        self._name    = name
+        self._log     = log
+        self._cb_lock = cb_lock
+        self._lock    = mt.RLock()        # protects the registries
+        self._pid     = os.getpid()
+
+        self._timers  = dict()            # name: timer entry
+        self._heap    = list()            # [deadline, seq, entry]
+        self._seq     = itertools.count() # tie breaker for the heap
+        self._subs    = dict()            # name: subscriber entry
+        self._dropped = list()            # unregistered subscribers to stop
+        self._poller  = None              # rebuilt on subscriber changes
+        self._socks   = dict()            # socket: subscriber entry
+        self._inproc  = list()            # subscribers we can't poll
+
+        # registrations from other threads interrupt the poll via this pipe
+        self._wake_r, self._wake_w = os.pipe()
+        for fd in [self._wake_r, self._wake_w]:
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        super(Reactor, self).__init__(name=self._name, log=self._log)
+
+        # immediately start the thread upon construction
+        self.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def pid(self):
+        return self._pid
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _wake(self):
+
+        if self._wake_w is None:
+            return
+
+        try:
+            os.write(self._wake_w, 'x')
+        except OSError as e:
+            # pipe is full, which is as good as a wake up
+            if e.errno not in [errno.EAGAIN, errno.EBADF]:
+                raise
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add_timer(self, name, cb, cb_data, timer):
+
+        with self._lock:
+
+            if name in self._timers:
+                raise ValueError('cb %s already registered' % name)
+
+            entry = {'name'   : name,
+                     'cb'     : cb,
+                     'cb_data': cb_data,
+                     'timer'  : timer}
+            self._timers[name] = entry
+
+            # the first invocation is due right away
+            heapq.heappush(self._heap, [time.time(), next(self._seq), entry])
+
+        self._wake()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def remove_timer(self, name):
+        '''
+        Returns `False` if no such timer is registered.  Stale heap entries are
+        skipped when they come up.
+        '''
+
+        with self._lock:
+            return bool(self._timers.pop(name, None))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add_subscriber(self, name, q, cb, cb_data):
+
+        with self._lock:
+
+            if name in self._subs:
+                raise ValueError('subscriber %s already registered' % name)
+
+            self._subs[name] = {'name'   : name,
+                                'q'      : q,
+                                'cb'     : cb,
+                                'cb_data': cb_data}
+            self._poller = None
+
+        self._wake()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def remove_subscriber(self, name):
+        '''
+        Returns `False` if no such subscriber is registered.  The subscriber's
+        pubsub endpoint is stopped by the reactor thread, which owns it.
+        '''
+
+        with self._lock:
+            entry = self._subs.pop(name, None)
+            if entry:
+                self._dropped.append(entry)
+                self._poller = None
+
+        if entry:
+            self._wake()
+
+        return bool(entry)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self, timeout=None):
+
+        # interrupt the poll, so that termination does not wait for the poll
+        # timeout
+        self._ru_term.set()
+        self._wake()
+
+        super(Reactor, self).stop(timeout)
+
+        if not mt.Thread.is_alive(self) and self._wake_w is not None:
+            wake_r, wake_w = self._wake_r, self._wake_w
+            self._wake_w = None
+            os.close(wake_r)
+            os.close(wake_w)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def ru_finalize_child(self):
+
+        with self._lock:
+            entries = self._subs.values() + self._dropped
+            self._subs    = dict()
+            self._dropped = list()
+
+        for entry in entries:
+            entry['q'].stop()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _rebuild(self):
+        '''
+        Create a poller over the wakeup pipe and all subscriber sockets, and
+        stop unregistered subscribers.  Must be called with `self._lock` held.
+        '''
+
+        for entry in self._dropped:
+            entry['q'].stop()
+        self._dropped = list()
+
+        self._poller = zmq.Poller()
+        self._poller.register(self._wake_r, zmq.POLLIN)
+        self._socks  = dict()
+        self._inproc = list()
+
+        for entry in self._subs.values():
+            sock = entry['q'].poll_socket()
+            if sock is None:
+                self._inproc.append(entry)
+            else:
+                self._poller.register(sock, zmq.POLLIN)
+                self._socks[sock] = entry
+
+
+    # --------------------------------------------------------------------------
+    #
+    def work_cb(self):
+
+        with self._lock:
+
+            if not self._poller:
+                self._rebuild()
+
+            poller = self._poller
+            inproc = list(self._inproc)
+
+            timeout = _REACTOR_TIMEOUT
+            if inproc:
+                timeout = _INPROC_TIMEOUT
+
+            if self._heap:
+                due     = (self._heap[0][0] - time.time()) * 1000
+                timeout = max(0, min(timeout, int(due)))
+
+        try:
+            events = dict(poller.poll(timeout))
+        except zmq.ZMQError as e:
+            if e.errno == errno.EINTR:
+                return True
+            raise
+
+        if self._ru_term.is_set():
+            return True
+
+        if self._wake_r in events:
+            try:
+                while os.read(self._wake_r, 1024):
+                    pass
+            except OSError:
+                pass
+
+        # subscribers first, then timers, so that timers see the latest
+        # notifications
+        with self._lock:
+            ready = [self._socks[s] for s in events if s in self._socks]
+
+        for entry in ready + inproc:
+            if not self._notify(entry):
+                return False
+
+        return self._fire()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _notify(self, entry):
+        '''
+        Pass all messages available on the subscriber (up to `_SUB_BUDGET`) to
+        its callback.
+        '''
+
+        for _ in range(_SUB_BUDGET):
+
+            # the subscriber may have been unregistered by a callback
+            if self._subs.get(entry['name']) is not entry:
+                return True
+
+            try:
+                topic, msg = entry['q'].get_nowait(0)
+            except Exception as e:
+                if self._ru_term.is_set():
+                    return True
+                self._log.exception('subscriber %s failed', entry['name'])
+                return False
+
+            if not topic:
+                return True
+
+            if not isinstance(msg, list):
+                msg = [msg]
+
+            for m in msg:
+                with self._cb_lock:
+                    if entry['cb_data'] != None:
+                        ret = entry['cb'](topic=topic, msg=m,
+                                          cb_data=entry['cb_data'])
+                    else:
+                        ret = entry['cb'](topic=topic, msg=m)
+
+                # we abort whenever a callback indicates thus
+                if not ret:
+                    return False
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _fire(self):
+        '''
+        Invoke all timed callbacks which are due, and schedule their next
+        invocation `timer` seconds after they returned.
+        '''
+
+        now = time.time()
+
+        while True:
+
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    return True
+                _, _, entry = heapq.heappop(self._heap)
+
+                # skip entries which got unregistered
+                if self._timers.get(entry['name']) is not entry:
+                    continue
+
+            with self._cb_lock:
+                if entry['cb_data'] != None:
+                    ret = entry['cb'](cb_data=entry['cb_data'])
+                else:
+                    ret = entry['cb']()
+
+            if not ret:
+                return False
+
+            with self._lock:
+                if self._timers.get(entry['name']) is entry:
+                    heapq.heappush(self._heap, [time.time() + entry['timer'],
+                                                next(self._seq), entry])
+
+
+# ------------------------------------------------------------------------------
+
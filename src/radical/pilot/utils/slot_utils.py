@@ -88,5 +88,229 @@ def _slots2offset(task_slots, nodes):
     return min(global_offsets)
 
 
+
+# ------------------------------------------------------------------------------
+#
+# Compact slot encoding
+#
+# The slots created by the agent schedulers (see top of
+# `agent/scheduler/base.py`) repeat the per-node resource sizes and the complete
+# `lm_info` dict for every unit, and list every single core id.  Slots travel
+# with the unit through all agent queues and pubsubs, and are serialized on
+# every hop - so the schedulers pass them on in a compact encoding:
+#
+#     'slots' :
+#     {
+#       'compact' : 1,             # encoding version
+#       'lm_info' : 'lrms',        # id of the lm_info dict
+#                   # [node idx, tpp, [core ranges], [gpu ranges], lfs size]
+#       'nodes'   : [[0,         2,   [[0, 8, 2]],   [[0, 1, 1]],  0       ],
+#                    [1,         2,   [[1, 9, 2]],   [[0, 1, 1]],  0       ]]
+#     }
+#
+# Nodes are given by their index in the LRMS node list.  Core and gpu ids are
+# given as ranges `[start, stop, step]` (as for `range()`), in the order of the
+# original core and gpu maps, which are restored from those ids and the number
+# of threads per process (`tpp`, GPU processes are single-threaded).  Locality
+# information (see `agent/scheduler/topology.py`) is appended to the node entry
+# if present.  The `lm_info` dict and the per-node sizes (`cores_per_node`,
+# `gpus_per_node`, `lfs_per_node`) are constant for a pilot and are restored
+# from the LRMS information in the agent config - unless a scheduler uses other
+# per-node sizes, which are then kept.  All other slot fields are kept as-is.
+#
+# Slots which don't follow the default structure are not encoded.  The launch
+# methods decode the slots before constructing a unit's command (see
+# `LaunchMethod.decode_slots()`).
+#
+SLOTS_COMPACT = 1
+LM_INFO_LRMS  = 'lrms'
+
+_SIZE_KEYS = ['cores_per_node', 'gpus_per_node', 'lfs_per_node']
+_NODE_KEYS = set(['name', 'uid', 'core_map', 'gpu_map', 'lfs'])
+
+
+# ------------------------------------------------------------------------------
+#
+def is_compact(slots):
+    '''
+    Check if the given slots are in compact encoding.
+    '''
+
+    return isinstance(slots, dict) and 'compact' in slots
+
+
+# ------------------------------------------------------------------------------
+#
+def _encode_ids(ids):
+    '''
+    Encode a list of ids as list of `[start, stop, step]` ranges, such that
+    `ids == [i for r in ranges for i in range(*r)]`.
+    '''
+
+    ranges = list()
+    i      = 0
+    while i < len(ids):
+
+        start = ids[i]
+        step  = 1
+        if i + 1 < len(ids) and ids[i + 1] > start:
+            step = ids[i + 1] - start
+
+        n = 1
+        while i + n < len(ids) and ids[i + n] == start + n * step:
+            n += 1
+
+        ranges.append([start, start + n * step, step])
+        i += n
+
+    return ranges
+
+
+# ------------------------------------------------------------------------------
+#
+def _decode_ids(ranges):
+
+    return [i for r in ranges for i in range(*r)]
+
+
+# ==============================================================================
+#
+class SlotCodec(object):
+    '''
+    Encode and decode slots in the compact encoding described above, for the
+    given LRMS information (`cfg['lrms_info']`).
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, lrms_info):
+
+        self._lm_info = {LM_INFO_LRMS: lrms_info.get('lm_info')}
+        self._sizes   = dict([(key, lrms_info.get(key)) for key in _SIZE_KEYS])
+        self._nodes   = list()  # [name, uid] per node in the LRMS node list
+        self._index   = dict()  # node uid -> index into the LRMS node list
+
+        for idx, (name, uid) in enumerate(lrms_info.get('node_list') or []):
+            self._nodes.append([name, uid])
+            self._index[uid] = idx
+
+
+    # --------------------------------------------------------------------------
+    #
+    def encode(self, slots):
+        '''
+        Return the compact encoding of the given slots, or the slots themselves
+        if they are already encoded or don't follow the default structure.
+        '''
+
+        if not isinstance(slots, dict) or is_compact(slots):
+            return slots
+
+        if not isinstance(slots.get('nodes'), list):
+            return slots
+
+        for key in _SIZE_KEYS + ['lm_info']:
+            if key not in slots:
+                return slots
+
+        if slots['lm_info'] != self._lm_info[LM_INFO_LRMS]:
+            return slots
+
+        ret = {'compact': SLOTS_COMPACT,
+               'lm_info': LM_INFO_LRMS}
+
+        for key, val in slots.iteritems():
+            if key in ['nodes', 'lm_info']:
+                continue
+            if key in _SIZE_KEYS and val == self._sizes[key]:
+                continue
+            ret[key] = val
+
+        lfs_path = (slots['lfs_per_node'] or dict()).get('path')
+
+        ret['nodes'] = list()
+        for node in slots['nodes']:
+
+            if not isinstance(node, dict):
+                return slots
+
+            keys = set(node.keys())
+            if not _NODE_KEYS <= keys <= _NODE_KEYS | set(['locality']):
+                return slots
+
+            idx = self._index.get(node['uid'])
+            if idx is None or self._nodes[idx][0] != node['name']:
+                return slots
+
+            core_map = node['core_map']
+            gpu_map  = node['gpu_map']
+            lfs      = node['lfs']
+            tpp      = len(core_map[0]) if core_map else 1
+
+            if [len(cslot) for cslot in core_map] != [tpp] * len(core_map) or \
+               [len(gslot) for gslot in gpu_map ] != [1]   * len(gpu_map)  or \
+               sorted(lfs.keys()) != ['path', 'size'] or lfs['path'] != lfs_path:
+                return slots
+
+            entry = [idx, tpp,
+                     _encode_ids([core for cslot in core_map for core in cslot]),
+                     _encode_ids([gslot[0] for gslot in gpu_map]),
+                     lfs['size']]
+
+            if 'locality' in node:
+                entry.append(node['locality'])
+
+            ret['nodes'].append(entry)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def decode(self, slots):
+        '''
+        Return the full slot structure for the given slots, which are returned
+        as-is if they are not in compact encoding.
+        '''
+
+        if not is_compact(slots):
+            return slots
+
+        if slots['compact'] != SLOTS_COMPACT:
+            raise ValueError('unknown slot encoding %s' % slots['compact'])
+
+        if slots['lm_info'] not in self._lm_info:
+            raise ValueError('unknown lm_info id %s' % slots['lm_info'])
+
+        ret = dict(self._sizes)
+        for key, val in slots.iteritems():
+            if key not in ['compact', 'nodes']:
+                ret[key] = val
+
+        ret['lm_info'] = self._lm_info[slots['lm_info']]
+
+        lfs_path = (ret['lfs_per_node'] or dict()).get('path')
+
+        ret['nodes'] = list()
+        for entry in slots['nodes']:
+
+            idx, tpp, cores, gpus, lfs = entry[:5]
+
+            cores = _decode_ids(cores)
+            node  = {'name'    : self._nodes[idx][0],
+                     'uid'     : self._nodes[idx][1],
+                     'core_map': [cores[i:i + tpp]
+                                  for i in range(0, len(cores), tpp)],
+                     'gpu_map' : [[gpu] for gpu in _decode_ids(gpus)],
+                     'lfs'     : {'size': lfs, 'path': lfs_path}}
+
+            if len(entry) > 5:
+                node['locality'] = entry[5]
+
+            ret['nodes'].append(node)
+
+        return ret
+
+
 # ------------------------------------------------------------------------------
 
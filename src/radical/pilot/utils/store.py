@@ -0,0 +1,404 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import copy
+import errno
+import msgpack
+
+import zmq
+import Queue           as pyq
+import setproctitle    as spt
+import threading       as mt
+import multiprocessing as mp
+
+import radical.utils   as ru
+
+from .misc    import hostip as rpu_hostip
+from .        import channel as rpu_channel
+
+
+# --------------------------------------------------------------------------
+# defines for store roles
+#
+STORE_BRIDGE = 'bridge'
+STORE_CLIENT = 'client'
+STORE_ROLES  = [STORE_BRIDGE, STORE_CLIENT]
+
+_BRIDGE_TIMEOUT  =     5  # how long to wait for bridge startup
+_LINGER_TIMEOUT  =   250  # ms to linger after close
+_BRIDGE_POLL     =  1000  # ms to wait for requests in the bridge
+_REQUEST_TIMEOUT =    60  # s to wait for a reply from the bridge
+
+
+# --------------------------------------------------------------------------
+#
+# zmq will (rightly) barf at interrupted system calls.  We are able to rerun
+# those calls.
+#
+# kudos: https://gist.github.com/minrk/5258909
+#
+def _uninterruptible(f, *args, **kwargs):
+    cnt = 0
+    while True:
+        cnt += 1
+        try:
+            return f(*args, **kwargs)
+        except zmq.ContextTerminated as e:
+            return None
+        except zmq.ZMQError as e:
+            if e.errno == errno.EINTR:
+                if cnt > 10:
+                    raise
+                # interrupted, try again
+                continue
+            else:
+                # real error, raise it
+                raise
+
+
+# ------------------------------------------------------------------------------
+#
+def _handle(records, cmd, arg):
+    '''
+    Execute a store request on the given records, which map uids to packed
+    things.
+    '''
+
+    if cmd == 'put':
+        for uid, data in arg:
+            records[uid] = data
+
+    elif cmd == 'get':
+        return [records.get(uid) for uid in arg]
+
+    elif cmd == 'delete':
+        for uid in arg:
+            records.pop(uid, None)
+
+    else:
+        raise ValueError('invalid store command %s' % cmd)
+
+
+# ==============================================================================
+#
+class _InprocStore(rpu_channel.InprocChannel):
+    '''
+    In-process counterpart of a store bridge.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name):
+
+        rpu_channel.InprocChannel.__init__(self, name)
+
+        self._records = dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def request(self, cmd, arg):
+
+        with self._lock:
+            return _handle(self._records, cmd, arg)
+
+
+# ==============================================================================
+#
+# Components on the same agent (or client) can exchange units in *delta mode*:
+# the full unit is put once into a store, and only the uid, state and the fields
+# which differ from the stored unit are passed through the queues (see
+# `Component.advance()`).  Receiving components fetch the stored units for
+# a received bulk with a single request.
+#
+# The store bridge holds the units as packed by the clients, and never decodes
+# them.  Stores are started by `Component.start_bridges()` for bridge names
+# ending in 'store', and use the same transports as the other bridges (see
+# `channel.py`).
+#
+class Store(ru.Process):
+
+    def __init__(self, session, channel, role, cfg, addr=None):
+        """
+        Addresses are of the form 'tcp://host:port'.  The bridge binds to
+        a wildcard port, and reports its address as `obj.addr_in` (and
+        `obj.addr_out`, which is the same).  Clients connect to that address.
+        """
+
+        self._session = session
+        self._channel = channel
+        self._role    = role
+        self._cfg     = copy.deepcopy(cfg)
+        self._addr    = addr
+
+        assert(self._role in STORE_ROLES), 'invalid role %s' % self._role
+
+        self._uid = "%s.%s" % (self._channel.replace('_', '.'), self._role)
+        self._uid = ru.generate_id(self._uid)
+        self._log = self._session._get_logger(name=self._uid,
+                         level=self._cfg.get('log_level'))
+
+        self._addr_in  = None   # bridge addr
+        self._addr_out = None   # same as addr_in
+
+        self._q       = None
+        self._ctx     = None
+        self._lock    = mt.Lock()  # one request at a time
+        self._inproc  = None       # inproc store, instead of zmq sockets
+        self._bound   = list()     # addresses bound by the bridge
+        self._records = dict()     # uid: packed thing (bridge only)
+
+        self._transport = self._cfg.get('transport', rpu_channel.TRANSPORT_TCP)
+
+        if not self._addr:
+            self._addr = rpu_channel.get_bridge_addr(self._transport)
+
+        self._log.info("create %s - %s - %s", self._channel, self._role, self._addr)
+
+        super(Store, self).__init__(name=self._uid, log=self._log)
+
+
+        # ----------------------------------------------------------------------
+        # inproc stores replace the bridge and the zmq sockets
+        if self._role == STORE_BRIDGE and \
+           self._transport == rpu_channel.TRANSPORT_INPROC:
+
+            self._inproc   = _InprocStore(self._uid)
+            self._addr_in  = ru.Url(self._inproc.addr)
+            self._addr_out = ru.Url(self._inproc.addr)
+            self.start(spawn=False)
+            return
+
+        if self._role == STORE_CLIENT and rpu_channel.is_inproc(self._addr):
+
+            self._inproc = _InprocStore.lookup(self._addr)
+            self.start(spawn=False)
+            return
+
+
+        # ----------------------------------------------------------------------
+        # behavior depends on the role...
+        if self._role == STORE_CLIENT:
+
+            self._ctx = zmq.Context()
+            self._session._to_destroy.append(self._ctx)
+
+            self._connect()
+            self.start(spawn=False)
+
+
+        # ----------------------------------------------------------------------
+        elif self._role == STORE_BRIDGE:
+
+            # we expect bridges to always use a port wildcard. Make sure
+            # that's the case
+            elems = self._addr.split(':')
+            if len(elems) > 2 and elems[2] and elems[2] != '*':
+                raise RuntimeError('wildcard port (*) required for bridge addresses (%s)' \
+                                % self._addr)
+
+            self._pqueue = mp.Queue()
+            self.start()
+
+            try:
+                addr = self._pqueue.get(True, _BRIDGE_TIMEOUT)
+
+                # store addresses
+                self._addr_in  = ru.Url(addr)
+                self._addr_out = ru.Url(addr)
+
+                # use the local hostip for bridge addresses
+                if self._addr_in.schema == rpu_channel.TRANSPORT_TCP:
+                    self._addr_in.host  = rpu_hostip()
+                    self._addr_out.host = rpu_hostip()
+
+            except pyq.Empty as e:
+                raise RuntimeError ("bridge did not come up! (%s)" % e)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def name(self):
+        return self._uid
+
+    @property
+    def uid(self):
+        return self._uid
+
+    @property
+    def channel(self):
+        return self._channel
+
+    @property
+    def role(self):
+        return self._role
+
+    @property
+    def addr(self):
+        return self._addr
+
+    @property
+    def addr_in(self):
+        assert(self._role == STORE_BRIDGE), 'addr_in only set on bridges'
+        return self._addr_in
+
+    @property
+    def addr_out(self):
+        assert(self._role == STORE_BRIDGE), 'addr_out only set on bridges'
+        return self._addr_out
+
+
+    # --------------------------------------------------------------------------
+    #
+    def ru_initialize_child(self):
+
+        assert(self._role == STORE_BRIDGE), 'only bridges can be started'
+
+        self._uid = self._uid + '.child'
+        self._log = self._session._get_logger(name=self._uid,
+                         level=self._cfg.get('log_level'))
+
+        spt.setproctitle('rp.%s' % self._uid)
+        self._log.info('start bridge %s on %s', self._uid, self._addr)
+
+        self._ctx = zmq.Context()
+        self._session._to_destroy.append(self._ctx)
+
+        self._q = self._ctx.socket(zmq.ROUTER)
+        self._q.linger = _LINGER_TIMEOUT
+        self._q.bind(rpu_channel.get_bind_addr(self._addr, self._channel, 'in'))
+
+        # communicate the bridge port to the parent process
+        addr = self._q.getsockopt(zmq.LAST_ENDPOINT)
+
+        self._pqueue.put(addr)
+        self._bound = [addr]
+
+        self._log.info('bound bridge %s to %s', self._uid, addr)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def ru_finalize_common(self):
+
+        if self._q  : self._q  .close()
+        if self._inproc and self._role == STORE_BRIDGE:
+            self._inproc.close()
+        if self._ctx: self._ctx.destroy()
+
+        for addr in self._bound:
+            rpu_channel.unlink_ipc(addr)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def work_cb(self):
+
+        if not _uninterruptible(self._q.poll, flags=zmq.POLLIN,
+                                timeout=_BRIDGE_POLL):
+            return True
+
+        ident, empty, data = _uninterruptible(self._q.recv_multipart)
+        req = msgpack.unpackb(data)
+
+        try:
+            rep = {'res': _handle(self._records, req['cmd'], req['arg'])}
+        except Exception as e:
+            self._log.exception('store request failed')
+            rep = {'err': repr(e)}
+
+        _uninterruptible(self._q.send_multipart, [ident, empty,
+                                                  msgpack.packb(rep)])
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _connect(self):
+        '''
+        (Re)create the client socket.  A REQ socket which did not receive the
+        reply to its last request can't send another one, so we replace it
+        when a request times out.  A late reply is then dropped with the old
+        socket.
+        '''
+
+        if self._q:
+            self._q.close()
+
+        self._q = self._ctx.socket(zmq.REQ)
+        self._q.linger = _LINGER_TIMEOUT
+        self._q.connect(self._addr)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _request(self, cmd, arg):
+
+        assert(self._role == STORE_CLIENT), 'incorrect role on %s' % cmd
+
+        if self._inproc:
+            return self._inproc.request(cmd, arg)
+
+        with self._lock:
+
+            _uninterruptible(self._q.send, msgpack.packb({'cmd': cmd,
+                                                          'arg': arg}))
+
+            if not _uninterruptible(self._q.poll, flags=zmq.POLLIN,
+                                    timeout=_REQUEST_TIMEOUT * 1000):
+                self._connect()
+                raise RuntimeError('no reply from store %s' % self._addr)
+
+            rep = msgpack.unpackb(_uninterruptible(self._q.recv))
+
+        if 'err' in rep:
+            raise RuntimeError('store request failed: %s' % rep['err'])
+
+        return rep['res']
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, things):
+        '''
+        Store the given things (dicts with a 'uid'), replacing any things which
+        are stored with the same uids.
+        '''
+
+        self._request('put', [[t['uid'], msgpack.packb(t)] for t in things])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_raw(self, uids):
+        '''
+        Return the packed things for the given uids (`None` for unknown uids),
+        so that the caller can unpack them as needed.
+        '''
+
+        return self._request('get', uids)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, uids):
+        '''
+        Return the things for the given uids (`None` for unknown uids).
+        '''
+
+        return [msgpack.unpackb(data) if data else None
+                for data in self.get_raw(uids)]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def delete(self, uids):
+
+        self._request('delete', uids)
+
+
+# ------------------------------------------------------------------------------
+
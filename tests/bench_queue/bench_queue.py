@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+'''
+Throughput benchmarks for the component queues (`radical.pilot.utils.Queue`).
+
+A queue bridge is started with the given settings, one producer process pushes
+messages (bulks of unit-like dicts) into it, and a number of consumer processes
+pull them out again, as the components do (`get_nowait()`).  Consumers can
+simulate work on each bulk they receive.  With `--prefill`, the consumers only
+start once all messages have been pushed, so that the rate reflects the
+consumer side only.  For each combination of settings we
+report the message rate (from the first put to the last get), and the number of
+messages each consumer got (which shows how fair the distribution is).  Results
+are written as JSON, for example:
+
+    ./bench_queue.py -k 0,1,4,16 -c 1,4 -o bench.json
+
+Credits `0` denote the default request/reply mode (see `utils/queue.py`).  The
+bridge forwards the messages as raw frames, unless `--bulk-size` is set, which
+makes the bridge decode and re-bulk them.  With `--hwm`, the bridge stalls
+messages (see `--stall-timeout`); the producer flushes the bridge at the end.
+The bridge transport can be `tcp` or `ipc` (`inproc` channels can't be used by
+the producer and consumer processes, see `utils/channel.py`).
+'''
+
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import subprocess
+import multiprocessing as mp
+
+from timeit import default_timer as timer
+
+import radical.pilot.utils as rpu
+
+
+CREDITS   = [0, 1, 4, 16]
+CONSUMERS = [1, 4]
+
+
+# ------------------------------------------------------------------------------
+#
+class _Session(object):
+    '''
+    The queues only need a logger and a list of zmq contexts from the session.
+    '''
+
+    def __init__(self):
+
+        self._to_destroy = list()
+
+    def _get_logger(self, name, level=None):
+
+        log = logging.getLogger(name)
+        log.setLevel((level or 'error').upper())
+        return log
+
+
+# ------------------------------------------------------------------------------
+#
+def make_bulk(n, size, offset):
+
+    return [{'uid'  : 'unit.%06d' % (offset + i),
+             'state': 'AGENT_EXECUTING_PENDING',
+             'data' : 'x' * size} for i in range(n)]
+
+
+# ------------------------------------------------------------------------------
+#
+def _produce(addr, cfg, args):
+
+    queue = rpu.Queue(_Session(), 'bench_queue', rpu.QUEUE_INPUT, cfg,
+                      addr=addr)
+
+    for i in range(args.messages):
+        queue.put(make_bulk(args.bulk, args.size, i * args.bulk))
+
+    queue.flush()
+
+
+# ------------------------------------------------------------------------------
+#
+def _consume(addr, cfg, args, total, go, results):
+
+    queue = rpu.Queue(_Session(), 'bench_queue', rpu.QUEUE_OUTPUT, cfg,
+                      addr=addr)
+    n_all = args.messages * args.bulk
+    got   = 0
+    last  = None
+
+    go.wait()
+
+    while total.value < n_all:
+
+        bulk = queue.get_nowait(100)
+        if not bulk:
+            continue
+
+        last = time.time()
+        got += len(bulk)
+        with total.get_lock():
+            total.value += len(bulk)
+
+        # simulate the work of the component on the bulk
+        if args.work:
+            stop = timer() + args.work / 1e6
+            while timer() < stop:
+                pass
+
+    results.put([got, last])
+
+
+# ------------------------------------------------------------------------------
+#
+def run_one(credits, consumers, args):
+
+    bcfg = {'log_level'    : 'error',
+            'stall_hwm'    : args.hwm,
+            'stall_timeout': args.stall_timeout,
+            'bulk_size'    : args.bulk_size,
+            'credits'      : credits,
+            'transport'    : args.transport}
+    cfg  = {'bridges'  : {'bench_queue': bcfg}}
+
+    bridge  = rpu.Queue(_Session(), 'bench_queue', rpu.QUEUE_BRIDGE, bcfg)
+    total   = mp.Value('l', 0)
+    go      = mp.Event()
+    results = mp.Queue()
+
+    procs = [mp.Process(target=_consume,
+                        args=(str(bridge.addr_out), cfg, args, total, go,
+                              results))
+             for _ in range(consumers)]
+    for proc in procs:
+        proc.start()
+
+    # give the consumers time to connect
+    time.sleep(1)
+
+    producer = mp.Process(target=_produce,
+                          args=(str(bridge.addr_in), cfg, args))
+
+    if args.prefill:
+        producer.start()
+        producer.join()
+        start = time.time()
+        go.set()
+
+    else:
+        start = time.time()
+        go.set()
+        producer.start()
+        producer.join()
+
+    counts = list()
+    stop   = start
+    for _ in procs:
+        got, last = results.get()
+        counts.append(got)
+        if last:
+            stop = max(stop, last)
+
+    for proc in procs:
+        proc.join()
+
+    bridge.stop()
+
+    return {'credits'  : credits,
+            'consumers': consumers,
+            'messages' : args.messages,
+            'bulk'     : args.bulk,
+            'bulk_size': args.bulk_size,
+            'hwm'      : args.hwm,
+            'transport': args.transport,
+            'size'     : args.size,
+            'work'     : args.work,
+            'prefill'  : args.prefill,
+            'time'     : stop - start,
+            'rate'     : args.messages / (stop - start),
+            'counts'   : sorted(counts)}
+
+
+# ------------------------------------------------------------------------------
+#
+def _revision():
+
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=here).strip()
+    except Exception:
+        return None
+
+
+# ------------------------------------------------------------------------------
+#
+def main():
+
+    parser = argparse.ArgumentParser(description='component queue benchmarks')
+    parser.add_argument('-k', '--credits',   default=','.join(map(str, CREDITS)))
+    parser.add_argument('-c', '--consumers', default=','.join(map(str, CONSUMERS)))
+    parser.add_argument('-n', '--messages',  type=int, default=10000)
+    parser.add_argument('--bulk',            type=int, default=1,
+                        help='units per message')
+    parser.add_argument('--size',            type=int, default=256,
+                        help='payload bytes per unit')
+    parser.add_argument('--bulk-size',       type=int, default=0,
+                        help='bridge bulk size (0 for pass-through)')
+    parser.add_argument('--hwm',             type=int, default=1,
+                        help='bridge stall hwm')
+    parser.add_argument('--stall-timeout',   type=float, default=0,
+                        help='bridge stall timeout (s)')
+    parser.add_argument('-t', '--transport', default='tcp',
+                        help='bridge transport (tcp, ipc)')
+    parser.add_argument('--work',            type=int, default=0,
+                        help='consumer work per message (us)')
+    parser.add_argument('--prefill',         action='store_true',
+                        help='push all messages before consuming')
+    parser.add_argument('-o', '--output',    default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    results = list()
+    for credits in [int(k) for k in args.credits.split(',')]:
+        for consumers in [int(c) for c in args.consumers.split(',')]:
+
+            res = run_one(credits, consumers, args)
+            results.append(res)
+
+            sys.stderr.write('credits %3d  consumers %3d: %10.0f msg/s  %s\n'
+                             % (credits, consumers, res['rate'],
+                                res['counts']))
+
+    report = {'revision' : _revision(),
+              'timestamp': time.time(),
+              'host'     : socket.gethostname(),
+              'python'   : sys.version.split()[0],
+              'args'     : vars(args),
+              'results'  : results}
+
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(report, fout, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    main()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,157 @@
+
+__copyright__ = "Copyright 2018, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import logging
+
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.rm.loadleveler import LoadLeveler
+
+
+# ==============================================================================
+#
+class FakeLRMS(object):
+    '''
+    A stand-in for the agent's LRMS which describes a synthetic allocation of
+    `n_nodes` identical nodes, without any batch system being involved.  It
+    provides the same `lrms_info` dict as the real LRMS implementations, which
+    is all most agent schedulers need.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, n_nodes, cores_per_node, gpus_per_node=0, lfs_size=0,
+                 lfs_path='/tmp'):
+
+        self.name           = 'FAKE'
+        self.lm_info        = dict()
+        self.node_list      = [['node_%06d' % i, 'node_%06d' % i]
+                               for i in range(n_nodes)]
+        self.agent_nodes    = dict()
+        self.cores_per_node = cores_per_node
+        self.gpus_per_node  = gpus_per_node
+        self.lfs_per_node   = {'path': lfs_path,
+                               'size': lfs_size}
+
+        self.lrms_info = {'name'          : self.name,
+                          'lm_info'       : self.lm_info,
+                          'node_list'     : self.node_list,
+                          'cores_per_node': self.cores_per_node,
+                          'gpus_per_node' : self.gpus_per_node,
+                          'agent_nodes'   : self.agent_nodes,
+                          'lfs_per_node'  : self.lfs_per_node}
+
+
+# ==============================================================================
+#
+class FakeTorusLRMS(LoadLeveler):
+    '''
+    A stand-in for the LoadLeveler LRMS on a BG/Q, which describes a synthetic
+    torus block of `n_nodes` nodes (a power of two).  The block and sub-block
+    shape table are derived the same way LoadLeveler derives them from the
+    `LOADL_BG_*` environment, so the Torus scheduler can run on them.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, n_nodes):
+
+        # we don't call the LRMS constructor, which would inspect the
+        # environment for a real allocation
+        self._log = logging.getLogger('bench.lrms')
+
+        shape_str = torus_shape(n_nodes)
+
+        if len(shape_str.split('x')) == 5:
+            block_shape = self._bgq_str2shape(shape_str)
+        else:
+            block_shape = self._multiply_shapes(self.BGQ_MIDPLANE_SHAPE,
+                                                self._bgq_str2shape(shape_str))
+
+        self.name                   = 'FAKE_TORUS'
+        self.lm_info                = dict()
+        self.loadl_bg_block         = 'FAKE'
+        self.torus_block            = _torus_block(block_shape,
+                                                   self.BGQ_DIMENSION_LABELS)
+        self.shape_table            = \
+                self._bgq_create_sub_block_shape_table(shape_str)
+        self.torus_dimension_labels = self.BGQ_DIMENSION_LABELS
+        self.node_list              = [[e[2], e[2]] for e in self.torus_block]
+        self.agent_nodes            = dict()
+        self.cores_per_node         = self.BGQ_CORES_PER_NODE
+        self.gpus_per_node          = self.BGQ_GPUS_PER_NODE
+        self.lfs_per_node           = {'path': None, 'size': 0}
+
+        self.lrms_info = {'name'          : self.name,
+                          'lm_info'       : self.lm_info,
+                          'node_list'     : self.node_list,
+                          'cores_per_node': self.cores_per_node,
+                          'gpus_per_node' : self.gpus_per_node,
+                          'agent_nodes'   : self.agent_nodes,
+                          'lfs_per_node'  : self.lfs_per_node}
+
+
+# ------------------------------------------------------------------------------
+#
+def torus_shape(n_nodes):
+    '''
+    Return the LoadLeveler shape string for a BG/Q block of `n_nodes` nodes.
+    Blocks below a midplane (512 nodes) are given in nodes (`AxBxCxDxE`),
+    larger blocks in midplanes (`AxBxCxD`).  Within a midplane, dimensions are
+    grown in the same order as the sub-block shape table grows them (E first),
+    midplanes are added to the shortest dimension.
+    '''
+
+    if n_nodes < 1 or n_nodes & (n_nodes - 1):
+        raise ValueError('torus blocks need a power of two nodes: %s' % n_nodes)
+
+    if n_nodes < 512:
+        labels = ['A', 'B', 'C', 'D', 'E']
+        limits = {'A': 4, 'B': 4, 'C': 4, 'D': 4, 'E': 2}
+        shape  = dict([(l, 1) for l in labels])
+        left   = n_nodes
+
+    else:
+        labels = ['A', 'B', 'C', 'D']
+        limits = None
+        shape  = dict([(l, 1) for l in labels])
+        left   = n_nodes / 512
+
+    while left > 1:
+        if limits:
+            l = [l for l in reversed(labels) if shape[l] < limits[l]][0]
+        else:
+            l = min(reversed(labels), key=lambda l: shape[l])
+        shape[l] *= 2
+        left     /= 2
+
+    return 'x'.join([str(shape[l]) for l in labels])
+
+
+# ------------------------------------------------------------------------------
+#
+def _torus_block(shape, labels):
+
+    # same structure as `LoadLeveler._bgq_get_block()`, with synthetic names:
+    # [index, location, name, status]
+    block = [[0, dict(), None, rpc.FREE]]
+    for l in labels:
+        grown = list()
+        for entry in block:
+            for i in range(shape[l]):
+                loc    = dict(entry[1])
+                loc[l] = i
+                grown.append([0, loc, None, rpc.FREE])
+        block = grown
+
+    for index, entry in enumerate(block):
+        entry[0] = index
+        entry[2] = 'torus_%06d' % index
+
+    return block
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,104 @@
+
+'''
+Helpers shared by the agent scheduler tests: create scheduler instances without
+a session or any communication channels, and build units and unit descriptions
+of a given shape.
+'''
+
+import threading
+
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.scheduler.wait_pool import WaitPool
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+def make_scheduler(cls, cfg, **attrs):
+    '''
+    Create an instance of the scheduler class `cls` for the given config, and
+    initialize it the way `AgentSchedulingComponent.initialize_child()` does,
+    but without a session, and without registering any channels.  `attrs` are
+    set on the instance before it is configured.
+
+    The slot codec is not set up, so that the scheduler hands out full slots
+    (call `_init_codec()` to change that).  The stats are set up if the config
+    asks for them, which needs `register_timed_cb` to be mocked.
+    '''
+
+    with mock.patch.object(cls, '__init__', return_value=None):
+        component = cls(cfg=dict(), session=None)
+
+    lrms_info = cfg['lrms_info']
+
+    component._cfg                 = cfg
+    component._uid                 = 'agent.scheduling.%04d' \
+                                   % cfg.get('number', 0)
+    component._log                 = mock.Mock()
+    component._prof                = mock.Mock()
+    component._lrms_info           = lrms_info
+    component._lrms_lm_info        = lrms_info['lm_info']
+    component._lrms_node_list      = lrms_info['node_list']
+    component._lrms_cores_per_node = lrms_info['cores_per_node']
+    component._lrms_gpus_per_node  = lrms_info['gpus_per_node']
+    component._lrms_lfs_per_node   = lrms_info.get('lfs_per_node')
+    component._uniform_waitpool    = True
+    component._wait_pool           = WaitPool()
+    component._wait_lock           = threading.RLock()
+    component._slot_lock           = threading.RLock()
+
+    for key, val in attrs.iteritems():
+        setattr(component, key, val)
+
+    component._init_shard()
+    component._init_nodes()
+    component._configure()
+    component._init_policy()
+    component._init_stats()
+
+    return component
+
+
+# ------------------------------------------------------------------------------
+#
+def make_cud(procs, threads=1, gpus=0, mpi=False, **kwargs):
+    '''
+    Return a unit description for `procs` processes with `threads` cores each,
+    and `gpus` gpu processes.  `kwargs` are added to the description.
+    '''
+
+    cud = {'environment'      : dict(),
+           'cpu_process_type' : rpc.MPI if mpi          else None,
+           'cpu_thread_type'  : None,
+           'cpu_processes'    : procs,
+           'cpu_threads'      : threads,
+           'gpu_process_type' : rpc.MPI if mpi and gpus else None,
+           'gpu_thread_type'  : None,
+           'gpu_processes'    : gpus,
+           'gpu_threads'      : 1,
+           'lfs_per_process'  : 0}
+    cud.update(kwargs)
+
+    return cud
+
+
+# ------------------------------------------------------------------------------
+#
+def make_unit(uid, procs, threads=1, gpus=0, mpi=False, **kwargs):
+    '''
+    Return a unit with a description as created by `make_cud()`.
+    '''
+
+    return {'uid'         : uid,
+            'slots'       : None,
+            'description' : make_cud(procs, threads, gpus, mpi, **kwargs)}
+
+
+# ------------------------------------------------------------------------------
+
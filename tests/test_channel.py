@@ -0,0 +1,90 @@
+
+
+
+import threading
+
+from radical.pilot.utils.channel import get_transport, is_inproc
+from radical.pilot.utils.channel import InprocQueue, InprocPubsub
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    cfg = {'bridge_transport' : 'auto',
+           'agents'           : {'agent_1': {'target': 'local'}}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test the transport selection from the bridge configs
+def test_transport():
+
+    cfg = setUp()
+
+    assert(get_transport(cfg, {})                      == 'ipc')
+    assert(get_transport(cfg, {'transport': 'inproc'}) == 'inproc')
+    assert(get_transport(dict(), {})                   == 'tcp')
+
+    cfg['agents']['agent_2'] = {'target': 'node'}
+    assert(get_transport(cfg, {}) == 'tcp')
+
+    try:
+        get_transport(cfg, {'transport': 'udp'})
+        assert(False), 'invalid transport accepted'
+    except ValueError:
+        pass
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test the in-process queue and pubsub channels
+def test_inproc():
+
+    queue = InprocQueue('test.queue')
+    assert(is_inproc(queue.addr))
+    assert(InprocQueue.lookup(queue.addr) is queue)
+
+    # a blocking get is woken up by a put from another thread
+    timer = threading.Timer(0.1, queue.put, ['late'])
+    timer.start()
+    for msg in ['a', 'b']:
+        queue.put(msg)
+    assert([queue.get(), queue.get(10), queue.get(10)] == ['a', 'b', None])
+    assert(queue.get() == 'late')
+    timer.join()
+
+    pubsub = InprocPubsub('test.pubsub')
+    sub_1  = pubsub.subscriber()
+    sub_2  = pubsub.subscriber()
+    sub_1.subscribe('state')
+    sub_2.subscribe('control')
+
+    pubsub.put('state',   'unit')
+    pubsub.put('control', 'cancel')
+    assert(sub_1.get(10) == ['state',   'unit'])
+    assert(sub_2.get(10) == ['control', 'cancel'])
+    assert(sub_1.get(0)  is None)
+
+    queue.close()
+    pubsub.close()
+    try:
+        InprocQueue.lookup(queue.addr)
+        assert(False), 'closed channel found'
+    except ValueError:
+        pass
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,140 @@
+
+
+
+import json
+
+from radical.pilot.utils                      import SlotCodec, is_compact
+from radical.pilot.agent.lm.base              import LaunchMethod
+from radical.pilot.agent.scheduler.continuous import Continuous
+
+from scheduler_utils import make_scheduler, make_unit
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    cfg = {'lrms_info' : {'lm_info'        : {'dvm_uri': 'dvm://1'},
+                          'node_list'      : [['a', 1], ['b', 2], ['c', 3]],
+                          'cores_per_node' : 16,
+                          'gpus_per_node'  : 2,
+                          'lfs_per_node'   : {'size': 1024, 'path': '/tmp'}}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+#
+class EchoLM(LaunchMethod):
+
+    def _configure(self):
+        self.launch_command = 'echo'
+
+    def construct_command(self, cu, launch_script_hop):
+        return cu['slots'], launch_script_hop
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test the compact encoding of slots: round trip, size, and structures which
+# are not encoded
+def test_slot_codec():
+
+    cfg   = setUp()
+    codec = SlotCodec(cfg['lrms_info'])
+    slots = {'nodes'         : [{'name'    : 'b',
+                                 'uid'     : 2,
+                                 'core_map': [[0, 2, 4, 6], [1, 3, 5, 7]],
+                                 'gpu_map' : [[0], [1]],
+                                 'lfs'     : {'size': 10, 'path': '/tmp'},
+                                 'locality': {'split': 0, 'remote': 1}},
+                                {'name'    : 'c',
+                                 'uid'     : 3,
+                                 'core_map': [[c] for c in range(16)],
+                                 'gpu_map' : [],
+                                 'lfs'     : {'size': 0, 'path': '/tmp'}}],
+             'cores_per_node': 16,
+             'gpus_per_node' : 2,
+             'lfs_per_node'  : cfg['lrms_info']['lfs_per_node'],
+             'lm_info'       : cfg['lrms_info']['lm_info'],
+             'shard'         : 1}
+
+    compact = codec.encode(slots)
+
+    assert(is_compact(compact))
+    assert(compact['nodes'] == [[1, 4, [[0, 8, 2], [1, 9, 2]], [[0, 2, 1]], 10,
+                                 {'split': 0, 'remote': 1}],
+                                [2, 1, [[0, 16, 1]], [], 0]])
+    assert(compact['shard'] == 1)
+    assert(len(json.dumps(compact)) * 3 < len(json.dumps(slots)))
+    assert(codec.decode(compact) == slots)
+    assert(codec.encode(compact) is compact)
+
+    # other per-node sizes are kept
+    slots['cores_per_node'] = 14
+    assert(codec.decode(codec.encode(slots)) == slots)
+
+    # slots of other structures are not touched
+    other = dict(slots, lm_info={'other': 'info'})
+    assert(codec.encode(other) is other)
+
+    other = {'nodes': [['b', 2, [[0]], []]], 'lm_info': 'INFO'}
+    assert(codec.encode(other) is other)
+    assert(codec.decode(other) is other)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test that placed units leave the scheduler with compact slots, which are
+# released correctly, and are decoded for the launch methods
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'publish')
+def test_compact_units(mocked_advance,
+                       mocked_publish):
+
+    cfg = setUp()
+
+    component = make_scheduler(Continuous, cfg)
+    component._init_codec()
+
+    units = [make_unit('unit.0000', 24, mpi=True),
+             make_unit('unit.0001', 2, threads=2, gpus=2)]
+    component._schedule_units(units)
+
+    assert(all([is_compact(unit['slots']) for unit in units]))
+    assert(units[0]['slots']['nodes'] == [[0, 1, [[0, 16, 1]], [], 0],
+                                          [1, 1, [[0,  8, 1]], [], 0]])
+
+    session = mock.Mock()
+    lm      = EchoLM(cfg, session)
+    slots   = units[0]['slots']
+
+    full, hop = lm.construct_command(units[0], 'hop')
+    assert(hop == 'hop')
+    assert(full['lm_info'] == {'dvm_uri': 'dvm://1'})
+    assert(full['nodes'][1]['name']     == 'b')
+    assert(full['nodes'][1]['core_map'] == [[c] for c in range(8)])
+    assert(units[0]['slots'] is slots)
+
+    component.unschedule_cb(None, units)
+    assert(list(component._store.free_cores) == [16, 16, 16])
+    assert(list(component._store.free_gpus)  == [2, 2, 2])
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
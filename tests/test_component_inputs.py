@@ -0,0 +1,214 @@
+
+
+
+import zmq
+import time
+import threading
+
+from radical.pilot.utils.component import Component
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+class Input(object):
+    '''
+    An input queue with a fixed set of bulks.  Unless it is an inproc input, it
+    has a socket which can be polled, and which is readable while bulks are
+    left.
+    '''
+
+    def __init__(self, ctx, state, n, inproc=False):
+
+        self._state = state
+        self._bulks = list()
+        self._sock  = None
+        self._push  = None
+
+        if not inproc:
+            self._sock = ctx.socket(zmq.PULL)
+            port       = self._sock.bind_to_random_port('tcp://127.0.0.1')
+            self._push = ctx.socket(zmq.PUSH)
+            self._push.connect('tcp://127.0.0.1:%d' % port)
+
+        self.add(n)
+
+    def add(self, n):
+
+        ready = bool(self._bulks)
+
+        for _ in range(n):
+            uid = '%s.%04d' % (self._state, len(self._bulks))
+            self._bulks.append([{'uid': uid, 'type': 'unit',
+                                 'state': self._state}])
+
+        if self._bulks and not ready and self._push:
+            self._push.send('ready')
+
+    def poll_socket(self):
+        return self._sock
+
+    def get_nowait(self, timeout=None):
+
+        if not self._bulks:
+            return None
+
+        bulk = self._bulks.pop(0)
+        if not self._bulks and self._sock:
+            self._sock.recv()
+
+        return bulk
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp(inputs):
+
+    with mock.patch.object(Component, '__init__', return_value=None):
+        component = Component(cfg=dict(), session=None)
+
+    served = list()
+
+    def worker(things):
+        served.extend([thing['state'] for thing in things])
+
+    component._log         = mock.Mock()
+    component._prof        = mock.Mock()
+    component.is_valid     = mock.Mock()
+    component.advance      = mock.Mock()
+    component._in_budget   = 4
+    component._cancel_list = list()
+    component._cancel_lock = threading.RLock()
+    component._cb_lock     = threading.RLock()
+    component._inputs      = dict()
+    component._workers     = dict()
+
+    for name, queue in inputs.iteritems():
+        component._inputs[name]          = {'queue' : queue,
+                                            'states': [queue._state]}
+        component._workers[queue._state] = worker
+
+    return component, served
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown(ctx):
+
+    ctx.destroy(linger=0)
+
+
+# ------------------------------------------------------------------------------
+# Test that ready inputs are served round-robin, with up to `input_budget`
+# bulks each, so that a flooded input does not starve the others
+def test_round_robin():
+
+    ctx     = zmq.Context()
+    flooded = Input(ctx, 'A', 20)
+    other   = Input(ctx, 'B', 3)
+
+    component, served = setUp({'a': flooded, 'b': other})
+    time.sleep(0.1)
+
+    # both inputs are ready: each is served up to the budget
+    assert(component.work_cb())
+    assert(served == ['A'] * 4 + ['B'] * 3)
+
+    # only the flooded input is ready
+    del(served[:])
+    assert(component.work_cb())
+    assert(served == ['A'] * 4)
+
+    # the input served first alternates
+    other.add(5)
+    time.sleep(0.1)
+    del(served[:])
+    assert(component.work_cb())
+    assert(served == ['A'] * 4 + ['B'] * 4)
+
+    del(served[:])
+    assert(component.work_cb())
+    assert(served == ['B'] * 1 + ['A'] * 4)
+
+    tearDown(ctx)
+
+
+# ------------------------------------------------------------------------------
+# Test that inproc inputs, which can't be polled, are tried on every iteration
+# next to zmq inputs, and only shorten the poll timeout
+def test_inproc_inputs():
+
+    ctx    = zmq.Context()
+    zmq_in = Input(ctx, 'A', 2)
+    inproc = Input(ctx, 'B', 6, inproc=True)
+
+    component, served = setUp({'a': zmq_in, 'b': inproc})
+    time.sleep(0.1)
+
+    assert(component.work_cb())
+    assert(served == ['A'] * 2 + ['B'] * 4)
+
+    del(served[:])
+    assert(component.work_cb())
+    assert(served == ['B'] * 2)
+
+    # with nothing to do, the poll only waits for the inproc timeout
+    del(served[:])
+    start = time.time()
+    assert(component.work_cb())
+    assert(served == list())
+    assert(time.time() - start < 0.5)
+
+    tearDown(ctx)
+
+    # only inproc inputs: nothing to poll, but the iteration still idles
+    ctx    = zmq.Context()
+    inproc = Input(ctx, 'B', 0, inproc=True)
+
+    component, served = setUp({'b': inproc})
+
+    start = time.time()
+    assert(component.work_cb())
+    assert(time.time() - start >= 0.01)
+    assert(time.time() - start <  0.5)
+
+    inproc.add(1)
+    assert(component.work_cb())
+    assert(served == ['B'])
+
+    tearDown(ctx)
+
+
+# ------------------------------------------------------------------------------
+# Test that zmq inputs alone block in the poll while idle
+def test_idle_inputs():
+
+    ctx    = zmq.Context()
+    zmq_in = Input(ctx, 'A', 0)
+
+    component, served = setUp({'a': zmq_in})
+
+    start = time.time()
+    assert(component.work_cb())
+    assert(time.time() - start >= 0.9)
+
+    # a bulk arriving during the poll is served right away
+    timer = threading.Timer(0.1, zmq_in.add, [1])
+    timer.start()
+    start = time.time()
+    assert(component.work_cb())
+    assert(served == ['A'])
+    assert(time.time() - start < 0.9)
+    timer.join()
+
+    tearDown(ctx)
+
+
+# ------------------------------------------------------------------------------
+
@@ -1,6 +1,7 @@
 import radical.utils as ru
 import radical.pilot as rp
 from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.tag_store import TagStore
 import pytest
 import radical.pilot.constants as rpc
 import glob
@@ -78,6 +79,26 @@ def tearDown():
 #-----------------------------------------------------------------------------------------------------------------------
 
 
+# Render node list and node store in the node list format used for assertions
+#-----------------------------------------------------------------------------------------------------------------------
+def _node_states(component):
+
+    store = component._store
+    cpn   = store.cores_per_node
+    gpn   = store.gpus_per_node
+
+    ret = list()
+    for idx, node in enumerate(component.nodes):
+        ret.append({'name' : node['name'],
+                    'uid'  : node['uid'],
+                    'cores': list(store.cores[idx * cpn:(idx + 1) * cpn]),
+                    'gpus' : list(store.gpus [idx * gpn:(idx + 1) * gpn]),
+                    'lfs'  : {'size': store.free_lfs[idx],
+                              'path': store.lfs_path}})
+    return ret
+#-----------------------------------------------------------------------------------------------------------------------
+
+
 # Test umgr input staging of a single file
 #-----------------------------------------------------------------------------------------------------------------------
 @mock.patch.object(Continuous, '__init__', return_value=None)
@@ -99,18 +120,13 @@ def test_mpi_unit_with_continuous_scheduler(
     component._lrms_cores_per_node = cfg['lrms_info']['cores_per_node']
     component._lrms_gpus_per_node = cfg['lrms_info']['gpus_per_node']
     component._lrms_lfs_per_node = cfg['lrms_info']['lfs_per_node']
-    component._tag_history = dict()
+    component._tag_history = TagStore(10000)
     component._log = ru.get_logger('test.component')
 
-    component.nodes = []
-    for node, node_uid in component._lrms_node_list:
-        component.nodes.append(copy.deepcopy({
-            'name': node,
-            'uid': node_uid,
-            'cores': [rpc.FREE] * component._lrms_cores_per_node,
-            'gpus': [rpc.FREE] * component._lrms_gpus_per_node,
-            'lfs': component._lrms_lfs_per_node
-        }))
+    component._fit_policy = 'first'
+    component._fit_cursor = 0
+    component._init_nodes()
+    component._build_node_index()
 
     # Allocate first CUD -- should land on first node
     cud = mpi()
@@ -129,7 +145,7 @@ def test_mpi_unit_with_continuous_scheduler(
                     'gpus_per_node': component._lrms_gpus_per_node}
 
     # Assert resulting node list values after first CUD
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1, 0, 0],
                                 'name': 'a',
                                 'gpus': [0],
@@ -172,7 +188,7 @@ def test_mpi_unit_with_continuous_scheduler(
                     'gpus_per_node': component._lrms_gpus_per_node}
 
     # Assert resulting node list values after second CUD
-    assert component.nodes == [{'lfs': {'size': 2048, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 2048, 'path': 'abc'},
                                 'cores': [1, 1, 1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -216,7 +232,7 @@ def test_mpi_unit_with_continuous_scheduler(
                     'gpus_per_node': component._lrms_gpus_per_node}
 
     # Assert resulting node list values after third CUD
-    assert component.nodes == [{'lfs': {'size': 2048, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 2048, 'path': 'abc'},
                                 'cores': [1, 1, 1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -264,7 +280,7 @@ def test_mpi_unit_with_continuous_scheduler(
                     'gpus_per_node': component._lrms_gpus_per_node}
 
     # Assert resulting node list values after fourth CUD
-    assert component.nodes == [{'lfs': {'size': 2048, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 2048, 'path': 'abc'},
                                 'cores': [1, 1, 1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -292,7 +308,7 @@ def test_mpi_unit_with_continuous_scheduler(
 
     # Deallocate slot
     component._release_slot(slot)
-    assert component.nodes == [{'lfs': {'size': 2048, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 2048, 'path': 'abc'},
                                 'cores': [1, 1, 1, 1],
                                 'name': 'a',
                                 'gpus': [0],
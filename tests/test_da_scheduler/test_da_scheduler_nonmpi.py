@@ -1,6 +1,7 @@
 import radical.utils as ru
 import radical.pilot as rp
 from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.tag_store import TagStore
 import pytest
 import radical.pilot.constants as rpc
 import glob
@@ -78,6 +79,26 @@ def tearDown():
 #-----------------------------------------------------------------------------------------------------------------------
 
 
+# Render node list and node store in the node list format used for assertions
+#-----------------------------------------------------------------------------------------------------------------------
+def _node_states(component):
+
+    store = component._store
+    cpn   = store.cores_per_node
+    gpn   = store.gpus_per_node
+
+    ret = list()
+    for idx, node in enumerate(component.nodes):
+        ret.append({'name' : node['name'],
+                    'uid'  : node['uid'],
+                    'cores': list(store.cores[idx * cpn:(idx + 1) * cpn]),
+                    'gpus' : list(store.gpus [idx * gpn:(idx + 1) * gpn]),
+                    'lfs'  : {'size': store.free_lfs[idx],
+                              'path': store.lfs_path}})
+    return ret
+#-----------------------------------------------------------------------------------------------------------------------
+
+
 # Test umgr input staging of a single file
 #-----------------------------------------------------------------------------------------------------------------------
 @mock.patch.object(Continuous, '__init__', return_value=None)
@@ -99,17 +120,12 @@ def test_nonmpi_unit_with_continuous_scheduler(
     component._lrms_cores_per_node = cfg['lrms_info']['cores_per_node']
     component._lrms_gpus_per_node = cfg['lrms_info']['gpus_per_node']
     component._lrms_lfs_per_node = cfg['lrms_info']['lfs_per_node']
-    component._tag_history = dict()
-
-    component.nodes = []
-    for node, node_uid in component._lrms_node_list:
-        component.nodes.append(copy.deepcopy({
-            'name': node,
-            'uid': node_uid,
-            'cores': [rpc.FREE] * component._lrms_cores_per_node,
-            'gpus': [rpc.FREE] * component._lrms_gpus_per_node,
-            'lfs': component._lrms_lfs_per_node
-        }))
+    component._tag_history = TagStore(10000)
+
+    component._fit_policy = 'first'
+    component._fit_cursor = 0
+    component._init_nodes()
+    component._build_node_index()
 
     # Allocate first CUD -- should land on first node
     cud = nompi()
@@ -125,7 +141,7 @@ def test_nonmpi_unit_with_continuous_scheduler(
                     'gpus_per_node': 1}
 
     # Assert resulting node list values after first CUD
-    assert component.nodes == [{'lfs': {'size': 4096, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 4096, 'path': 'abc'},
                                 'cores': [1, 0],
                                 'name': 'a',
                                 'gpus': [0],
@@ -254,7 +270,7 @@ def test_nonmpi_unit_with_continuous_scheduler(
 
     # Deallocate slot
     component._release_slot(slot)
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -297,7 +313,7 @@ def test_nonmpi_unit_with_continuous_scheduler(
             'lm_info': 'INFO',
             'gpus_per_node': 1}
     component._release_slot(slot)
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -339,7 +355,7 @@ def test_nonmpi_unit_with_continuous_scheduler(
                     'lm_info': 'INFO',
                     'gpus_per_node': 1}
 
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -367,3 +383,49 @@ def test_nonmpi_unit_with_continuous_scheduler(
 
     tearDown()
 #-----------------------------------------------------------------------------------------------------------------------
+
+
+# Test bulk allocation of non-MPI units
+#-----------------------------------------------------------------------------------------------------------------------
+@mock.patch.object(Continuous, '__init__', return_value=None)
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(ru.Profiler, 'prof')
+@mock.patch('radical.utils.raise_on')
+def test_nonmpi_bulk_with_continuous_scheduler(
+        mocked_init,
+        mocked_method,
+        mocked_profiler,
+        mocked_raise_on):
+
+    cfg, session = setUp()
+
+    component = Continuous(cfg=dict(), session=session)
+    component._lrms_info = cfg['lrms_info']
+    component._lrms_lm_info = cfg['lrms_info']['lm_info']
+    component._lrms_node_list = cfg['lrms_info']['node_list']
+    component._lrms_cores_per_node = cfg['lrms_info']['cores_per_node']
+    component._lrms_gpus_per_node = cfg['lrms_info']['gpus_per_node']
+    component._lrms_lfs_per_node = cfg['lrms_info']['lfs_per_node']
+    component._tag_history = TagStore(10000)
+
+    component._fit_policy = 'first'
+    component._fit_cursor = 0
+    component._init_nodes()
+    component._build_node_index()
+
+    # 5 nodes with 2 cores each can host 10 single core units - the remaining
+    # units of the bulk must fail
+    cuds  = [nompi() for _ in range(12)]
+    slots = component._allocate_slots(cuds)
+
+    assert len(slots) == 12
+    assert [s['nodes'][0]['uid'] for s in slots[:10]] == \
+           [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+    assert slots[10:] == [None, None]
+
+    for node in _node_states(component):
+        assert node['cores'] == [1, 1]
+        assert node['lfs']['size'] == 5120 - 2 * 1024
+
+    tearDown()
+#-----------------------------------------------------------------------------------------------------------------------
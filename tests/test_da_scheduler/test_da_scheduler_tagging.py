@@ -1,6 +1,7 @@
 import radical.utils as ru
 import radical.pilot as rp
 from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.tag_store import TagStore
 import pytest
 import radical.pilot.constants as rpc
 import glob
@@ -98,6 +99,40 @@ def tearDown():
 #-----------------------------------------------------------------------------------------------------------------------
 
 
+# Render node list and node store in the node list format used for assertions
+#-----------------------------------------------------------------------------------------------------------------------
+def _node_states(component):
+
+    store = component._store
+    cpn   = store.cores_per_node
+    gpn   = store.gpus_per_node
+
+    ret = list()
+    for idx, node in enumerate(component.nodes):
+        ret.append({'name' : node['name'],
+                    'uid'  : node['uid'],
+                    'cores': list(store.cores[idx * cpn:(idx + 1) * cpn]),
+                    'gpus' : list(store.gpus [idx * gpn:(idx + 1) * gpn]),
+                    'lfs'  : {'size': store.free_lfs[idx],
+                              'path': store.lfs_path}})
+    return ret
+#-----------------------------------------------------------------------------------------------------------------------
+
+
+# Render the tag store as dict of unit uids to the uids of their nodes
+#-----------------------------------------------------------------------------------------------------------------------
+def _tag_state(component):
+
+    tags = component._tag_history
+
+    ret = dict()
+    for uid in tags:
+        ret[uid] = sorted([component.nodes[idx]['uid']
+                           for idx in tags.nodes(uid)])
+    return ret
+#-----------------------------------------------------------------------------------------------------------------------
+
+
 # Test umgr input staging of a single file
 #-----------------------------------------------------------------------------------------------------------------------
 @mock.patch.object(Continuous, '__init__', return_value=None)
@@ -122,25 +157,20 @@ def test_nonmpi_unit_with_tagging(
     component._log = ru.get_logger('test.component')
     component._slot_lock = threading.RLock()
     component._prof = ru.Profiler('test')
-    component._tag_history = dict()
+    component._tag_history = TagStore(10000)
 
 
-    component.nodes = []
-    for node, node_uid in component._lrms_node_list:
-        component.nodes.append(copy.deepcopy({
-            'name': node,
-            'uid': node_uid,
-            'cores': [rpc.FREE] * component._lrms_cores_per_node,
-            'gpus': [rpc.FREE] * component._lrms_gpus_per_node,
-            'lfs': component._lrms_lfs_per_node
-        }))
+    component._fit_policy = 'first'
+    component._fit_cursor = 0
+    component._init_nodes()
+    component._build_node_index()
 
     # Allocate first CUD -- should land on first node
     cu = nompi()
     cu['uid'] = 'unit.000000'
     component._try_allocation(cu)
     slot1 = cu['slots']
-    assert component._tag_history == {'unit.000000': [1]}
+    assert _tag_state(component) == {'unit.000000': [1]}
     assert slot1 == {'cores_per_node': 2,
                      'lfs_per_node': component._lrms_lfs_per_node,
                      'nodes': [{'lfs': {'size': 1024, 'path': 'abc'},
@@ -152,7 +182,7 @@ def test_nonmpi_unit_with_tagging(
                      'gpus_per_node': 1}
 
     # Assert resulting node list values after first CUD
-    assert component.nodes == [{'lfs': {'size': 4096, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 4096, 'path': 'abc'},
                                 'cores': [1, 0],
                                 'name': 'a',
                                 'gpus': [0],
@@ -184,7 +214,7 @@ def test_nonmpi_unit_with_tagging(
     cu['description']['tag'] = 'unit.000000'
     component._try_allocation(cu)
     slot2 = cu['slots']
-    assert component._tag_history == {'unit.000000': [1],
+    assert _tag_state(component) == {'unit.000000': [1],
                                       'unit.000001': [1]}
     assert slot2 == {'cores_per_node': 2,
                      'lfs_per_node': component._lrms_lfs_per_node,
@@ -197,7 +227,7 @@ def test_nonmpi_unit_with_tagging(
                      'gpus_per_node': 1}
 
     # Assert resulting node list values after second CUD
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -232,13 +262,13 @@ def test_nonmpi_unit_with_tagging(
     component._try_allocation(cu)
     slot3 = cu['slots']
     assert slot3 == None
-    assert component._tag_history == {'unit.000000': [1],
+    assert _tag_state(component) == {'unit.000000': [1],
                                       'unit.000001': [1]}
 
     #
     component._release_slot(slot2)
     # Assert resulting node list values after second CUDslot release
-    assert component.nodes == [{'lfs': {'size': 4096, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 4096, 'path': 'abc'},
                                 'cores': [1, 0],
                                 'name': 'a',
                                 'gpus': [0],
@@ -281,11 +311,11 @@ def test_nonmpi_unit_with_tagging(
                                 'uid': 1}],
                      'lm_info': 'INFO',
                      'gpus_per_node': 1}
-    assert component._tag_history == {'unit.000000': [1],
+    assert _tag_state(component) == {'unit.000000': [1],
                                       'unit.000001': [1],
                                       'unit.000002': [1]}
 
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -336,17 +366,12 @@ def test_mpi_unit_with_tagging(
     component._scattered = True
     component._log = ru.get_logger('test.component')
     component._prof = ru.Profiler('test')
-    component._tag_history = dict()
-
-    component.nodes = []
-    for node, node_uid in component._lrms_node_list:
-        component.nodes.append(copy.deepcopy({
-            'name': node,
-            'uid': node_uid,
-            'cores': [rpc.FREE] * component._lrms_cores_per_node,
-            'gpus': [rpc.FREE] * component._lrms_gpus_per_node,
-            'lfs': component._lrms_lfs_per_node
-        }))
+    component._tag_history = TagStore(10000)
+
+    component._fit_policy = 'first'
+    component._fit_cursor = 0
+    component._init_nodes()
+    component._build_node_index()
 
     # Allocate first CUD -- should land on first node
     cu = mpi()
@@ -356,7 +381,7 @@ def test_mpi_unit_with_tagging(
     cu['description']['lfs_per_process'] = 1024
     component._try_allocation(cu)
     slot1 = cu['slots']
-    assert component._tag_history == {'unit.000000': [1]}
+    assert _tag_state(component) == {'unit.000000': [1]}
     assert slot1 == {'cores_per_node': 2,
                      'lfs_per_node': component._lrms_lfs_per_node,
                      'nodes': [{'lfs': {'size': 2048, 'path': 'abc'},
@@ -368,7 +393,7 @@ def test_mpi_unit_with_tagging(
                      'gpus_per_node': 1}
 
     # Assert resulting node list values after first CUD
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -402,7 +427,7 @@ def test_mpi_unit_with_tagging(
     component._try_allocation(cu)
     slot2 = cu['slots']
     assert slot2 == None
-    assert component._tag_history == {'unit.000000': [1]}
+    assert _tag_state(component) == {'unit.000000': [1]}
 
     # Allocate third CUD -- should land on second and third node
     cu = mpi()
@@ -425,11 +450,11 @@ def test_mpi_unit_with_tagging(
                                 'uid': 3}],
                      'lm_info': 'INFO',
                      'gpus_per_node': 1}
-    assert component._tag_history == {'unit.000000': [1],
+    assert _tag_state(component) == {'unit.000000': [1],
                                       'unit.000002': [2, 3]}
 
     # Assert resulting node list values after second CUDslot release
-    assert component.nodes == [{'lfs': {'size': 3072, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 3072, 'path': 'abc'},
                                 'cores': [1, 1],
                                 'name': 'a',
                                 'gpus': [0],
@@ -464,13 +489,13 @@ def test_mpi_unit_with_tagging(
     component._try_allocation(cu)
     slot4 = cu['slots']
     assert slot4 == None
-    assert component._tag_history == {'unit.000000': [1],
+    assert _tag_state(component) == {'unit.000000': [1],
                                       'unit.000002': [2, 3]}
 
     # Release first node and allocate second CUD again
     component._release_slot(slot1)
 
-    assert component.nodes == [{'lfs': {'size': 5120, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 5120, 'path': 'abc'},
                                 'cores': [0, 0],
                                 'name': 'a',
                                 'gpus': [0],
@@ -510,14 +535,14 @@ def test_mpi_unit_with_tagging(
                                 'uid': 1}],
                      'lm_info': 'INFO',
                      'gpus_per_node': 1}
-    assert component._tag_history == {'unit.000000': [1],
+    assert _tag_state(component) == {'unit.000000': [1],
                                       'unit.000001': [1],
                                       'unit.000002': [2, 3]}
 
     # Release second and third nodes and allocate fourth CUD again
     component._release_slot(slot3)
 
-    assert component.nodes == [{'lfs': {'size': 4096, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 4096, 'path': 'abc'},
                                 'cores': [1, 0],
                                 'name': 'a',
                                 'gpus': [0],
@@ -558,12 +583,12 @@ def test_mpi_unit_with_tagging(
                                 'uid': 2}],
                      'lm_info': 'INFO',
                      'gpus_per_node': 1}
-    assert component._tag_history == {'unit.000000': [1],
+    assert _tag_state(component) == {'unit.000000': [1],
                                       'unit.000001': [1],
                                       'unit.000002': [2, 3],
                                       'unit.000003': [2]}
 
-    assert component.nodes == [{'lfs': {'size': 4096, 'path': 'abc'},
+    assert _node_states(component) == [{'lfs': {'size': 4096, 'path': 'abc'},
                                 'cores': [1, 0],
                                 'name': 'a',
                                 'gpus': [0],
@@ -590,3 +615,29 @@ def test_mpi_unit_with_tagging(
                                 'uid': 5}]
 
     tearDown()
+
+
+# Test eviction of placements from the tag store
+#-----------------------------------------------------------------------------------------------------------------------
+def test_tag_store_eviction():
+
+    tags = TagStore(2)
+
+    # a referenced placement is retained, unreferenced ones are evicted in LRU
+    # order
+    tags.reference('unit.000000')
+    tags.record('unit.000000', [0])
+    tags.record('unit.000001', [1])
+    tags.record('unit.000002', [2])
+    tags.record('unit.000003', [3, 4])
+
+    assert sorted(tags) == ['unit.000000', 'unit.000002', 'unit.000003']
+    assert tags.nodes('unit.000003') == set([3, 4])
+    assert tags.nodes('unit.000001') is None
+
+    # once no reference remains, the placement becomes subject to eviction
+    tags.dereference('unit.000000')
+
+    assert sorted(tags) == ['unit.000000', 'unit.000003']
+    assert tags.nodes('unit.000000') == set([0])
+#-----------------------------------------------------------------------------------------------------------------------
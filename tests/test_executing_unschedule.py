@@ -0,0 +1,150 @@
+
+
+
+import threading
+
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.executing.base import AgentExecutingComponent
+from radical.pilot.agent.scheduler.shard import shard_topic
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp(window):
+
+    component = AgentExecutingComponent.__new__(AgentExecutingComponent)
+    component._unschedule_window = window
+    component._unschedule_units  = list()
+    component._unschedule_lock   = threading.RLock()
+    component.publish            = mock.Mock()
+    component.register_publisher = mock.Mock()
+    component.register_timed_cb  = mock.Mock()
+
+    component.register_unschedule()
+
+    return component
+
+
+# ------------------------------------------------------------------------------
+#
+def make_unit(uid, shard=None):
+
+    slots = {'nodes': [{'uid': 'node.0000'}]}
+    if shard is not None:
+        slots['shard'] = shard
+
+    return {'uid'         : uid,
+            'state'       : 'AGENT_EXECUTING',
+            'slots'       : slots,
+            'description' : {'executable': '/bin/true'},
+            'stdout'      : 'x' * 1024}
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test that finished units are sent to the scheduler in one message per window,
+# and that units collected when the component stops are not lost
+def test_unschedule():
+
+    component = setUp(0.1)
+    units     = [make_unit('unit.%04d' % i) for i in range(5)]
+
+    # the flush callback fires once per window
+    component.register_publisher.assert_called_once_with(
+                                             rpc.AGENT_UNSCHEDULE_PUBSUB)
+    assert(component.register_timed_cb.call_args ==
+           mock.call(component._unschedule_flush_cb, timer=0.1))
+
+    # units within the window are collected into one message, which carries
+    # only what the scheduler needs
+    for unit in units[:3]:
+        component.unschedule(unit)
+    assert(not component.publish.called)
+
+    assert(component._unschedule_flush_cb())
+    component.publish.assert_called_once_with(rpc.AGENT_UNSCHEDULE_PUBSUB,
+                                              [[{'uid'        : u['uid'],
+                                                 'slots'      : u['slots'],
+                                                 'description': u['description']}
+                                                for u in units[:3]]],
+                                              topic=rpc.AGENT_UNSCHEDULE_PUBSUB)
+
+    # nothing is sent for empty windows
+    component.publish.reset_mock()
+    assert(component._unschedule_flush_cb())
+    assert(not component.publish.called)
+
+    # units collected when the component stops are flushed
+    component.unschedule(units[3])
+    component.unschedule(units[4])
+    component.finalize_child()
+
+    msg = component.publish.call_args[0][1]
+    assert([u['uid'] for u in msg[0]] == ['unit.0003', 'unit.0004'])
+    assert(component._unschedule_units == list())
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test that units are sent one by one without a window
+def test_unschedule_immediate():
+
+    component = setUp(0.0)
+    unit      = make_unit('unit.0000')
+
+    assert(not component.register_timed_cb.called)
+
+    component.unschedule(unit)
+    component.publish.assert_called_once_with(rpc.AGENT_UNSCHEDULE_PUBSUB,
+                                              {'uid'        : unit['uid'],
+                                               'slots'      : unit['slots'],
+                                               'description': unit['description']},
+                                              topic=rpc.AGENT_UNSCHEDULE_PUBSUB)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test that units placed by a sharded scheduler are sent to the owning shard
+def test_unschedule_shards():
+
+    component = setUp(0.1)
+    units     = [make_unit('unit.%04d' % i, i % 2) for i in range(4)]
+
+    for unit in units:
+        component.unschedule(unit)
+    assert(component._unschedule_flush_cb())
+
+    sent = dict([[c[1]['topic'], [u['uid'] for u in c[0][1][0]]]
+                 for c in component.publish.call_args_list])
+    assert(sent == {shard_topic(rpc.AGENT_UNSCHEDULE_PUBSUB, 0):
+                                                ['unit.0000', 'unit.0002'],
+                    shard_topic(rpc.AGENT_UNSCHEDULE_PUBSUB, 1):
+                                                ['unit.0001', 'unit.0003']})
+
+    # without a window, too
+    component = setUp(0.0)
+    component.unschedule(units[1])
+    assert(component.publish.call_args[1]['topic'] ==
+           shard_topic(rpc.AGENT_UNSCHEDULE_PUBSUB, 1))
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
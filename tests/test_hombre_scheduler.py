@@ -3,13 +3,13 @@
 import os
 import copy
 import pprint
-import pytest
 
 import radical.utils           as ru
-import radical.pilot           as rp
 import radical.pilot.constants as rpc
 
-from radical.pilot.agent.scheduler.hombre import Hombre
+from radical.pilot.agent.scheduler.hombre import Hombre, CHUNK_KEYS
+
+from scheduler_utils import make_scheduler, make_cud
 
 
 try:
@@ -31,43 +31,26 @@ cur_dir = os.path.dirname(os.path.abspath(__file__))
 # Setup for every test
 def setUp():
 
-    session = rp.Session()
     config  = {'lrms_info' : {'lm_info'        : 'INFO',
                               'n_nodes'        : 2,
                               'cores_per_node' : 4,
                               'gpus_per_node'  : 2,
-                              'node_list'      : [['0', 0], ['1', 1]]}}
-    return config, session
+                              'node_list'      : [[0, '0'], [1, '1']]}}
+    return config
 
 
 # ------------------------------------------------------------------------------
 #
 def cud_nonmpi():
 
-    return {'cpu_process_type' : None,
-            'cpu_thread_type'  : None,
-            'cpu_processes'    : 1,
-            'cpu_threads'      : 2,
-
-            'gpu_process_type' : None,
-            'gpu_thread_type'  : None,
-            'gpu_processes'    : 1,
-            'gpu_threads'      : 1}
+    return make_cud(1, threads=2, gpus=1)
 
 
 # ------------------------------------------------------------------------------
 #
 def cud_mpi():
 
-    return {'cpu_process_type' : rpc.MPI,
-            'cpu_thread_type'  : None,
-            'cpu_processes'    : 3,
-            'cpu_threads'      : 1,
-
-            'gpu_process_type' : rpc.MPI,
-            'gpu_thread_type'  : None,
-            'gpu_processes'    : 1,
-            'gpu_threads'      : 1}
+    return make_cud(3, gpus=1, mpi=True)
 
 
 # ------------------------------------------------------------------------------
@@ -80,38 +63,18 @@ def tearDown():
 
 # ------------------------------------------------------------------------------
 # Test non mpi units
-@mock.patch.object(Hombre, '__init__', return_value=None)
 @mock.patch.object(Hombre, 'advance')
 @mock.patch.object(ru.Profiler, 'prof')
 @mock.patch('radical.utils.raise_on')
-def test_nonmpi_unit_withhombre_scheduler(mocked_init,
-                                          mocked_method,
+def test_nonmpi_unit_withhombre_scheduler(mocked_method,
                                           mocked_profiler,
                                           mocked_raise_on):
-    cfg, session = setUp()
-
-    component = Hombre(cfg=dict(), session=session)
-    component._configured          = False
-    component._cfg                 = cfg
-    component._lrms_info           = cfg['lrms_info']
-    component._lrms_lm_info        = cfg['lrms_info']['lm_info']
-    component._lrms_n_nodes        = cfg['lrms_info']['n_nodes']
-    component._lrms_node_list      = cfg['lrms_info']['node_list']
-    component._lrms_cores_per_node = cfg['lrms_info']['cores_per_node']
-    component._lrms_gpus_per_node  = cfg['lrms_info']['gpus_per_node']
-
-    component.nodes = list()
-    for node in component._lrms_node_list:
-        component.nodes.append({'uid'  : node[0], 
-                                'name' : node[1]})
-
-    # populate component attributes
-    component._configure()
-    component._oversubscribe = True
+    cfg       = setUp()
+    component = make_scheduler(Hombre, cfg)
 
     # we expect these slots to be available
     all_slots = list()
-    for n in range(component._lrms_n_nodes):
+    for n in range(len(component.nodes)):
         all_slots.append({'lm_info'        : 'INFO',
                           'cores_per_node' : 4,
                           'gpus_per_node'  : 2,
@@ -154,13 +117,10 @@ def test_nonmpi_unit_withhombre_scheduler(mocked_init,
     slot = component._allocate_slot(cud)
     assert slot == all_slots[-4]
 
-    # Fail with ValueError if heterogeneous  CUs are scheduled
-    with pytest.raises(ValueError):
-
-        cud = cud_nonmpi()
-        cud['gpu_processes'] = 2
-        slot = component._allocate_slot(cud)
-
+    # heterogeneous CUs get their own chunks - but all nodes are in use
+    cud = cud_nonmpi()
+    cud['gpu_processes'] = 2
+    assert(component._allocate_slot(cud) is None)
 
     # expext no slots now, as all resources are used
     cud    = cud_nonmpi()
@@ -180,34 +140,14 @@ def test_nonmpi_unit_withhombre_scheduler(mocked_init,
 
 # ------------------------------------------------------------------------------
 # Test mpi units
-@mock.patch.object(Hombre, '__init__', return_value=None)
 @mock.patch.object(Hombre, 'advance')
 @mock.patch.object(ru.Profiler, 'prof')
 @mock.patch('radical.utils.raise_on')
-def test_mpi_unit_withhombre_scheduler(mocked_init,
-                                       mocked_method,
+def test_mpi_unit_withhombre_scheduler(mocked_method,
                                        mocked_profiler,
                                        mocked_raise_on):
-    cfg, session = setUp()
-
-    component = Hombre(cfg=dict(), session=session)
-    component._configured          = False
-    component._cfg                 = cfg
-    component._lrms_info           = cfg['lrms_info']
-    component._lrms_lm_info        = cfg['lrms_info']['lm_info']
-    component._lrms_n_nodes        = cfg['lrms_info']['n_nodes']
-    component._lrms_node_list      = cfg['lrms_info']['node_list']
-    component._lrms_cores_per_node = cfg['lrms_info']['cores_per_node']
-    component._lrms_gpus_per_node  = cfg['lrms_info']['gpus_per_node']
-
-    component.nodes = list()
-    for node in component._lrms_node_list:
-        component.nodes.append({'uid'  : node[0], 
-                                'name' : node[1]})
-
-    # populate component attributes
-    component._configure()
-    component._oversubscribe = True
+    cfg       = setUp()
+    component = make_scheduler(Hombre, cfg)
 
     # we expect these slots to be available
     all_slots = [{
@@ -243,12 +183,10 @@ def test_mpi_unit_withhombre_scheduler(mocked_init,
     slot = component._allocate_slot(cud)
     assert slot == all_slots[-2]
 
-    # Fail with ValueError if heterogeneous  CUs are scheduled
-    with pytest.raises(ValueError):
-
-        cud = cud_mpi()
-        cud['gpu_processes'] = 2
-        slot = component._allocate_slot(cud)
+    # heterogeneous CUs get their own chunks - but all nodes are in use
+    cud = cud_mpi()
+    cud['gpu_processes'] = 2
+    assert(component._allocate_slot(cud) is None)
 
     # expext no slots now, as all resources are used
     cud    = cud_mpi()
@@ -266,5 +204,113 @@ def test_mpi_unit_withhombre_scheduler(mocked_init,
     tearDown()
 
 
+# ------------------------------------------------------------------------------
+# Test mixed unit shapes: nodes move between the chunk pools of different shapes
+@mock.patch.object(Hombre, 'advance')
+@mock.patch.object(ru.Profiler, 'prof')
+@mock.patch('radical.utils.raise_on')
+def test_mixed_units_withhombre_scheduler(mocked_method,
+                                          mocked_profiler,
+                                          mocked_raise_on):
+    cfg       = setUp()
+    component = make_scheduler(Hombre, cfg)
+
+    # fill both nodes with small units (two per node)
+    slots = [component._allocate_slot(cud_nonmpi()) for _ in range(4)]
+    assert(None not in slots)
+    assert(component._allocate_slot(cud_nonmpi()) is None)
+
+    # a unit with two GPUs needs a full node
+    big = cud_nonmpi()
+    big['gpu_processes'] = 2
+    assert(component._allocate_slot(big) is None)
+
+    # free one chunk on each node: no node is idle, still no room
+    component._release_slot(slots[0])
+    component._release_slot(slots[3])
+    assert(component._allocate_slot(big) is None)
+
+    # free the second node completely: it moves to the pool of the big units
+    component._release_slot(slots[1])
+    slot = component._allocate_slot(big)
+    assert(slot == {'lm_info'        : 'INFO',
+                    'cores_per_node' : 4,
+                    'gpus_per_node'  : 2,
+                    'nodes'          : [[1, '1', [[0, 1]], [[0], [1]]]]})
+
+    # the small units can only use the remaining chunk on the first node
+    assert(component._allocate_slot(cud_nonmpi()) == slots[3])
+    assert(component._allocate_slot(cud_nonmpi()) is None)
+
+    # and get the second node back once the big unit is done
+    component._release_slot(slot)
+    assert(component._allocate_slot(cud_nonmpi()) is not None)
+    assert(component._allocate_slot(cud_nonmpi()) is not None)
+    assert(component._allocate_slot(cud_nonmpi()) is None)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test the chunk pools: carving of single and multi node chunks, and merging of
+# idle groups back into the spare nodes
+@mock.patch.object(Hombre, 'advance')
+@mock.patch.object(ru.Profiler, 'prof')
+@mock.patch('radical.utils.raise_on')
+def test_hombre_pools(mocked_method,
+                      mocked_profiler,
+                      mocked_raise_on):
+
+    cfg       = setUp()
+    component = make_scheduler(Hombre, cfg)
+    small     = cud_nonmpi()
+    large     = make_cud(4, mpi=True)
+
+    # two small chunks fit onto each node
+    pool = component._create_pool(small)
+    assert(pool['group_size'] == 1)
+
+    chunks = component._carve(pool['chunk'], component.nodes)
+    assert([c['nodes'] for c in chunks] ==
+           [[[0, '0', [[0, 1]], [[0]]]], [[0, '0', [[2, 3]], [[1]]]],
+            [[1, '1', [[0, 1]], [[0]]]], [[1, '1', [[2, 3]], [[1]]]]])
+
+    # multi node chunks never use the last core of a node, so the large unit
+    # needs a group of both nodes
+    pool = component._create_pool(large)
+    assert(pool['group_size'] == 2)
+
+    chunks = component._carve(pool['chunk'], component.nodes)
+    assert([c['nodes'] for c in chunks] ==
+           [[[0, '0', [[0], [1], [2]], []], [1, '1', [[0]], []]]])
+
+    # a small unit splits one node off the spare nodes, the large unit does
+    # not find enough spare nodes then
+    slot = component._allocate_slot(small)
+    assert(component._spare == [0])
+    assert(component._allocate_slot(large) is None)
+
+    # once the small unit is done, its group is idle, and gets merged back.
+    # Groups are split off the end of the spare nodes.
+    component._release_slot(slot)
+    small_pool = component._pools[tuple([small[k] for k in CHUNK_KEYS])]
+    assert(len(small_pool['idle']) == 1)
+
+    group = small_pool['idle'][0]
+    slot  = component._allocate_slot(large)
+    assert(slot['nodes'] == [[1, '1', [[0], [1], [2]], []],
+                             [0, '0', [[0]], []]])
+    assert(group['dead'])
+    assert(component._spare == [])
+    assert(component._owner[0] is component._owner[1])
+
+    # the stale free list entries of the merged group are dropped
+    assert(small_pool['n_free'] == 0)
+    assert(small_pool['free']   == [])
+    assert(component._allocate_slot(small) is None)
+
+    tearDown()
+
+
 # ------------------------------------------------------------------------------
 
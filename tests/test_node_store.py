@@ -0,0 +1,101 @@
+
+
+
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.scheduler.node_store import NodeStore
+from radical.pilot.agent.scheduler.node_store import FIT_FIRST, FIT_NEXT, FIT_BEST
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    # 6 nodes with 4 cores and 1 gpu each.  Occupy some cores, so that the
+    # nodes have different free capacities:
+    #
+    #   node  : 0 1 2 3 4 5
+    #   cores : 4 1 3 0 1 4
+    #   gpus  : 1 1 1 1 0 1
+    #
+    store = NodeStore(6, 4, 1, None)
+    store.set_cores(1, [0, 1, 2],    rpc.BUSY)
+    store.set_cores(2, [0],          rpc.BUSY)
+    store.set_slots(3, [0, 1, 2, 3], [], rpc.BUSY)
+    store.set_slots(4, [1, 2, 3],    [0], rpc.BUSY)
+
+    return store
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test the free counters and the capacity index after slot changes
+def test_index():
+
+    store = setUp()
+
+    assert(list(store.free_cores) == [4, 1, 3, 0, 1, 4])
+    assert(list(store.free_gpus)  == [1, 1, 1, 1, 0, 1])
+    assert(store.status() == '|----:-|###-:-|#---:-|####:-|-###:#|----:-|')
+
+    # one bucket per distinct (cores, gpus) capacity, full nodes included
+    assert(store._buckets == {(4, 1): [0, 5],
+                              (1, 1): [1],
+                              (3, 1): [2],
+                              (0, 1): [3],
+                              (1, 0): [4]})
+
+    # resetting a slot to the same state does not change the counters
+    store.set_slots(4, [1], [0], rpc.BUSY)
+    assert(store.free_cores[4] == 1)
+    assert(store.free_gpus [4] == 0)
+
+    # freeing cores and gpus in one call moves the node once, and removes
+    # the emptied bucket
+    store.set_slots(4, [1, 2, 3], [0], rpc.FREE)
+    assert((1, 0) not in store._buckets)
+    assert(store._buckets[(4, 1)] == [0, 4, 5])
+    assert(store._keys[4] == (4, 1))
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test the candidate order of the fit policies
+def test_candidates():
+
+    store = setUp()
+
+    assert(list(store.candidates(1, 0, FIT_FIRST))    == [0, 1, 2, 4, 5])
+    assert(list(store.candidates(1, 1, FIT_FIRST))    == [0, 1, 2, 5])
+    assert(list(store.candidates(2, 0, FIT_FIRST))    == [0, 2, 5])
+    assert(list(store.candidates(5, 0, FIT_FIRST))    == [])
+
+    # next fit starts at the cursor, and wraps around
+    assert(list(store.candidates(1, 0, FIT_NEXT, 2))  == [2, 4, 5, 0, 1])
+    assert(list(store.candidates(1, 0, FIT_NEXT, 3))  == [4, 5, 0, 1, 2])
+    assert(list(store.candidates(1, 0, FIT_NEXT, 6))  == [0, 1, 2, 4, 5])
+    assert(list(store.candidates(2, 1, FIT_NEXT, 3))  == [5, 0, 2])
+
+    # best fit orders by free cores, then free gpus, then node index
+    assert(list(store.candidates(1, 0, FIT_BEST))     == [4, 1, 2, 0, 5])
+    assert(list(store.candidates(1, 1, FIT_BEST))     == [1, 2, 0, 5])
+    assert(list(store.candidates(0, 0, FIT_BEST))     == [3, 4, 1, 2, 0, 5])
+
+    # the order follows state changes
+    store.set_cores(0, [0, 1], rpc.BUSY)
+    assert(list(store.candidates(2, 0, FIT_BEST))     == [0, 2, 5])
+    assert(list(store.candidates(3, 0, FIT_FIRST))    == [2, 5])
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,59 @@
+
+
+
+import os
+import shutil
+import tempfile
+
+from radical.pilot.utils.profiler import Profiler
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    os.environ['RADICAL_PILOT_PROFILE'] = 'True'
+    return tempfile.mkdtemp()
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown(path):
+
+    del(os.environ['RADICAL_PILOT_PROFILE'])
+    shutil.rmtree(path)
+
+
+# ------------------------------------------------------------------------------
+# Test bulk events and the per-class enablement
+def test_profiler():
+
+    path = setUp()
+    prof = Profiler(name='test', ns='radical.pilot', path=path,
+                    events={'transport': False})
+
+    prof.prof_bulk('advance', ['unit.0000', 'unit.0001'], state='NEW',
+                   timestamp=1.0)
+    prof.prof('put', uid='unit.0000', state='NEW')   # transport: disabled
+    prof.prof('advance', uid='unit.0002', state='DONE', timestamp=2.0,
+              tid='worker')
+    prof.close()
+
+    with open('%s/test.prof' % path) as fin:
+        lines = fin.read().split('\n')
+
+    # header, time sync, three advance events, END
+    assert(len([l for l in lines if l]) == 6), lines
+    assert(lines[2] == '1.0000,advance,test,MainThread,unit.0000,NEW,')
+    assert(lines[3] == '1.0000,advance,test,MainThread,unit.0001,NEW,')
+    assert(lines[4] == '2.0000,advance,test,worker,unit.0002,DONE,')
+    assert(',END,' in lines[5])
+
+    assert(prof.is_enabled('advance') is False)  # closed
+
+    tearDown(path)
+
+
+# ------------------------------------------------------------------------------
+
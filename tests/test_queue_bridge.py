@@ -0,0 +1,282 @@
+
+
+
+import zmq
+import time
+import msgpack
+
+from radical.pilot.utils.queue import Queue, _FLUSH_DATA
+from radical.pilot.utils.queue import QUEUE_INPUT, QUEUE_BRIDGE, QUEUE_OUTPUT
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp(bcfg):
+
+    # the queue ends only need a logger and a list of contexts to destroy from
+    # the session
+    session = mock.Mock()
+    session._to_destroy = list()
+
+    cfg    = {'bridges': {'test_queue': bcfg}}
+    bridge = Queue(session, 'test_queue', QUEUE_BRIDGE, bcfg)
+    q_in   = Queue(session, 'test_queue', QUEUE_INPUT,  cfg,
+                   addr=str(bridge.addr_in))
+
+    def output():
+        return Queue(session, 'test_queue', QUEUE_OUTPUT, cfg,
+                     addr=str(bridge.addr_out))
+
+    return bridge, q_in, output
+
+
+# ------------------------------------------------------------------------------
+#
+def make_bridge(bcfg):
+    '''
+    Create a bridge whose `work_cb()` can be called in this process, with
+    a real input socket, but with a mocked `_send()`.  Return the bridge and
+    an input end connected to it.
+    '''
+
+    session = mock.Mock()
+    session._to_destroy = list()
+
+    with mock.patch.object(Queue, '__init__', return_value=None):
+        bridge = Queue()
+
+    bridge._log         = mock.Mock()
+    bridge._stall_hwm   = bcfg.get('stall_hwm', 1)
+    bridge._bulk_size   = bcfg.get('bulk_size', 1)
+    bridge._stall_tout  = bcfg.get('stall_timeout', 0)
+    bridge._stalled     = list()
+    bridge._stall_t0    = None
+    bridge._passthrough = bridge._stall_hwm <= 1 and bridge._bulk_size <= 0
+    bridge._send        = mock.Mock(return_value=True)
+    bridge.is_alive     = mock.Mock(return_value=True)
+
+    bridge._ctx = zmq.Context()
+    bridge._in  = bridge._ctx.socket(zmq.PULL)
+    bridge._in.bind('tcp://127.0.0.1:*')
+
+    q_in = Queue(session, 'test_queue', QUEUE_INPUT, {'bridges': {}},
+                 addr=bridge._in.getsockopt(zmq.LAST_ENDPOINT))
+
+    return bridge, q_in
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown(bridge):
+
+    # bridges from `make_bridge()` are not running, and own their sockets in
+    # this process
+    if bridge._ctx:
+        bridge._in.close()
+        bridge._ctx.destroy()
+    else:
+        bridge.stop()
+
+
+# ------------------------------------------------------------------------------
+#
+def drain(outputs, n, timeout=5.0):
+    '''
+    Get messages from the given output ends in turn, until `n` messages are
+    received or `timeout` seconds passed, and return the messages per output.
+    '''
+
+    ret   = [list() for _ in outputs]
+    start = time.time()
+
+    while sum([len(msgs) for msgs in ret]) < n:
+
+        assert(time.time() - start < timeout), 'missing messages: %s' % ret
+
+        for idx, q_out in enumerate(outputs):
+            msg = q_out.get_nowait(10)
+            if msg is None:
+                continue
+            if not isinstance(msg, list):
+                msg = [msg]
+            ret[idx] += msg
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+# Test that pass-through bridges forward the raw frames, and drop flush messages
+def test_passthrough():
+
+    bridge, q_in = make_bridge({'stall_hwm': 1, 'bulk_size': 0})
+    assert(bridge._passthrough)
+
+    msgs = [{'uid': 'unit.0000'},
+            [{'uid': 'unit.0001'}, {'uid': 'unit.0002'}]]
+
+    q_in.put(msgs[0])
+    q_in.flush()
+    q_in.put(msgs[1])
+    time.sleep(0.1)
+
+    assert(bridge.work_cb())
+
+    # all available messages are sent in one go, as they were put
+    frames = bridge._send.call_args[0][0]
+    assert([f.bytes for f in frames] == [msgpack.packb(m) for m in msgs])
+    assert(_FLUSH_DATA not in [f.bytes for f in frames])
+
+    tearDown(bridge)
+
+    # a real bridge delivers the messages unchanged
+    bridge, q_in, output = setUp({'stall_hwm': 1, 'bulk_size': 0})
+    q_out = output()
+
+    q_in.put(msgs[0])
+    q_in.flush()
+    q_in.put(msgs[1])
+
+    assert([q_out.get(), q_out.get()] == msgs)
+    assert(q_out.get_nowait(100) is None)
+
+    tearDown(bridge)
+
+
+# ------------------------------------------------------------------------------
+# Test that a partial set of stalled messages is released after stall_timeout,
+# and that stalled messages are kept across work_cb invocations until then
+def test_stall_timeout():
+
+    bridge, q_in = make_bridge({'stall_hwm'    : 10,
+                                'bulk_size'    : 0,
+                                'stall_timeout': 0.5})
+    assert(not bridge._passthrough)
+
+    for n in range(3):
+        q_in.put({'uid': n})
+    time.sleep(0.1)
+
+    start = time.time()
+    assert(bridge.work_cb())
+    assert(not bridge._send.called)
+    assert(len(bridge._stalled) == 3)
+
+    q_in.put([{'uid': 3}, {'uid': 4}])
+    time.sleep(0.1)
+
+    assert(bridge.work_cb())
+    assert(not bridge._send.called)
+    assert(len(bridge._stalled) == 5)
+
+    # the next work_cb waits no longer than the deadline of the oldest message
+    while not bridge._send.called:
+        assert(bridge.work_cb())
+        assert(time.time() - start < 0.5 + 0.5)
+
+    assert(time.time() - start >= 0.5 - 0.1)
+    frames = bridge._send.call_args[0][0]
+    assert([msgpack.unpackb(f) for f in frames] ==
+           [[{'uid': n} for n in range(5)]])
+    assert(bridge._stalled == list())
+
+    tearDown(bridge)
+
+
+# ------------------------------------------------------------------------------
+# Test that a flush releases the stalled messages right away
+def test_stall_flush():
+
+    bridge, q_in = make_bridge({'stall_hwm': 10,
+                                'bulk_size': 2})
+
+    for n in range(3):
+        q_in.put({'uid': n})
+    time.sleep(0.1)
+
+    assert(bridge.work_cb())
+    assert(not bridge._send.called)
+
+    q_in.flush()
+    time.sleep(0.1)
+
+    assert(bridge.work_cb())
+    frames = bridge._send.call_args[0][0]
+    assert([msgpack.unpackb(f) for f in frames] ==
+           [[{'uid': 0}, {'uid': 1}], [{'uid': 2}]])
+    assert(bridge._stalled == list())
+
+    # without a timeout, nothing is released before the hwm is reached
+    bridge._send.reset_mock()
+    q_in.put({'uid': 3})
+    time.sleep(0.1)
+
+    assert(bridge.work_cb())
+    assert(not bridge._send.called)
+    assert(len(bridge._stalled) == 1)
+
+    tearDown(bridge)
+
+
+# ------------------------------------------------------------------------------
+# Test that competing consumers with credits are served round-robin
+def test_credits_fairness():
+
+    bridge, q_in, output = setUp({'stall_hwm': 1,
+                                  'bulk_size': 0,
+                                  'credits'  : 2})
+    outputs = [output(), output()]
+
+    # the first get announces the credits
+    for q_out in outputs:
+        assert(q_out.get_nowait(10) is None)
+    time.sleep(0.5)
+
+    for n in range(40):
+        q_in.put({'uid': n})
+
+    msgs = drain(outputs, 40)
+
+    assert(sorted([m['uid'] for m in msgs[0] + msgs[1]]) == range(40))
+
+    # both consumers got their share, and no message was delivered twice
+    assert(abs(len(msgs[0]) - len(msgs[1])) <= 2 * 2)
+
+    tearDown(bridge)
+
+
+# ------------------------------------------------------------------------------
+# Test that the credits of a consumer which went away are dropped, and that no
+# messages are lost to it
+def test_credits_exit():
+
+    bridge, q_in, output = setUp({'stall_hwm': 1,
+                                  'bulk_size': 0,
+                                  'credits'  : 4})
+    outputs = [output(), output()]
+
+    for q_out in outputs:
+        assert(q_out.get_nowait(10) is None)
+    time.sleep(0.5)
+
+    # the first consumer exits with all its credits outstanding
+    outputs[0].stop()
+    time.sleep(0.5)
+
+    for n in range(20):
+        q_in.put({'uid': n})
+
+    msgs = drain(outputs[1:], 20)
+    assert([m['uid'] for m in msgs[0]] == range(20))
+
+    tearDown(bridge)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,74 @@
+
+
+
+import time
+import logging
+import threading
+
+from radical.pilot.utils.reactor import Reactor
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    reactor = Reactor('test.reactor', logging.getLogger('test'),
+                      threading.RLock())
+    return reactor
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown(reactor):
+
+    reactor.stop()
+    assert(not reactor.is_alive(strict=False))
+
+
+# ------------------------------------------------------------------------------
+# Test that timed callbacks are invoked at their own intervals, and not after
+# they got removed
+def test_timers():
+
+    reactor = setUp()
+    calls   = {'fast': list(), 'slow': list()}
+
+    def fast():
+        calls['fast'].append(time.time())
+        return True
+
+    def slow(cb_data):
+        calls[cb_data].append(time.time())
+        return True
+
+    reactor.add_timer('fast', fast, None,   0.02)
+    reactor.add_timer('slow', slow, 'slow', 0.15)
+    time.sleep(0.5)
+
+    assert(reactor.remove_timer('fast'))
+    assert(not reactor.remove_timer('fast'))
+    n_fast = len(calls['fast'])
+    n_slow = len(calls['slow'])
+    time.sleep(0.1)
+
+    assert(len(calls['fast']) == n_fast)
+    assert(n_fast >= 15),      n_fast
+    assert(n_slow in [3, 4, 5]), n_slow
+
+    # intervals are not rounded to some internal polling period
+    deltas = [t1 - t0 for t0, t1 in zip(calls['fast'], calls['fast'][1:])]
+    assert(min(deltas) > 0.015),              deltas
+    assert(sum(deltas) / len(deltas) < 0.03), deltas
+
+    try:
+        reactor.add_timer('slow', slow, 'slow', 1.0)
+        assert(False), 'duplicate timer accepted'
+    except ValueError:
+        pass
+
+    tearDown(reactor)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,189 @@
+
+
+
+from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.continuous_fifo import ContinuousFifo
+from radical.pilot.agent.scheduler.policy     import OrderedPool
+
+from scheduler_utils import make_scheduler, make_unit
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    cfg = {'scheduler_policy' : 'backfill',
+           'lrms_info' : {'lm_info'        : 'INFO',
+                          'node_list'      : [['a', 1], ['b', 2]],
+                          'cores_per_node' : 4,
+                          'gpus_per_node'  : 0,
+                          'lfs_per_node'   : {'size': 0, 'path': None}}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test the order of the priority wait pool
+def test_ordered_pool():
+
+    pool  = OrderedPool()
+    units = [make_unit('unit.%04d' % i, 1, priority=i % 3) for i in range(6)]
+
+    for unit in units:
+        pool.add(unit)
+
+    assert([u['uid'] for u in pool.units()] ==
+           ['unit.0002', 'unit.0005', 'unit.0001', 'unit.0004',
+            'unit.0000', 'unit.0003'])
+    assert([u['uid'] for u in pool.units(2)] == ['unit.0002', 'unit.0005'])
+
+    pool.remove([units[2], units[4]])
+    assert(len(pool) == 4)
+    assert(pool.pop()['uid'] == 'unit.0005')
+    assert(pool.head()['uid'] == 'unit.0001')
+
+    # units are ordered by submission, not by arrival, and units without
+    # a submission sequence come last
+    pool  = OrderedPool(prioritized=False)
+    units = [make_unit('unit.%04d' % i, 1) for i in range(4)]
+    for i, unit in enumerate(units[:3]):
+        unit['submit_seq'] = i
+
+    for unit in [units[3], units[2], units[0], units[1]]:
+        pool.add(unit)
+
+    assert(pool.units() == units)
+
+    # units which are added again are not duplicated
+    pool.remove([units[0]])
+    pool.add(units[0])
+    assert(pool.units() == units)
+    assert(pool.pop() is units[0])
+    assert(pool.units() == units[1:])
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test EASY backfilling on the continuous scheduler
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'publish')
+def test_backfill(mocked_advance,
+                  mocked_publish):
+
+    cfg = setUp()
+
+    component = make_scheduler(Continuous, cfg)
+
+    # fill node a, and half of node b
+    running = [make_unit('unit.long.0', 4, runtime_estimate=100),
+               make_unit('unit.long.1', 2, runtime_estimate=100)]
+    component._schedule_units(running)
+    assert(all([u['slots'] for u in running]))
+
+    # the large MPI unit blocks and gets a reservation.  The unit without
+    # estimate would delay it, the short unit does not
+    large = make_unit('unit.large', 8, mpi=True)
+    other = make_unit('unit.other', 1)
+    short = make_unit('unit.short', 2, runtime_estimate=10)
+    component._schedule_units([large, other, short])
+
+    assert(not large['slots'])
+    assert(not other['slots'])
+    assert(short['slots'])
+    assert(len(component._wait_pool) == 2)
+
+    # once the long units are done, the large unit still waits for the short
+    # one - and the free cores are kept for it
+    component.unschedule_cb(None, running)
+    component.schedule_cb(None, running)
+
+    assert(not large['slots'])
+    assert(not other['slots'])
+
+    # once the short unit is done, the large unit is placed
+    component.unschedule_cb(None, short)
+    component.schedule_cb(None, [short])
+
+    assert(large['slots'])
+    assert(not other['slots'])
+    assert(component._wait_pool.units() == [other])
+
+    # a higher priority unit overtakes the waiting one
+    urgent = make_unit('unit.urgent', 1, priority=1)
+    component._schedule_units([urgent])
+    component.unschedule_cb(None, large)
+    component.schedule_cb(None, [large])
+
+    assert(urgent['slots'])
+    assert(other['slots'])
+    assert(not len(component._wait_pool))
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test strict FIFO order with arbitrary unit ids
+@mock.patch.object(ContinuousFifo, 'advance')
+@mock.patch.object(ContinuousFifo, 'publish')
+def test_fifo(mocked_advance,
+              mocked_publish):
+
+    component = make_scheduler(ContinuousFifo, setUp())
+
+    # fill node a, and most of node b
+    running = [make_unit('first', 4), make_unit('second', 3)]
+    component._schedule_units(running)
+    assert(all([u['slots'] for u in running]))
+
+    # the small unit would fit, but has to wait for the older large one
+    large = make_unit('large-unit', 4)
+    small = make_unit('small_unit', 1, priority=10)
+    component._schedule_units([large, small])
+
+    assert(not large['slots'])
+    assert(not small['slots'])
+    assert(component._wait_pool.units() == [large, small])
+
+    # once the large unit is placed, the small one follows
+    component.unschedule_cb(None, running[0])
+    component.schedule_cb(None, [running[0]])
+
+    assert(large['slots'])
+    assert(small['slots'])
+    assert(not len(component._wait_pool))
+
+    # units which arrive out of submission order are still placed in that
+    # order
+    late  = make_unit('late',  4)
+    early = make_unit('early', 4)
+    late['submit_seq']  = 2
+    early['submit_seq'] = 1
+    component._schedule_units([late, early])
+    assert(component._wait_pool.units() == [early, late])
+
+    component.unschedule_cb(None, running[1])
+    component.unschedule_cb(None, large)
+    component.schedule_cb(None, [large])
+
+    assert(early['slots'])
+    assert(not late['slots'])
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,126 @@
+
+
+
+import radical.pilot.states as rps
+
+from radical.pilot.agent.scheduler.continuous import Continuous
+
+from scheduler_utils import make_scheduler, make_unit
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    cfg = {'lrms_info' : {'lm_info'        : 'INFO',
+                          'node_list'      : [['a', 1], ['b', 2]],
+                          'cores_per_node' : 4,
+                          'gpus_per_node'  : 0,
+                          'lfs_per_node'   : {'size': 0, 'path': None}}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test that a bulk is placed in one pass, and that units of a shape which failed
+# in the same bulk are not attempted again
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'publish')
+def test_bulk(mocked_advance,
+              mocked_publish):
+
+    component = make_scheduler(Continuous, setUp())
+
+    tried    = list()
+    allocate = component._allocate_slot
+
+    def allocate_slot(cud):
+        tried.append(cud['cpu_processes'])
+        return allocate(cud)
+
+    component._allocate_slot = allocate_slot
+
+    units = [make_unit('unit.0000', 4),
+             make_unit('unit.0001', 2),
+             make_unit('unit.0002', 4),   # fails: no full node left
+             make_unit('unit.0003', 4),   # skipped
+             make_unit('unit.0004', 2),
+             make_unit('unit.0005', 1)]   # fails: all nodes full
+
+    # the descriptions are placed in one call, with `None` for failed ones
+    slots = component._allocate_slots([u['description'] for u in units])
+    assert(tried == [4, 2, 4, 2, 1])
+    assert([bool(s) for s in slots] == [True, True, False, False, True, False])
+    assert(slots[2] is None and slots[3] is None and slots[5] is None)
+    assert([s['nodes'][0]['uid'] for s in slots if s] == [1, 2, 2])
+
+    for s in slots:
+        if s:
+            component._release_slot(s)
+    assert(list(component._store.free_cores) == [4, 4])
+
+    # the same bulk through `_schedule_units()`: the placed units are pushed
+    # out in one advance call, the others wait
+    del(tried[:])
+    component._schedule_units(units)
+
+    assert(tried == [4, 2, 4, 2, 1])
+    assert(component._wait_pool.units() == [units[2], units[3], units[5]])
+
+    pushed = [c for c in component.advance.call_args_list
+                if c[0][1] == rps.AGENT_EXECUTING_PENDING]
+    assert(len(pushed) == 1)
+    assert(pushed[0][0][0] == [units[0], units[1], units[4]])
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test that bulks are split in front of units tagged to a unit of the same bulk
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'publish')
+def test_bulk_tags(mocked_advance,
+                   mocked_publish):
+
+    component = make_scheduler(Continuous, setUp())
+
+    bulks     = list()
+    allocate  = component._allocate_slots
+
+    def allocate_slots(cuds):
+        bulks.append(len(cuds))
+        return allocate(cuds)
+
+    component._allocate_slots = allocate_slots
+
+    units = [make_unit('unit.0000', 2),
+             make_unit('unit.0001', 4),
+             make_unit('unit.0002', 2, tag='unit.0000'),
+             make_unit('unit.0003', 1)]
+
+    placed, failed = component._try_allocations(units)
+
+    assert(bulks  == [2, 2])
+    assert(placed == units[:3])
+    assert(failed == units[3:])
+    assert(units[2]['slots']['nodes'][0]['uid'] ==
+           units[0]['slots']['nodes'][0]['uid'])
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
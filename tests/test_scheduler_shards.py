@@ -0,0 +1,224 @@
+
+
+import msgpack
+
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.hombre     import Hombre
+from radical.pilot.agent.scheduler.shard      import partition, ShardRouter
+from radical.pilot.agent.scheduler.shard      import shard_topic
+
+from scheduler_utils import make_scheduler, make_unit
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp(n_shards, routing, share=0.0):
+
+    cfg = {'count'                       : n_shards,
+           'scheduler_shard_routing'     : routing,
+           'scheduler_shard_coordinator' : share,
+           'lrms_info' : {'lm_info'        : 'INFO',
+                          'node_list'      : [['a', 1], ['b', 2],
+                                              ['c', 3], ['d', 4]],
+                          'cores_per_node' : 2,
+                          'gpus_per_node'  : 0,
+                          'lfs_per_node'   : {'size': 0, 'path': None}}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+#
+def make_shards(cfg):
+    '''
+    Create one scheduler per shard, and connect their publishers to the
+    subscribers of all shards which subscribed to the message's topic
+    (subscribers get lists delivered element-wise).  The messages received by
+    each shard are recorded in its `received` list.
+    '''
+
+    shards = list()
+
+    def bus(pubsub, msg, topic=None):
+        for shard in shards:
+            cb, topics = {
+                rpc.AGENT_SCHEDULE_PUBSUB  : (shard.schedule_cb,
+                    [shard._topic(rpc.AGENT_SCHEDULE_PUBSUB, shard._shard),
+                     shard_topic(rpc.AGENT_SCHEDULE_PUBSUB)]),
+                rpc.AGENT_UNSCHEDULE_PUBSUB: (shard.unschedule_cb,
+                    [shard._topic(rpc.AGENT_UNSCHEDULE_PUBSUB, shard._shard)])
+                }[pubsub]
+            if not [t for t in topics if (topic or pubsub).startswith(t)]:
+                continue
+            for m in (msg if isinstance(msg, list) else [msg]):
+                shard.received.append([pubsub, m])
+                cb(pubsub, m)
+
+    for number in range(cfg['count']):
+
+        component = make_scheduler(Continuous, dict(cfg, number=number),
+                                   publish=bus, received=list())
+        shards.append(component)
+
+    return shards
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test the node partitioning
+def test_partition():
+
+    nodes = range(10)
+
+    assert(partition(nodes, 1, 0) == nodes)
+    assert([partition(nodes, 3, i) for i in range(3)] ==
+           [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]])
+
+    # the coordinator can own a larger share of the nodes
+    assert([partition(nodes, 3, i, 0.6) for i in range(3)] ==
+           [[0, 1, 2, 3, 4, 5], [6, 7], [8, 9]])
+
+    # the router sends tagged units to the shard of the tag
+    router = ShardRouter(3, 0)
+    unit   = make_unit('unit.0000', 1)
+    tagged = make_unit('unit.0001', 1)
+    tagged['description']['tag'] = 'unit.0000'
+    assert(router.route(unit) == router.route(tagged))
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test hash routing, escalation and release over two shards
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'register_timed_cb')
+def test_shards_hash(mocked_advance,
+                     mocked_timed_cb):
+
+    # the coordinator owns 3 nodes, the other shard 1 node
+    shards = make_shards(setUp(2, 'hash', 0.75))
+    owned  = [set([n['uid'] for n in shard.nodes]) for shard in shards]
+    assert(owned == [set([1, 2, 3]), set([4])])
+
+    # a 6-core MPI unit arriving at the small shard is escalated
+    big = make_unit('unit.big', 6, mpi=True)
+    shards[1]._schedule_units([big])
+    assert(big['slots']['shard'] == 0)
+    assert(sum(shards[0]._store.free_cores) == 0)
+
+    # small units are routed by hash - they fit on the small shard only
+    units = [make_unit('unit.%04d' % i, 1) for i in range(8)]
+    shards[0]._schedule_units(units)
+
+    for unit in units:
+        target = shards[0]._router.route(unit)
+        if target == 1:
+            assert((unit['slots'] and unit['slots']['shard'] == 1) or
+                   unit in shards[1]._wait_pool.units())
+        else:
+            assert(unit in shards[0]._wait_pool.units())
+
+    # releasing the big unit only touches the coordinator, and places the
+    # small units waiting there
+    waiting = len(shards[0]._wait_pool)
+    shards[1].publish(rpc.AGENT_UNSCHEDULE_PUBSUB, big,
+                      topic=shard_topic(rpc.AGENT_UNSCHEDULE_PUBSUB, 0))
+    assert(len(shards[0]._wait_pool) == max(0, waiting - 6))
+    assert(sum(shards[1]._store.free_cores) == 0)
+
+    # each shard only received the units routed to it, and its own releases
+    for shard in shards:
+        for pubsub, msg in shard.received:
+            if isinstance(msg, dict) and msg.get('cmd') == 'route':
+                assert(msg['shard'] == shard._shard)
+            else:
+                for unit in (msg if isinstance(msg, list) else [msg]):
+                    assert(shard._owns(unit))
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test capacity routing over two shards
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'register_timed_cb')
+def test_shards_capacity(mocked_advance,
+                         mocked_timed_cb):
+
+    shards = make_shards(setUp(2, 'capacity'))
+
+    # shard 1 tells shard 0 about its free cores
+    shards[1]._shard_hint_cb()
+
+    # all units arrive at shard 0, which forwards what it cannot place
+    units = [make_unit('unit.%04d' % i, 1) for i in range(8)]
+    extra = make_unit('unit.extra', 1)
+
+    # in delta mode, shard 0 holds snapshots of the units it received
+    shards[0]._unit_store = mock.Mock()
+    shards[0]._snapshots  = dict([[u['uid'], msgpack.packb(u)]
+                                  for u in units + [extra]])
+
+    shards[0]._schedule_units(units)
+
+    assert([u['slots']['shard'] for u in units] == [0] * 4 + [1] * 4)
+    assert(not len(shards[0]._wait_pool))
+    assert(not len(shards[1]._wait_pool))
+
+    # the snapshots of forwarded units are dropped
+    assert(sorted(shards[0]._snapshots.keys()) ==
+           sorted([u['uid'] for u in units[:4] + [extra]]))
+
+    # hints are not checked against an empty wait pool
+    with mock.patch.object(shards[0]._wait_pool, 'shapes') as shapes:
+        shards[1]._shard_hint_cb()
+        assert(not shapes.called)
+
+    # no capacity left: further units wait on the shard which receives them
+    shards[0]._schedule_units([extra])
+    assert(extra in shards[0]._wait_pool.units())
+
+    # once shard 1 frees resources and says so, the waiting unit moves over
+    shards[0].publish(rpc.AGENT_UNSCHEDULE_PUBSUB, units[-1],
+                      topic=shard_topic(rpc.AGENT_UNSCHEDULE_PUBSUB, 1))
+    shards[1]._shard_hint_cb()
+    assert(not len(shards[0]._wait_pool))
+    assert(extra['slots']['shard'] == 1)
+    assert('unit.extra' not in shards[0]._snapshots)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test that schedulers which don't maintain the node store can't be sharded
+def test_shards_no_store():
+
+    try:
+        make_scheduler(Hombre, dict(setUp(2, 'capacity'), number=1))
+        assert(False), 'sharded scheduler without node store accepted'
+    except ValueError:
+        pass
+
+    # a single instance is fine
+    cfg = dict(setUp(1, 'capacity'), number=0)
+    assert(make_scheduler(Hombre, cfg)._router is None)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,122 @@
+
+
+import random
+
+from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.stats      import Histogram
+from radical.pilot.agent.scheduler.stats      import stats2str, str2stats
+
+from scheduler_utils import make_scheduler, make_unit
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    cfg = {'scheduler_stats_interval' : 10.0,
+           'lrms_info' : {'lm_info'        : 'INFO',
+                          'node_list'      : [['a', 1], ['b', 2]],
+                          'cores_per_node' : 4,
+                          'gpus_per_node'  : 0,
+                          'lfs_per_node'   : {'size': 0, 'path': None}}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test histogram quantiles and the profile serialization of summaries
+def test_histogram():
+
+    rng    = random.Random(42)
+    values = [rng.expovariate(1000.0) for _ in range(10000)]
+
+    hist = Histogram()
+    for value in values:
+        hist.record(value)
+
+    values.sort()
+    for q in [0.5, 0.9, 0.99]:
+        exact = values[int(q * len(values)) - 1]
+        assert(exact <= hist.quantile(q) <= exact * 1.25)
+
+    summary = hist.summary()
+    assert(summary['n']   == len(values))
+    assert(summary['max'] == values[-1])
+
+    assert(str2stats(stats2str('allocate', summary)) == ('allocate', summary))
+    assert(Histogram().summary() == {'n': 0})
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test the scheduler instrumentation on the continuous scheduler
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'publish')
+@mock.patch.object(Continuous, 'register_timed_cb')
+def test_scheduler_stats(mocked_advance,
+                         mocked_publish,
+                         mocked_timed_cb):
+
+    cfg = setUp()
+
+    component = make_scheduler(Continuous, cfg)
+
+    stats = component._stats
+    assert(stats)
+
+    # the first two units fit, the third one has to wait
+    units = [make_unit('unit.%04d' % i, 3) for i in range(3)]
+    component._schedule_units(units)
+
+    assert(stats.hists['allocate'].n      == 3)
+    assert(stats.hists['scanned'].max     == 1)
+    assert(stats.hists['wait_pool'].max   == 1)
+
+    # free cores on partially used nodes: one on each node
+    component._stats_cb()
+    assert(stats.hists['fragmentation'].max == 2)
+
+    # releasing the first unit places the waiting one
+    component.unschedule_cb(None, units[0])
+    component.schedule_cb(None, [units[0]])
+
+    assert(stats.hists['release'].n   == 1)
+    assert(stats.hists['wait_time'].n == 1)
+    assert(stats.hists['wait_pool'].min == 0)
+    assert(units[2]['slots'])
+
+    # the stats are emitted as one profile event per metric
+    component._prof.reset_mock()
+    component._stats_cb()
+    events = [c[1]['msg'] for c in component._prof.prof.call_args_list]
+    names  = sorted([str2stats(msg)[0] for msg in events])
+    assert(names == sorted(stats.hists.keys()))
+
+    # schedulers which don't maintain the node store report no fragmentation
+    component._uses_store = False
+    component._prof.reset_mock()
+    component._stats_cb()
+    events = [c[1]['msg'] for c in component._prof.prof.call_args_list]
+    names  = [str2stats(msg)[0] for msg in events]
+    assert('fragmentation' not in names)
+    assert(len(names) == len(stats.hists) - 1)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,119 @@
+
+
+
+import os
+import shutil
+import tempfile
+
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.rm.base              import LRMS
+from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.topology   import Topology
+
+from scheduler_utils import make_scheduler, make_cud
+
+
+# two sockets with one NUMA domain and one gpu each, cores interleaved
+TOPOLOGY = [{'socket': 0, 'cores': [0, 2, 4, 6], 'gpus': [0]},
+            {'socket': 1, 'cores': [1, 3, 5, 7], 'gpus': [1]}]
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    cfg = {'lrms_info' : {'lm_info'        : 'INFO',
+                          'node_list'      : [['a', 1]],
+                          'cores_per_node' : 8,
+                          'gpus_per_node'  : 2,
+                          'lfs_per_node'   : {'size': 0, 'path': None},
+                          'node_topology'  : TOPOLOGY}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown(tmp=None):
+
+    if tmp:
+        shutil.rmtree(tmp)
+
+
+# ------------------------------------------------------------------------------
+# Test reading the topology from a sysfs tree
+def test_sysfs_topology():
+
+    tmp = tempfile.mkdtemp()
+
+    def write(path, content):
+        path = os.path.join(tmp, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fout:
+            fout.write(content + '\n')
+
+    write('devices/system/node/node0/cpulist', '0-1,4-5')
+    write('devices/system/node/node1/cpulist', '2-3,6-7')
+    for cpu in range(8):
+        write('devices/system/cpu/cpu%d/topology/physical_package_id' % cpu,
+              str(cpu / 2 % 2))
+
+    write('bus/pci/devices/0000:04:00.0/vendor',    '0x10de')
+    write('bus/pci/devices/0000:04:00.0/class',     '0x030200')
+    write('bus/pci/devices/0000:04:00.0/numa_node', '1')
+    write('bus/pci/devices/0000:05:00.0/vendor',    '0x8086')
+    write('bus/pci/devices/0000:05:00.0/class',     '0x020000')
+    write('bus/pci/devices/0000:05:00.0/numa_node', '0')
+
+    lrms = LRMS.__new__(LRMS)
+    assert(lrms._read_sysfs_topology(tmp) ==
+           [{'socket': 0, 'cores': [0, 1, 4, 5], 'gpus': []},
+            {'socket': 1, 'cores': [2, 3, 6, 7], 'gpus': [0]}])
+
+    tearDown(tmp)
+
+
+# ------------------------------------------------------------------------------
+# Test NUMA aware placement on the continuous scheduler
+def test_topology():
+
+    cfg = setUp()
+
+    component = make_scheduler(Continuous, cfg)
+
+    assert(isinstance(component._topology, Topology))
+
+    # a process crossing domains is a locality violation
+    topology = component._topology
+    cores, split = topology.find_cores(bytearray([rpc.FREE]) * 8, 1, 6)
+    assert(len(cores) == 6 and split == 1)
+
+    # each process gets its cores within one domain, and the gpu comes from
+    # the socket of the cores
+    slots_a = component._allocate_slot(make_cud(1, 4, gpus=1))
+    node    = slots_a['nodes'][0]
+    assert(node['core_map'] == [[0, 2, 4, 6]])
+    assert(node['gpu_map']  == [[0]])
+    assert(node['locality'] == {'split': 0, 'remote': 0})
+
+    slots_b = component._allocate_slot(make_cud(1, 2, gpus=1))
+    node    = slots_b['nodes'][0]
+    assert(node['core_map'] == [[1, 3]])
+    assert(node['gpu_map']  == [[1]])
+    assert(node['locality'] == {'split': 0, 'remote': 0})
+
+    # the smallest domain which fits is used, even if its gpu is taken
+    component._release_slot(slots_a)
+    slots_c = component._allocate_slot(make_cud(1, 2, gpus=1))
+    node    = slots_c['nodes'][0]
+    assert(node['core_map'] == [[5, 7]])
+    assert(node['gpu_map']  == [[0]])
+    assert(node['locality'] == {'split': 0, 'remote': 1})
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
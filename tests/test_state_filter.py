@@ -0,0 +1,57 @@
+
+
+
+from radical.pilot.utils.pubsub import StateFilter
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    msg = {'cmd': 'update',
+           'arg': [{'uid': 'unit.0000',  'type': 'unit',  'state': 'EXECUTING'},
+                   {'uid': 'pilot.0000', 'type': 'pilot', 'state': 'DONE'     },
+                   {'uid': 'unit.0001',  'type': 'unit',  'state': 'NEW'      },
+                   {'uid': 'unit.0000',  'type': 'unit',  'state': 'DONE'     }]}
+    return msg
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test filtering of state updates by type, state and last state
+def test_state_filter():
+
+    msg = setUp()
+
+    # no filter criteria: the message passes unchanged
+    assert(StateFilter().apply(msg) is msg)
+
+    ret = StateFilter(types=['unit']).apply(msg)
+    assert([t['uid'] for t in ret['arg']] == ['unit.0000', 'unit.0001',
+                                              'unit.0000'])
+
+    ret = StateFilter(states=['DONE']).apply(msg)
+    assert([t['uid'] for t in ret['arg']] == ['pilot.0000', 'unit.0000'])
+
+    ret = StateFilter(types=['unit'], last=True).apply(msg)
+    assert([t['state'] for t in ret['arg']] == ['NEW', 'DONE'])
+
+    # nothing left to deliver
+    assert(StateFilter(types=['umgr']).apply(msg) is None)
+
+    # other commands are not filtered
+    assert(StateFilter(types=['umgr']).apply({'cmd': 'cancel'})
+           == {'cmd': 'cancel'})
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
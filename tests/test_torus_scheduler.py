@@ -0,0 +1,199 @@
+
+
+import os
+import sys
+import random
+
+import radical.utils           as ru
+import radical.pilot           as rp
+import radical.pilot.constants as rpc
+
+from radical.pilot.agent.scheduler.torus import Torus
+from radical.pilot.agent.scheduler.buddy import BuddyAllocator
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# Sample data to be staged -- available in cwd
+cur_dir = os.path.dirname(os.path.abspath(__file__))
+
+# the synthetic torus blocks are shared with the scheduler benchmarks
+sys.path.insert(0, '%s/bench_scheduler' % cur_dir)
+from fake_lrms import FakeTorusLRMS
+
+from scheduler_utils import make_scheduler
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp(n_nodes):
+
+    lrms   = FakeTorusLRMS(n_nodes)
+    config = {'lrms_info' : lrms.lrms_info}
+
+    return config, lrms
+
+
+# ------------------------------------------------------------------------------
+#
+def cud_torus(n_nodes):
+
+    return {'cpu_process_type' : rpc.MPI,
+            'cpu_thread_type'  : None,
+            'cpu_processes'    : n_nodes * FakeTorusLRMS.BGQ_CORES_PER_NODE,
+            'cpu_threads'      : 1,
+
+            'gpu_process_type' : None,
+            'gpu_thread_type'  : None,
+            'gpu_processes'    : 0,
+            'gpu_threads'      : 1}
+
+
+# ------------------------------------------------------------------------------
+#
+def make_component(n_nodes):
+
+    cfg, lrms = setUp(n_nodes)
+
+    component = make_scheduler(Torus, cfg, _lrms=lrms)
+
+    return component
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test the buddy allocator on its own
+def test_buddy_allocator():
+
+    buddy = BuddyAllocator(16, [1, 2, 4, 8])
+
+    # blocks are handed out lowest offset first, and split as needed
+    assert(buddy.alloc(1) == 0)
+    assert(buddy.alloc(2) == 2)
+    assert(buddy.alloc(1) == 1)
+    assert(buddy.alloc(8) == 8)
+    assert(buddy.alloc(8) is None)
+    assert(buddy.n_free == 4)
+
+    # releasing merges buddies back into larger blocks
+    buddy.free(1, 1)
+    buddy.free(0, 1)
+    buddy.free(2, 2)
+    assert(buddy.n_free == 8)
+    assert(buddy.alloc(8) == 0)
+
+    # block sizes are rounded up to the supported sizes
+    assert(buddy.fit(3) == 4)
+    assert(buddy.fit(9) is None)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test sub-block allocation on a synthetic torus block
+@mock.patch.object(Torus, 'advance')
+@mock.patch.object(ru.Profiler, 'prof')
+@mock.patch('radical.utils.raise_on')
+def test_torus_scheduler(mocked_method,
+                         mocked_profiler,
+                         mocked_raise_on):
+
+    component = make_component(32)
+    block     = component._lrms.torus_block
+
+    # a single node lands on the block corner
+    slot = component._allocate_slot(cud_torus(1))
+    assert(slot['corner_node']         == block[0][Torus.TORUS_BLOCK_NAME])
+    assert(slot['sub_block_shape_str'] == '1x1x1x1x1')
+    assert(slot['cores_per_node']      == FakeTorusLRMS.BGQ_CORES_PER_NODE)
+
+    # a 16 node sub-block can't use the first half anymore
+    big = component._allocate_slot(cud_torus(16))
+    assert(big['corner_node'] == block[16][Torus.TORUS_BLOCK_NAME])
+    assert(component._allocate_slot(cud_torus(16)) is None)
+
+    # 3 nodes are rounded up to 4
+    slot2 = component._allocate_slot(cud_torus(3))
+    assert(slot2['corner_node'] == block[4][Torus.TORUS_BLOCK_NAME])
+    assert(component._buddy.n_free == 32 - 1 - 16 - 4)
+
+    # after release, the first half merges back into one sub-block
+    component._release_slot(slot)
+    component._release_slot(slot2)
+    slot = component._allocate_slot(cud_torus(16))
+    assert(slot['corner_node'] == block[0][Torus.TORUS_BLOCK_NAME])
+
+    status = [e[Torus.TORUS_BLOCK_STATUS] for e in block]
+    assert(status == [rpc.BUSY] * 32)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Run random allocations and releases on synthetic torus blocks of different
+# sizes, and check that sub-blocks never overlap and merge back completely
+@mock.patch.object(Torus, 'advance')
+@mock.patch.object(ru.Profiler, 'prof')
+@mock.patch('radical.utils.raise_on')
+def test_torus_scheduler_churn(mocked_method,
+                               mocked_profiler,
+                               mocked_raise_on):
+
+    rng = random.Random(42)
+
+    for n_nodes in [1, 8, 64, 512, 2048]:
+
+        component = make_component(n_nodes)
+        block     = component._lrms.torus_block
+        sizes     = [s for s in [1, 2, 4, 8, 16, 32]
+                       if s in component._lrms.shape_table]
+        running   = list()
+
+        for _ in range(4 * n_nodes):
+
+            if running and rng.random() < 0.4:
+                slot = running.pop(rng.randrange(len(running)))
+                component._release_slot(slot)
+                continue
+
+            size = rng.choice(sizes)
+            slot = component._allocate_slot(cud_torus(size))
+            if not slot:
+                continue
+
+            offset = component._offsets[slot['corner_node']]
+            assert(offset % size == 0)
+            running.append(slot)
+
+            busy = len([e for e in block
+                        if e[Torus.TORUS_BLOCK_STATUS] == rpc.BUSY])
+            assert(busy == n_nodes - component._buddy.n_free)
+
+        for slot in running:
+            component._release_slot(slot)
+
+        assert(component._buddy.n_free == n_nodes)
+        for e in block:
+            assert(e[Torus.TORUS_BLOCK_STATUS] == rpc.FREE)
+
+        # all sub-blocks merged back: the largest sub-blocks are available
+        largest = max(component._lrms.shape_table)
+        for _ in range(n_nodes / largest):
+            assert(component._allocate_slot(cud_torus(largest)))
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,294 @@
+
+
+
+import zmq
+import msgpack
+import threading
+
+import radical.pilot.states      as rps
+import radical.pilot.utils.store as rpu_store
+
+from radical.pilot.utils.component import Component
+from radical.pilot.utils.store     import Store, _InprocStore
+from radical.pilot.utils.store import STORE_BRIDGE, STORE_CLIENT
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    # the store ends only need a logger and a list of contexts to destroy from
+    # the session
+    session = mock.Mock()
+    session._to_destroy = list()
+
+    return session
+
+
+# ------------------------------------------------------------------------------
+#
+def make_component(session, bridge, workers=None):
+    '''
+    Create a component which uses the given store bridge, without starting it.
+    Its state updates are not published.
+    '''
+
+    with mock.patch.object(Component, '__init__', return_value=None):
+        component = Component(cfg=dict(), session=None)
+
+    component._log         = mock.Mock()
+    component._prof        = mock.Mock()
+    component.is_valid     = mock.Mock()
+    component.publish      = mock.Mock()
+    component._cancel_list = list()
+    component._cancel_lock = threading.RLock()
+    component._cb_lock     = threading.RLock()
+    component._workers     = workers or dict()
+    component._inputs      = {'input': {'states': (workers or dict()).keys()}}
+    component._unit_store  = Store(session, 'test_store', STORE_CLIENT, dict(),
+                                   addr=str(bridge.addr_in))
+    component._snapshots   = dict()
+
+    return component
+
+
+# ------------------------------------------------------------------------------
+#
+def make_unit(uid):
+
+    return {'uid'         : uid,
+            'type'        : 'unit',
+            'state'       : rps.AGENT_STAGING_INPUT,
+            'description' : {'executable': '/bin/date'},
+            'stdout'      : 'x' * 1024}
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown(session):
+
+    for ctx in session._to_destroy:
+        ctx.destroy(linger=0)
+
+
+# ------------------------------------------------------------------------------
+# Test the in-process store
+def test_inproc_store():
+
+    store = _InprocStore('test.store')
+    units = [{'uid': 'unit.0000', 'state': 'NEW'},
+             {'uid': 'unit.0001', 'state': 'NEW'}]
+
+    store.request('put', [[u['uid'], msgpack.packb(u)] for u in units])
+
+    raw = store.request('get', ['unit.0001', 'unit.0002', 'unit.0000'])
+    assert(raw[1] is None)
+    assert([msgpack.unpackb(data) for data in [raw[2], raw[0]]] == units)
+
+    store.request('delete', ['unit.0000', 'unit.0002'])
+    assert(store.request('get', ['unit.0000']) == [None])
+
+    try:
+        store.request('update', [])
+        assert(False), 'invalid command accepted'
+    except ValueError:
+        pass
+
+    store.close()
+
+
+# ------------------------------------------------------------------------------
+# Test a client against a store bridge
+def test_store():
+
+    session = setUp()
+
+    bridge = Store(session, 'test_store', STORE_BRIDGE, dict())
+    client = Store(session, 'test_store', STORE_CLIENT, dict(),
+                   addr=str(bridge.addr_in))
+
+    units = [{'uid': 'unit.0000', 'description': {'executable': '/bin/date'}},
+             {'uid': 'unit.0001', 'description': {'executable': '/bin/true'}}]
+
+    client.put(units)
+    assert(client.get(['unit.0001', 'unit.0000']) == units[::-1])
+    assert(client.get_raw(['unit.0002']) == [None])
+
+    # things are replaced as a whole
+    client.put([{'uid': 'unit.0000', 'state': 'DONE'}])
+    assert(client.get(['unit.0000']) == [{'uid': 'unit.0000', 'state': 'DONE'}])
+
+    client.delete(['unit.0000', 'unit.0002'])
+    assert(client.get(['unit.0000', 'unit.0001']) == [None, units[1]])
+
+    # errors in the bridge are raised in the client
+    try:
+        client._request('update', [])
+        assert(False), 'invalid command accepted'
+    except RuntimeError:
+        pass
+    assert(client.get(['unit.0001']) == [units[1]])
+
+    bridge.stop()
+    tearDown(session)
+
+
+# ------------------------------------------------------------------------------
+# Test that units are passed between components as deltas against the unit
+# store, and that units which are not passed on are released
+def test_store_delta():
+
+    session = setUp()
+    bridge  = Store(session, 'test_store', STORE_BRIDGE, {'transport': 'inproc'})
+    comp_a  = make_component(session, bridge)
+    comp_b  = make_component(session, bridge)
+    store   = comp_a._unit_store
+
+    # units which were not fetched from the store are stored in full, and
+    # passed on as stubs.  Other things are passed on as they are.
+    unit  = make_unit('unit.0000')
+    pilot = {'uid': 'pilot.0000', 'type': 'pilot', 'state': rps.PMGR_ACTIVE}
+    stubs = comp_a._store_encode([unit, pilot])
+
+    assert(stubs[0] == {'uid'    : 'unit.0000', 'type': 'unit',
+                        'state'  : rps.AGENT_STAGING_INPUT,
+                        '$stored': True})
+    assert(stubs[1] is pilot)
+    assert(store.get(['unit.0000']) == [unit])
+
+    # the receiving component gets the complete unit, and keeps a snapshot as
+    # fetched from the store, which changes to the unit don't affect
+    units = comp_b._store_decode(stubs)
+    assert(units == [unit, pilot])
+    assert(comp_b._snapshots.keys() == ['unit.0000'])
+    assert(comp_b._snapshots['unit.0000'] == store.get_raw(['unit.0000'])[0])
+
+    # only changed and removed fields are passed on
+    units[0]['state'] = rps.AGENT_SCHEDULING_PENDING
+    units[0]['slots'] = {'nodes': []}
+    del(units[0]['stdout'])
+
+    stubs = comp_b._store_encode(units[:1])
+    assert(stubs == [{'uid'    : 'unit.0000', 'type': 'unit',
+                      'state'  : rps.AGENT_SCHEDULING_PENDING,
+                      'slots'  : {'nodes': []},
+                      '$unset' : ['stdout'],
+                      '$stored': True}])
+    assert(comp_b._snapshots == dict())
+
+    # the next component gets the changed unit.  A unit missing from the store
+    # is passed on as it was received.
+    stubs.append({'uid': 'unit.0001', 'type': 'unit', 'state': 'X',
+                  '$stored': True})
+
+    units = comp_a._store_decode(stubs)
+    assert(units[0] == {'uid'         : 'unit.0000',
+                        'type'        : 'unit',
+                        'state'       : rps.AGENT_SCHEDULING_PENDING,
+                        'description' : {'executable': '/bin/date'},
+                        'slots'       : {'nodes': []}})
+    assert(units[1] == {'uid': 'unit.0001', 'type': 'unit', 'state': 'X'})
+    assert(comp_a._snapshots.keys() == ['unit.0000'])
+
+    # units in final states are removed from the store
+    comp_a.advance(units[:1], rps.DONE, publish=True, push=True)
+    assert(comp_a._snapshots == dict())
+    assert(store.get(['unit.0000']) == [None])
+
+    # units passed on by other means are stored again by their next component
+    comp_a._store_decode(comp_b._store_encode([make_unit('unit.0002')]))
+    comp_a._store_forget([{'uid': 'unit.0002'}])
+    assert(comp_a._snapshots == dict())
+    assert(store.get_raw(['unit.0002']) != [None])
+
+    bridge.stop()
+    tearDown(session)
+
+
+# ------------------------------------------------------------------------------
+# Test that units which fail in a worker or are canceled are released
+def test_store_work_on():
+
+    session = setUp()
+    bridge  = Store(session, 'test_store', STORE_BRIDGE, {'transport': 'inproc'})
+    worker  = mock.Mock()
+    comp_a  = make_component(session, bridge)
+    comp_b  = make_component(session, bridge,
+                             {rps.AGENT_STAGING_INPUT: worker})
+    store   = comp_a._unit_store
+    units   = [make_unit('unit.%04d' % i) for i in range(3)]
+
+    # canceled units are not passed to the worker
+    comp_b._cancel_list.append('unit.0001')
+    comp_b._work_on('input', comp_a._store_encode(units))
+
+    worker.assert_called_once()
+    assert([u['uid'] for u in worker.call_args[0][0]] ==
+           ['unit.0000', 'unit.0002'])
+    assert(sorted(comp_b._snapshots.keys()) == ['unit.0000', 'unit.0002'])
+    assert(store.get_raw(['unit.0001']) == [None])
+
+    # units of a failed worker are released
+    worker.side_effect = RuntimeError('oops')
+    comp_b._snapshots = dict()
+    comp_b._work_on('input', comp_a._store_encode(units[:1]))
+
+    assert(comp_b._snapshots == dict())
+    assert(store.get_raw(['unit.0000']) == [None])
+    assert(store.get_raw(['unit.0002']) != [None])
+
+    bridge.stop()
+    tearDown(session)
+
+
+# ------------------------------------------------------------------------------
+# Test that a client can send requests again after a request timed out
+@mock.patch.object(rpu_store, '_REQUEST_TIMEOUT', 0.2)
+def test_store_timeout():
+
+    session = setUp()
+
+    # a bridge which does not reply to the first request
+    ctx    = zmq.Context()
+    bridge = ctx.socket(zmq.ROUTER)
+    port   = bridge.bind_to_random_port('tcp://127.0.0.1')
+    client = Store(session, 'test_store', STORE_CLIENT, dict(),
+                   addr='tcp://127.0.0.1:%d' % port)
+
+    try:
+        client.get(['unit.0000'])
+        assert(False), 'no timeout'
+    except RuntimeError:
+        pass
+
+    ident, empty, data = bridge.recv_multipart()
+    assert(msgpack.unpackb(data) == {'cmd': 'get', 'arg': ['unit.0000']})
+
+    # the late reply is not received by the next request
+    bridge.send_multipart([ident, empty, msgpack.packb({'res': ['late']})])
+
+    def reply():
+        ident, empty, data = bridge.recv_multipart()
+        assert(msgpack.unpackb(data)['arg'] == ['unit.0001'])
+        bridge.send_multipart([ident, empty, msgpack.packb({'res': [None]})])
+
+    thread = threading.Thread(target=reply)
+    thread.daemon = True
+    thread.start()
+    assert(client.get_raw(['unit.0001']) == [None])
+    thread.join()
+
+    bridge.close()
+    ctx.destroy(linger=0)
+    tearDown(session)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,154 @@
+
+
+
+from radical.pilot.agent.scheduler.continuous import Continuous
+from radical.pilot.agent.scheduler.wait_pool  import WaitPool, unit_shape
+
+from scheduler_utils import make_scheduler, make_unit
+
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+# Setup for every test
+def setUp():
+
+    cfg = {'lrms_info' : {'lm_info'        : 'INFO',
+                          'node_list'      : [['a', 1], ['b', 2]],
+                          'cores_per_node' : 4,
+                          'gpus_per_node'  : 0,
+                          'lfs_per_node'   : {'size': 0, 'path': None}}}
+    return cfg
+
+
+# ------------------------------------------------------------------------------
+# Cleanup any folders and files to leave the system state
+# as prior to the test
+def tearDown():
+
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Test the arrival order over shape buckets, and the removal of units
+def test_wait_pool():
+
+    pool  = WaitPool()
+    units = [make_unit('unit.0000', 1),
+             make_unit('unit.0001', 2),
+             make_unit('unit.0002', 1),
+             make_unit('unit.0003', 2, mpi=True),
+             make_unit('unit.0004', 2),
+             make_unit('unit.0005', 1)]
+
+    for unit in units:
+        pool.add(unit)
+
+    assert(len(pool) == 6)
+    assert(pool.shapes() == [unit_shape(units[0]['description']),
+                             unit_shape(units[1]['description']),
+                             unit_shape(units[3]['description'])])
+
+    # units of different shapes keep their overall arrival order
+    assert([u['uid'] for u in pool.units()] ==
+           ['unit.0000', 'unit.0001', 'unit.0002',
+            'unit.0003', 'unit.0004', 'unit.0005'])
+
+    # each bucket is a FIFO
+    shape = pool.shapes()[0]
+    assert(pool.count(shape) == 3)
+    assert(pool.head(shape) is units[0])
+    assert(pool.pop(shape)  is units[0])
+    assert(pool.head(shape) is units[2])
+
+    # removing units drops emptied buckets, and keeps the order of the rest
+    pool.remove([units[3], units[2], units[4]])
+    assert(len(pool) == 2)
+    assert(len(pool.shapes()) == 2)
+    assert([u['uid'] for u in pool.units()] == ['unit.0001', 'unit.0005'])
+
+    # units which are not in the pool are ignored
+    pool.remove([units[3], make_unit('unit.0006', 3)])
+    assert(len(pool) == 2)
+
+    pool.pop(pool.shapes()[0])
+    pool.pop(pool.shapes()[0])
+    assert(len(pool) == 0)
+    assert(pool.shapes() == [])
+    assert(pool.head(shape) is None)
+    assert(pool.count(shape) == 0)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+# Test that only waiting units which can fit into the freed resources are tried
+# when resources are released
+@mock.patch.object(Continuous, 'advance')
+@mock.patch.object(Continuous, 'publish')
+def test_freed_capacity(mocked_advance,
+                        mocked_publish):
+
+    component = make_scheduler(Continuous, setUp())
+
+    # two units share node a, one unit fills node b
+    running = [make_unit('unit.run.0', 2),
+               make_unit('unit.run.1', 2),
+               make_unit('unit.run.2', 4)]
+    component._schedule_units(running)
+    assert(all([u['slots'] for u in running]))
+
+    # nothing fits anymore
+    waiting = [make_unit('unit.wait.0', 3),
+               make_unit('unit.wait.1', 4, mpi=True),
+               make_unit('unit.wait.2', 1),
+               make_unit('unit.wait.3', 3)]
+    component._schedule_units(waiting)
+    assert(len(component._wait_pool) == 4)
+
+    tried = list()
+    allocate = component._try_allocation
+
+    def try_allocation(unit):
+        tried.append(unit['uid'])
+        return allocate(unit)
+
+    component._try_allocation = try_allocation
+
+    # releasing a 2 core unit on node a frees 2 cores: neither the 3 core units
+    # nor the 4 core MPI unit can use that
+    component.unschedule_cb(None, running[0])
+    freed = component._freed_capacity([running[0]])
+    assert(freed['cores'] == 2 and freed['total_cores'] == 2)
+    assert(not component._shape_fits(unit_shape(waiting[0]['description']),
+                                     freed))
+    assert(not component._shape_fits(unit_shape(waiting[1]['description']),
+                                     freed))
+    assert(component._shape_fits(unit_shape(waiting[2]['description']),
+                                 freed))
+
+    component.schedule_cb(None, [running[0]])
+    assert(tried == ['unit.wait.2'])
+    assert(waiting[2]['slots'])
+
+    # releasing node b allows a 3 core unit, and the MPI unit is tried (and
+    # fails), but the second 3 core unit is not tried after the first one
+    # failed on the remaining resources
+    del(tried[:])
+    component.unschedule_cb(None, running[2])
+    component.schedule_cb(None, [running[2]])
+    assert(tried == ['unit.wait.0', 'unit.wait.3', 'unit.wait.1'])
+    assert(waiting[0]['slots'])
+    assert(not waiting[3]['slots'])
+    assert(not waiting[1]['slots'])
+    assert(len(component._wait_pool) == 2)
+
+    tearDown()
+
+
+# ------------------------------------------------------------------------------
+